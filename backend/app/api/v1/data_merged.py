@@ -949,20 +949,15 @@ def update_etl_task(task_id: str, config: dict):
 def delete_etl_task(task_id: str, drop_table: bool = False):
     """删除 ETL 任务"""
     try:
-        existing = db_client.query(f"SELECT task_id FROM etl_task_config WHERE task_id = '{task_id}'")
+        # 一次查询同时确认任务存在并取表名
+        # SELECT * 容错：table_name 列可能不存在（旧表结构，启动后 ensure_meta_tables 会补列）
+        existing = db_client.query(f"SELECT * FROM etl_task_config WHERE task_id = '{task_id}'")
         if existing.is_empty():
             raise HTTPException(status_code=404, detail=f"ETL task {task_id} not found")
 
         table_dropped = False
         if drop_table:
-            # 容错：table_name 列可能不存在（旧表结构，启动后 ensure_meta_tables 会补列）
-            table_name = None
-            try:
-                res = db_client.query(f"SELECT table_name FROM etl_task_config WHERE task_id = '{task_id}'")
-                if not res.is_empty() and "table_name" in res.columns:
-                    table_name = res["table_name"][0]
-            except Exception:
-                pass
+            table_name = existing["table_name"][0] if "table_name" in existing.columns else None
             if table_name:
                 table_dropped = _check_shared_and_drop_table(table_name, task_id, "etl_task_config")
 
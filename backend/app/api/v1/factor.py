@@ -41,21 +41,26 @@ def compute_factors(req: FactorRequest):
         if df.is_empty():
             raise HTTPException(status_code=404, detail=f"No data for {req.ts_code}")
 
+        # 各因子先收集为表达式（同名以最后一个为准），再一次性执行
+        close = pl.col("close")
+        exprs = {}
         for factor in req.factors:
             if factor.startswith("sma"):
                 w = int(factor[3:]) if factor[3:].isdigit() else 20
-                df = df.with_columns(TechnicalFactors.sma(df["close"], w).alias(factor))
+                exprs[factor] = TechnicalFactors.sma(close, w)
             elif factor.startswith("ema"):
                 w = int(factor[3:]) if factor[3:].isdigit() else 20
-                df = df.with_columns(TechnicalFactors.ema(df["close"], w).alias(factor))
+                exprs[factor] = TechnicalFactors.ema(close, w)
             elif factor.startswith("rsi"):
                 w = int(factor[3:]) if factor[3:].isdigit() else 14
-                df = df.with_columns(TechnicalFactors.rsi(df["close"], w).alias(factor))
+                exprs[factor] = TechnicalFactors.rsi(close, w)
             elif factor == "macd":
-                macd, sig, hist = TechnicalFactors.macd(df["close"])
-                df = df.with_columns([
-                    macd.alias("macd"), sig.alias("macd_signal"), hist.alias("macd_hist")
-                ])
+                macd, sig, hist = TechnicalFactors.macd(close)
+                exprs.update(macd=macd, macd_signal=sig, macd_hist=hist)
+        if exprs:
+            df = df.lazy().with_columns(
+                [expr.alias(name) for name, expr in exprs.items()]
+            ).collect()
 
         return {"data": df.to_dicts(), "count": len(df)}
     except HTTPException:
@@ -74,10 +79,11 @@ def compute_ic(req: FactorRequest):
             raise HTTPException(status_code=404, detail=f"No data for {req.ts_code}")
 
         factor_col = req.factors[0] if req.factors else "close"
-        df = df.with_columns(TechnicalFactors.sma(df["close"], 20).alias(factor_col))
-        df = df.with_columns(
-            (pl.col("close").shift(-1) / pl.col("close") - 1).alias("fwd_return")
-        ).drop_nulls(subset=["fwd_return"])
+        # 末行远期收益为空，由 ic/rank_ic 的有效样本掩码剔除，无需额外 drop_nulls
+        df = df.select(
+            TechnicalFactors.sma(pl.col("close"), 20).alias(factor_col),
+            (pl.col("close").shift(-1) / pl.col("close") - 1).alias("fwd_return"),
+        )
 
         ic = FactorAnalyzer.ic(df[factor_col], df["fwd_return"])
         rank_ic = FactorAnalyzer.rank_ic(df[factor_col], df["fwd_return"])
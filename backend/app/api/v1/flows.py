@@ -68,15 +68,20 @@ def _delete_flow_file(name: str):
 def list_flows():
     """列出所有 Flow 配置"""
     flows = []
-    if not FLOWS_DIR.exists():
+    # 单次 scandir 快照：目录不存在时直接返回，不再额外 stat 和 glob
+    try:
+        with os.scandir(FLOWS_DIR) as it:
+            entries = [e for e in it if e.name.endswith(".yaml") and e.is_file()]
+    except FileNotFoundError:
         return flows
 
-    for file_path in FLOWS_DIR.glob("*.yaml"):
+    for entry in entries:
+        file_path = entry.path
         try:
             with open(file_path, "r", encoding="utf-8") as f:
                 config = yaml.safe_load(f)
                 flows.append(FlowListItem(
-                    name=config.get("name", file_path.stem),
+                    name=config.get("name", entry.name[:-5]),
                     description=config.get("description", ""),
                     cron=config.get("cron", ""),
                     tags=config.get("tags", []),
@@ -441,19 +441,21 @@ async def run_production(req: ProductionRunRequest):
 async def batch_run_production(req: BatchRunRequest):
     """批量计算因子"""
     preprocess = req.preprocess.model_dump() if req.preprocess else None
+    errors: Dict[str, str] = {}
+    outcome = prod_engine.run_batch(
+        req.factor_ids,
+        errors=errors,
+        mode=req.mode,
+        start_date=req.start_date,
+        end_date=req.end_date,
+        preprocess=preprocess,
+    )
     results = []
     for fid in req.factor_ids:
-        try:
-            success = prod_engine.run_task(
-                factor_id=fid,
-                mode=req.mode,
-                start_date=req.start_date,
-                end_date=req.end_date,
-                preprocess=preprocess,
-            )
-            results.append({"factor_id": fid, "success": success})
-        except Exception as e:
-            results.append({"factor_id": fid, "success": False, "error": str(e)})
+        item = {"factor_id": fid, "success": outcome.get(fid, False)}
+        if fid in errors:
+            item["error"] = errors[fid]
+        results.append(item)
     return {"status": "success", "data": results}
 
 
@@ -681,6 +683,8 @@ async def test_factor_code(req: FactorTestRequest):
     t0 = time.time()
     try:
         result = compute_func(df, func_params)
+        if isinstance(result, pl.LazyFrame):
+            result = result.collect()
     except Exception:
         return make_error("compute", f"因子计算错误:\n{traceback.format_exc()}")
 
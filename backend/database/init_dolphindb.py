@@ -14,9 +14,11 @@ DolphinDB 数据库初始化脚本
 """
 
 import os
+import re
 import sys
 import time
 from pathlib import Path
+from typing import Iterator, List, Tuple
 
 
 def get_config() -> dict:
@@ -29,16 +31,43 @@ def get_config() -> dict:
     }
 
 
-def load_script() -> str:
-    """加载 .dos 初始化脚本"""
-    script_dir = Path(__file__).resolve().parent
-    dos_path = script_dir / "init_dolphindb.dos"
+# 统计花括号前先去掉字符串字面量，避免 "dfs://..." 被当作注释
+_STRING_RE = re.compile(r'"[^"]*"|\'[^\']*\'')
+
+
+def script_path() -> Path:
+    """定位 .dos 初始化脚本"""
+    dos_path = Path(__file__).resolve().parent / "init_dolphindb.dos"
     if not dos_path.exists():
         print(f"[错误] 找不到初始化脚本: {dos_path}")
         sys.exit(1)
-    text = dos_path.read_text(encoding="utf-8")
-    print(f"[信息] 已加载脚本: {dos_path} ({len(text)} 字节)")
-    return text
+    return dos_path
+
+
+def iter_statements(dos_path: Path) -> Iterator[Tuple[int, str]]:
+    """逐行流式读取脚本，按顶层语句块切分，产出 (起始行号, 语句块)
+
+    花括号深度回到 0 且遇到空行或注释行时视为一个语句块结束，
+    这样 if/else、try/catch 等多行结构不会被拆开。
+    """
+    buf: List[str] = []
+    depth = 0
+    start = 0
+    with open(dos_path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            stripped = line.strip()
+            if depth == 0 and (not stripped or stripped.startswith("//")):
+                if buf:
+                    yield start, "".join(buf)
+                    buf = []
+                continue
+            if not buf:
+                start = lineno
+            buf.append(line)
+            code = _STRING_RE.sub("", stripped).split("//", 1)[0]
+            depth += code.count("{") - code.count("}")
+    if buf:
+        yield start, "".join(buf)
 
 
 def main():
@@ -71,21 +100,28 @@ def main():
         print(f"[错误] 连接 DolphinDB 异常: {e}")
         sys.exit(1)
 
-    # 加载并执行脚本
-    script = load_script()
-    print("[信息] 开始执行初始化脚本...")
+    # 流式读取脚本，逐个语句块执行：下一块的解析与上一块的执行交替进行，
+    # 出错时能定位到具体行号，并保留每块耗时
+    dos_path = script_path()
+    print(f"[信息] 开始执行初始化脚本: {dos_path}")
     start = time.time()
+    count = 0
 
     try:
-        result = sess.run(script)
+        for lineno, stmt in iter_statements(dos_path):
+            t0 = time.time()
+            try:
+                result = sess.run(stmt)
+            except Exception as e:
+                print(f"[错误] 第 {lineno} 行起的语句块执行失败 "
+                      f"(累计耗时 {time.time() - start:.2f} 秒): {e}")
+                sys.exit(1)
+            count += 1
+            print(f"[信息]   第 {lineno} 行语句块完成，耗时 {time.time() - t0:.2f} 秒")
+            if result is not None:
+                print(f"[信息]   返回值: {result}")
         elapsed = time.time() - start
-        print(f"[信息] 脚本执行完成，耗时 {elapsed:.2f} 秒")
-        if result is not None:
-            print(f"[信息] 返回值: {result}")
-    except Exception as e:
-        elapsed = time.time() - start
-        print(f"[错误] 脚本执行失败 (耗时 {elapsed:.2f} 秒): {e}")
-        sys.exit(1)
+        print(f"[信息] 脚本执行完成，共 {count} 个语句块，耗时 {elapsed:.2f} 秒")
     finally:
         sess.close()
         print("[信息] 已断开 DolphinDB 连接")
@@ -109,6 +145,7 @@ def main():
         meta_tables = [
             "sync_log", "sync_log_history", "sync_stock_basic",
             "factor_metadata", "factor_analysis",
+            "factor_ic_series", "factor_quantile_returns",
             "factor_task_run", "sync_trade_cal",
         ]
 
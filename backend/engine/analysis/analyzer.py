@@ -4,12 +4,24 @@
 """
 import polars as pl
 import json
-from typing import Optional, List, Dict, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 
 from app.core.logger import logger
 
 
+# 因子数据查询模板（日期区间未指定时使用哨兵日期）
+_FACTOR_DATA_SQL = (
+    "SELECT ts_code, trade_date, factor_value FROM factor_values "
+    "WHERE factor_id = %s AND trade_date >= %s AND trade_date <= %s "
+    "ORDER BY trade_date, ts_code"
+)
+_MIN_DATE = "19000101"
+_MAX_DATE = "29991231"
+
+
 class FactorAnalyzer:
     """因子分析器"""
 
@@ -40,71 +52,137 @@ class FactorAnalyzer:
         logger.info(f"Analyzing factor: {factor_id}")
 
         try:
-            # 1. 加载因子数据和收益率数据
-            factor_df = self._load_factor_data(factor_id, start_date, end_date)
-            if factor_df is None or factor_df.is_empty():
-                logger.warning(f"No factor data for {factor_id}")
-                return None
-
-            price_df = self._load_price_data(factor_df, start_date, end_date, max(periods))
-            if price_df is None or price_df.is_empty():
-                logger.warning(f"No price data for analysis")
+            inputs = self._load_inputs(factor_id, start_date, end_date, periods)
+            if inputs is None:
                 return None
+            return self._analyze_frames(factor_id, *inputs, periods, quantiles, started_at)
+        except Exception as e:
+            logger.error(f"Factor analysis failed for {factor_id}: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
 
-            # 2. 合并因子和价格
-            merged = factor_df.join(price_df, on=["ts_code", "trade_date"], how="inner")
-            logger.info(f"Merged data: {len(merged)} rows, {merged['trade_date'].n_unique()} dates")
-
-            # 3. 计算各持有期 IC
-            ic_results = {}
-            for period in periods:
-                ic_series = self._calc_ic_series(merged, period)
-                if ic_series is not None and not ic_series.is_empty():
-                    ic_results[period] = ic_series
-
-            # 4. 计算分层收益
-            quantile_returns = self._calc_quantile_returns(merged, periods, quantiles)
+    def analyze_many(
+        self,
+        factor_ids: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        periods: List[int] = None,
+        quantiles: int = 5,
+        max_workers: int = 8,
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """批量因子分析
 
-            # 5. 计算换手率
-            turnover = self._calc_turnover(merged, quantiles)
+        数据加载在线程池中预取（最多 max_workers 个因子），
+        计算在当前线程按顺序执行，使数据库 IO 与 Polars 计算重叠。
 
-            # 6. 汇总统计
-            summary = self._build_summary(factor_id, ic_results, quantile_returns, turnover, periods)
+        Returns:
+            {factor_id: summary}，失败或无数据的因子为 None
+        """
+        if periods is None:
+            periods = [1, 5, 10, 20]
+        if not factor_ids:
+            return {}
+
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        workers = max(1, min(max_workers, len(factor_ids)))
+        pending = iter(factor_ids)
+        window: deque = deque()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            def _submit_next():
+                fid = next(pending, None)
+                if fid is not None:
+                    window.append((fid, executor.submit(
+                        self._load_inputs, fid, start_date, end_date, periods
+                    )))
+
+            for _ in range(workers):
+                _submit_next()
+
+            while window:
+                factor_id, future = window.popleft()
+                _submit_next()
+                started_at = datetime.now()
+                logger.info(f"Analyzing factor: {factor_id}")
+                try:
+                    inputs = future.result()
+                    results[factor_id] = (
+                        self._analyze_frames(factor_id, *inputs, periods, quantiles, started_at)
+                        if inputs is not None else None
+                    )
+                except Exception as e:
+                    logger.error(f"Factor analysis failed for {factor_id}: {e}")
+                    results[factor_id] = None
 
-            # 7. 持久化
-            actual_start = merged["trade_date"].min()
-            actual_end = merged["trade_date"].max()
-            self._save_analysis(factor_id, summary, actual_start, actual_end, periods)
+        return results
 
-            elapsed = (datetime.now() - started_at).total_seconds()
-            logger.info(f"Factor {factor_id} analysis done in {elapsed:.1f}s")
-            return summary
+    def _load_inputs(self, factor_id: str, start_date: Optional[str], end_date: Optional[str],
+                     periods: List[int]) -> Optional[Tuple[pl.DataFrame, pl.DataFrame]]:
+        """加载因子数据和收益率数据，任一为空返回 None"""
+        factor_df = self._load_factor_data(factor_id, start_date, end_date)
+        if factor_df is None or factor_df.is_empty():
+            logger.warning(f"No factor data for {factor_id}")
+            return None
 
-        except Exception as e:
-            logger.error(f"Factor analysis failed for {factor_id}: {e}")
-            import traceback
-            traceback.print_exc()
+        price_df = self._load_price_data(factor_df, start_date, end_date, max(periods))
+        if price_df is None or price_df.is_empty():
+            logger.warning(f"No price data for analysis")
             return None
+        return factor_df, price_df
+
+    def _analyze_frames(self, factor_id: str, factor_df: pl.DataFrame, price_df: pl.DataFrame,
+                        periods: List[int], quantiles: int, started_at: datetime) -> Dict[str, Any]:
+        """基于已加载的数据执行计算、汇总并持久化"""
+        # 1. 构建惰性计算图：合并 → 远期收益/分层 → IC / 分层收益 / 换手率
+        #    所有输出共用同一个 prepared 子图，由 collect_all 一次性执行
+        prepared_lf = self._prepare_frame(
+            factor_df.lazy().join(price_df.lazy(), on=["ts_code", "trade_date"], how="inner"),
+            periods, quantiles,
+        )
+        prepared, grouped, turnover_by_q, *ic_frames = pl.collect_all([
+            prepared_lf,
+            self._calc_quantile_returns(prepared_lf, periods),
+            self._calc_turnover(prepared_lf),
+            *[self._calc_ic_series(prepared_lf, period) for period in periods],
+        ])
+        logger.info(f"Merged data: {len(prepared)} rows, {prepared['trade_date'].n_unique()} dates")
+
+        # 2. 各持有期 IC
+        ic_results = {
+            period: ic_df for period, ic_df in zip(periods, ic_frames)
+            if not ic_df.is_empty()
+        }
+
+        # 3. 拆分各持有期分层收益
+        quantile_returns = self._split_quantile_returns(grouped, periods)
+
+        # 4. 换手率
+        turnover = self._format_turnover(turnover_by_q, prepared, quantiles)
+
+        # 5. 汇总统计
+        summary = self._build_summary(factor_id, ic_results, quantile_returns, turnover, periods)
+
+        # 6. 持久化
+        actual_start = prepared["trade_date"].min()
+        actual_end = prepared["trade_date"].max()
+        self._save_analysis(factor_id, summary, actual_start, actual_end, periods,
+                            ic_results, quantile_returns)
+
+        elapsed = (datetime.now() - started_at).total_seconds()
+        logger.info(f"Factor {factor_id} analysis done in {elapsed:.1f}s")
+        return summary
 
     # ==================== 数据加载 ====================
 
     def _load_factor_data(self, factor_id: str, start_date: Optional[str],
                           end_date: Optional[str]) -> Optional[pl.DataFrame]:
         """加载因子数据（支持分批加载大数据集）"""
-        conditions = ["factor_id = %s"]
-        params = [factor_id]
-        if start_date:
-            conditions.append("trade_date >= %s")
-            params.append(start_date)
-        if end_date:
-            conditions.append("trade_date <= %s")
-            params.append(end_date)
-
-        where = " AND ".join(conditions)
-        sql = f"SELECT ts_code, trade_date, factor_value FROM factor_values WHERE {where} ORDER BY trade_date, ts_code"
+        # 固定 SQL 模板：未指定日期时用哨兵日期补齐，避免按条件拼接出不同语句
+        params = (factor_id, start_date or _MIN_DATE, end_date or _MAX_DATE)
 
         try:
-            df = self.db.query(sql, tuple(params))
+            df = self.db.query(_FACTOR_DATA_SQL, params)
             return df if not df.is_empty() else None
         except Exception as e:
             logger.error(f"Failed to load factor data: {e}")
@@ -121,150 +199,168 @@ class FactorAnalyzer:
         end_dt = datetime.strptime(max_date, "%Y%m%d") + timedelta(days=extra_days)
         load_end = end_dt.strftime("%Y%m%d")
 
+        # 只拉取因子覆盖的股票，inner join 会丢弃其余行
+        codes = factor_df["ts_code"].unique().sort().to_list()
+
         sql = """
             SELECT ts_code, trade_date, close, pct_chg
             FROM sync_daily_data
-            WHERE trade_date >= %s AND trade_date <= %s
+            WHERE trade_date >= %s AND trade_date <= %s AND ts_code in %s
             ORDER BY ts_code, trade_date
         """
         try:
-            df = self.db.query(sql, (min_date, load_end))
+            df = self.db.query(sql, (min_date, load_end, codes))
             return df if not df.is_empty() else None
         except Exception as e:
             logger.error(f"Failed to load price data: {e}")
             return None
 
-    # ==================== IC 分析 ====================
+    # ==================== 预处理 ====================
 
-    def _calc_ic_series(self, merged: pl.DataFrame, period: int) -> Optional[pl.DataFrame]:
-        """计算指定持有期的 IC 时间序列（Rank IC）"""
-        sorted_df = merged.sort(["ts_code", "trade_date"])
+    @staticmethod
+    def _prepare_frame(merged: pl.LazyFrame, periods: List[int], quantiles: int) -> pl.LazyFrame:
+        """构建分析用宽表：一次排序，一次性计算所有持有期远期收益及截面分层
 
-        # 计算远期收益率：period 天后的收益
-        with_fwd = (
-            sorted_df
-            .with_columns(
-                pl.col("close").shift(-period).over("ts_code").alias("fwd_close")
-            )
+        按 ts_code 排序后每只股票是连续区段，用 rle_id 标记区段后整列 shift，
+        跨区段的位置置空，避免 shift().over("ts_code") 的分组开销。
+        输出列：ts_code, trade_date, factor_value, close, fwd_return_{p}..., quantile
+        """
+        run = pl.col("_run")
+        return (
+            merged.lazy()
+            .sort(["ts_code", "trade_date"])
+            .with_columns(pl.col("ts_code").rle_id().alias("_run"))
+            .with_columns([
+                (pl.when(run.shift(-p) == run).then(pl.col("close").shift(-p))
+                 / pl.col("close") - 1.0).alias(f"fwd_return_{p}")
+                for p in periods
+            ])
+            .drop("_run")
             .with_columns(
-                (pl.col("fwd_close") / pl.col("close") - 1.0).alias("fwd_return")
+                (pl.col("factor_value").rank().over("trade_date")
+                 / pl.col("factor_value").count().over("trade_date")
+                 * quantiles).cast(pl.Int32).clip(0, quantiles - 1).alias("quantile")
             )
-            .drop_nulls(subset=["factor_value", "fwd_return"])
         )
 
-        if with_fwd.is_empty():
-            return None
-
-        # 按日期计算截面 Rank IC（Spearman 相关系数）
-        ic_list = []
-        dates = with_fwd["trade_date"].unique().sort()
-
-        for dt in dates:
-            cross = with_fwd.filter(pl.col("trade_date") == dt)
-            if len(cross) < 30:
-                continue
-
-            rank_factor = cross["factor_value"].rank()
-            rank_return = cross["fwd_return"].rank()
+    # ==================== IC 分析 ====================
 
-            n = len(cross)
-            mean_f = rank_factor.mean()
-            mean_r = rank_return.mean()
-            cov = ((rank_factor - mean_f) * (rank_return - mean_r)).sum()
-            std_f = ((rank_factor - mean_f) ** 2).sum() ** 0.5
-            std_r = ((rank_return - mean_r) ** 2).sum() ** 0.5
+    @staticmethod
+    def _calc_ic_series(prepared: pl.LazyFrame, period: int) -> pl.LazyFrame:
+        """指定持有期 IC 时间序列（Rank IC）的计算图
 
-            if std_f > 0 and std_r > 0:
-                ic = cov / (std_f * std_r)
-                ic_list.append({"trade_date": dt, "ic": float(ic)})
+        截面排名用 rank().over("trade_date") 一次算出，再按日期 group_by 求秩相关，
+        无 Python 逐日循环。排名在该持有期的有效样本（因子值与远期收益均非空）内计算。
+        截面样本少于 30 或秩方差为 0 的日期不输出。输出列：trade_date, ic
+        """
+        return (
+            prepared
+            .select(["trade_date", "factor_value", pl.col(f"fwd_return_{period}").alias("fwd_return")])
+            .drop_nulls(subset=["factor_value", "fwd_return"])
+            .with_columns([
+                pl.col("factor_value").rank().over("trade_date").alias("factor_rank"),
+                pl.col("fwd_return").rank().over("trade_date").alias("return_rank"),
+            ])
+            .group_by("trade_date")
+            .agg([
+                pl.len().alias("n"),
+                pl.corr("factor_rank", "return_rank").alias("ic"),
+            ])
+            .filter((pl.col("n") >= 30) & pl.col("ic").is_not_nan() & pl.col("ic").is_not_null())
+            .sort("trade_date")
+            .select(["trade_date", "ic"])
+        )
 
-        if not ic_list:
-            return None
+    # ==================== 分层收益 ====================
 
-        return pl.DataFrame(ic_list)
+    @staticmethod
+    def _calc_quantile_returns(prepared: pl.LazyFrame, periods: List[int]) -> pl.LazyFrame:
+        """各持有期分层收益的计算图（所有持有期共用一次 group_by）
 
-    # ==================== 分层收益 ====================
+        输出列：trade_date, quantile, ret_{p}...
+        """
+        return (
+            prepared
+            .filter(pl.col("factor_value").is_not_null() & pl.col("quantile").is_not_null())
+            .group_by(["trade_date", "quantile"])
+            .agg([pl.col(f"fwd_return_{p}").mean().alias(f"ret_{p}") for p in periods])
+            .sort(["trade_date", "quantile"])
+        )
 
-    def _calc_quantile_returns(self, merged: pl.DataFrame, periods: List[int],
-                               quantiles: int) -> Dict[int, pl.DataFrame]:
-        """计算各持有期的分层收益"""
-        sorted_df = merged.sort(["ts_code", "trade_date"])
+    @staticmethod
+    def _split_quantile_returns(grouped: pl.DataFrame, periods: List[int]) -> Dict[int, pl.DataFrame]:
+        """将宽表拆分为 {period: (trade_date, quantile, mean_return)}"""
         results = {}
-
         for period in periods:
-            with_fwd = (
-                sorted_df
-                .with_columns(
-                    pl.col("close").shift(-period).over("ts_code").alias("fwd_close")
-                )
-                .with_columns(
-                    (pl.col("fwd_close") / pl.col("close") - 1.0).alias("fwd_return")
-                )
-                .drop_nulls(subset=["factor_value", "fwd_return"])
-            )
-
-            if with_fwd.is_empty():
-                continue
-
-            # 按日期截面分层
-            with_q = with_fwd.with_columns(
-                (pl.col("factor_value").rank().over("trade_date")
-                 / pl.col("factor_value").count().over("trade_date")
-                 * quantiles).cast(pl.Int32).clip(0, quantiles - 1).alias("quantile")
-            )
-
-            # 各层各日平均收益
             group_ret = (
-                with_q.group_by(["trade_date", "quantile"])
-                .agg(pl.col("fwd_return").mean().alias("mean_return"))
-                .sort(["trade_date", "quantile"])
+                grouped
+                .select(["trade_date", "quantile", pl.col(f"ret_{period}").alias("mean_return")])
+                .drop_nulls(subset=["mean_return"])
             )
-
-            results[period] = group_ret
+            if not group_ret.is_empty():
+                results[period] = group_ret
 
         return results
 
     # ==================== 换手率 ====================
 
-    def _calc_turnover(self, merged: pl.DataFrame, quantiles: int) -> Optional[Dict[str, float]]:
-        """计算各层换手率"""
-        sorted_df = merged.sort(["ts_code", "trade_date"])
+    @staticmethod
+    def _calc_turnover(prepared: pl.LazyFrame) -> pl.LazyFrame:
+        """各层换手率的计算图
 
-        with_q = sorted_df.with_columns(
-            (pl.col("factor_value").rank().over("trade_date")
-             / pl.col("factor_value").count().over("trade_date")
-             * quantiles).cast(pl.Int32).clip(0, quantiles - 1).alias("quantile")
+        相邻交易日同一分层的成分股做自连接求重叠数：
+        turnover = 1 - overlap / max(prev_size, curr_size)，再按分层取均值。
+        输出列：quantile, turnover
+        """
+        dates = (
+            prepared.select("trade_date").unique()
+            .sort("trade_date")
+            .with_columns(pl.col("trade_date").shift(1).alias("prev_date"))
+        )
+        members = (
+            prepared
+            .select(["ts_code", "trade_date", "quantile"])
+            .filter(pl.col("quantile").is_not_null())
+        )
+        sizes = members.group_by(["trade_date", "quantile"]).agg(pl.len().alias("size"))
+
+        # 仅当前一日与当日该分层均非空时才计入
+        pairs = (
+            sizes.join(dates, on="trade_date", how="inner")
+            .drop_nulls(subset=["prev_date"])
+            .join(
+                sizes.rename({"trade_date": "prev_date", "size": "prev_size"}),
+                on=["prev_date", "quantile"], how="inner",
+            )
+        )
+        overlap = (
+            members.join(dates, on="trade_date", how="inner")
+            .join(
+                members.rename({"trade_date": "prev_date"}),
+                on=["ts_code", "quantile", "prev_date"], how="inner",
+            )
+            .group_by(["trade_date", "quantile"])
+            .agg(pl.len().alias("overlap"))
         )
 
-        dates = with_q["trade_date"].unique().sort()
-        if len(dates) < 2:
-            return None
-
-        turnover_by_q = {q: [] for q in range(quantiles)}
-
-        prev_groups = {}
-        for dt in dates:
-            cross = with_q.filter(pl.col("trade_date") == dt)
-            curr_groups = {}
-            for q in range(quantiles):
-                stocks = set(cross.filter(pl.col("quantile") == q)["ts_code"].to_list())
-                curr_groups[q] = stocks
-
-                if q in prev_groups and prev_groups[q]:
-                    prev = prev_groups[q]
-                    if prev and stocks:
-                        overlap = len(prev & stocks)
-                        total = max(len(prev), len(stocks))
-                        turnover_by_q[q].append(1.0 - overlap / total if total > 0 else 0.0)
-
-            prev_groups = curr_groups
-
-        result = {}
-        for q in range(quantiles):
-            vals = turnover_by_q[q]
-            result[f"Q{q+1}"] = sum(vals) / len(vals) if vals else 0.0
+        return (
+            pairs.join(overlap, on=["trade_date", "quantile"], how="left")
+            .with_columns(
+                (1.0 - pl.col("overlap").fill_null(0)
+                 / pl.max_horizontal("size", "prev_size")).alias("turnover")
+            )
+            .group_by("quantile")
+            .agg(pl.col("turnover").mean())
+        )
 
-        return result
+    @staticmethod
+    def _format_turnover(turnover_by_q: pl.DataFrame, prepared: pl.DataFrame,
+                         quantiles: int) -> Optional[Dict[str, float]]:
+        """换手率结果转换为 {"Q1": x, ...}，不足两个交易日时返回 None"""
+        if prepared["trade_date"].n_unique() < 2:
+            return None
+        by_q = dict(zip(turnover_by_q["quantile"].to_list(), turnover_by_q["turnover"].to_list()))
+        return {f"Q{q+1}": by_q.get(q, 0.0) for q in range(quantiles)}
 
     # ==================== 汇总统计 ====================
 
@@ -281,45 +377,33 @@ class FactorAnalyzer:
             # IC 统计
             if period in ic_results:
                 ic_df = ic_results[period]
-                ic_vals = ic_df["ic"]
-                ic_mean = float(ic_vals.mean())
-                ic_std = float(ic_vals.std())
+                # 均值、标准差、正 IC 数、样本数一次 select 完成
+                ic_mean, ic_std, pos, n = ic_df.select([
+                    pl.col("ic").mean(),
+                    pl.col("ic").std().alias("std"),
+                    (pl.col("ic") > 0).sum().alias("pos"),
+                    pl.len(),
+                ]).row(0)
+                ic_mean, ic_std = float(ic_mean), float(ic_std)
                 period_summary["ic_mean"] = round(ic_mean, 6)
                 period_summary["ic_std"] = round(ic_std, 6)
                 period_summary["ic_ir"] = round(ic_mean / ic_std, 4) if ic_std > 0 else 0.0
-                period_summary["ic_positive_ratio"] = round(
-                    float((ic_vals > 0).sum()) / len(ic_vals), 4
-                )
+                period_summary["ic_positive_ratio"] = round(float(pos) / n, 4)
                 period_summary["ic_series"] = [
-                    {"date": r["trade_date"], "ic": round(r["ic"], 6)}
-                    for r in ic_df.to_dicts()
+                    {"date": date, "ic": round(ic, 6)}
+                    for date, ic in ic_df.select(["trade_date", "ic"]).iter_rows()
                 ]
 
             # 分层收益统计
             if period in quantile_returns:
-                qr = quantile_returns[period]
-                q_summary = (
-                    qr.group_by("quantile")
-                    .agg([
-                        pl.col("mean_return").mean().alias("avg_return"),
-                        pl.col("mean_return").std().alias("std_return"),
-                    ])
-                    .sort("quantile")
-                )
-                period_summary["quantile_returns"] = [
-                    {
-                        "quantile": f"Q{int(r['quantile'])+1}",
-                        "avg_return": round(float(r["avg_return"]), 6),
-                        "std_return": round(float(r["std_return"]), 6),
-                        "sharpe": round(
-                            float(r["avg_return"]) / float(r["std_return"]), 4
-                        ) if r["std_return"] and float(r["std_return"]) > 0 else 0.0,
-                    }
-                    for r in q_summary.to_dicts()
-                ]
+                q_summary = self._quantile_stats(quantile_returns[period])
+                period_summary["quantile_returns"] = self._format_quantile_stats(q_summary)
 
                 # 多空收益
-                returns_by_q = {int(r["quantile"]): float(r["avg_return"]) for r in q_summary.to_dicts()}
+                returns_by_q = {
+                    int(q): float(avg)
+                    for q, avg in q_summary.select(["quantile", "avg_return"]).iter_rows()
+                }
                 max_q = max(returns_by_q.keys()) if returns_by_q else 0
                 long_ret = returns_by_q.get(max_q, 0)
                 short_ret = returns_by_q.get(0, 0)
@@ -341,66 +425,147 @@ class FactorAnalyzer:
 
         return summary
 
+    @staticmethod
+    def _quantile_stats(qr: pl.DataFrame) -> pl.DataFrame:
+        """按分层汇总每日分层收益：均值、标准差"""
+        return (
+            qr.group_by("quantile")
+            .agg([
+                pl.col("mean_return").mean().alias("avg_return"),
+                pl.col("mean_return").std().alias("std_return"),
+            ])
+            .sort("quantile")
+        )
+
+    @staticmethod
+    def _format_quantile_stats(q_summary: pl.DataFrame) -> List[Dict[str, Any]]:
+        """分层汇总统计转换为接口输出格式"""
+        return [
+            {
+                "quantile": f"Q{int(q)+1}",
+                "avg_return": round(float(avg), 6),
+                "std_return": round(float(std), 6),
+                "sharpe": round(float(avg) / float(std), 4) if std and float(std) > 0 else 0.0,
+            }
+            for q, avg, std in q_summary.select(["quantile", "avg_return", "std_return"]).iter_rows()
+        ]
+
     # ==================== 持久化 ====================
 
     def _save_analysis(self, factor_id: str, summary: Dict, start_date: str,
-                       end_date: str, periods: List[int]):
-        """保存分析结果到数据库"""
+                       end_date: str, periods: List[int],
+                       ic_results: Dict[int, pl.DataFrame],
+                       quantile_returns: Dict[int, pl.DataFrame]):
+        """保存分析结果到数据库
+
+        factor_analysis 只存标量指标；逐日 IC 和分层收益以整表批量写入
+        factor_ic_series / factor_quantile_returns（每个因子仅保留最新一次分析）。
+        """
         try:
-            ic_series = None
-            p_key = "1" if "1" in summary.get("periods", {}) else str(periods[0]) if periods else None
-            if p_key and p_key in summary.get("periods", {}):
-                ic_series = summary["periods"][p_key].get("ic_series")
-
-            quantile_returns = None
-            if p_key and p_key in summary.get("periods", {}):
-                quantile_returns = summary["periods"][p_key].get("quantile_returns")
-
-            self.db.execute("""
-                INSERT INTO factor_analysis (
-                    factor_id, start_date, end_date, periods,
-                    ic_mean, ic_std, rank_ic_mean, rank_ic_std, ic_ir,
-                    turnover_mean, quantile_returns, ic_series
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                factor_id, start_date, end_date,
-                json.dumps(periods),
-                summary.get("ic_mean", 0),
-                summary.get("ic_std", 0),
-                summary.get("ic_mean", 0),  # rank_ic = ic（我们用的就是 Rank IC）
-                summary.get("ic_std", 0),
-                summary.get("ic_ir", 0),
-                sum(summary.get("turnover", {}).values()) / max(len(summary.get("turnover", {})), 1)
-                if summary.get("turnover") else 0,
-                json.dumps(quantile_returns) if quantile_returns else None,
-                json.dumps(ic_series) if ic_series else None,
-            ))
+            analysis_date = datetime.now()
+            turnover = summary.get("turnover")
+
+            self.db.bulk_copy("factor_analysis", pl.DataFrame({
+                "factor_id": [factor_id],
+                "analysis_date": [analysis_date],
+                "start_date": [str(start_date)],
+                "end_date": [str(end_date)],
+                "periods": [json.dumps(periods)],
+                "ic_mean": [float(summary.get("ic_mean", 0))],
+                "ic_std": [float(summary.get("ic_std", 0))],
+                "rank_ic_mean": [float(summary.get("ic_mean", 0))],  # rank_ic = ic（我们用的就是 Rank IC）
+                "rank_ic_std": [float(summary.get("ic_std", 0))],
+                "ic_ir": [float(summary.get("ic_ir", 0))],
+                "turnover_mean": [sum(turnover.values()) / max(len(turnover), 1) if turnover else 0.0],
+                "created_at": [analysis_date],
+            }))
+
+            detail_cols = [
+                pl.lit(factor_id).alias("factor_id"),
+                pl.lit(analysis_date).alias("analysis_date"),
+            ]
+            if ic_results:
+                ic_df = pl.concat([
+                    df.select([
+                        pl.lit(p, dtype=pl.Int32).alias("period"),
+                        self._date_str("trade_date"),
+                        pl.col("ic"),
+                    ])
+                    for p, df in ic_results.items()
+                ]).with_columns(detail_cols)
+                self.db.upsert("factor_ic_series", ic_df, ["factor_id"])
+
+            if quantile_returns:
+                qr_df = pl.concat([
+                    df.select([
+                        pl.lit(p, dtype=pl.Int32).alias("period"),
+                        self._date_str("trade_date"),
+                        pl.col("quantile").cast(pl.Int32),
+                        pl.col("mean_return"),
+                    ])
+                    for p, df in quantile_returns.items()
+                ]).with_columns(detail_cols)
+                self.db.upsert("factor_quantile_returns", qr_df, ["factor_id"])
+
             logger.info(f"Saved analysis result for {factor_id}")
         except Exception as e:
             logger.error(f"Failed to save analysis: {e}")
 
+    @staticmethod
+    def _date_str(col: str) -> pl.Expr:
+        """日期列统一为 YYYYMMDD 字符串（兼容 Date/Datetime 和字符串）"""
+        return pl.col(col).cast(pl.Utf8).str.replace_all("-", "").str.slice(0, 8).alias(col)
+
     # ==================== 查询接口 ====================
 
     def get_latest_analysis(self, factor_id: str) -> Optional[Dict]:
         """获取最新分析结果"""
         try:
+            # 只取接口需要的列（rank_ic_* / created_at 不参与输出）
             df = self.db.query("""
-                SELECT * FROM factor_analysis
+                SELECT factor_id, analysis_date, start_date, end_date, periods,
+                       ic_mean, ic_std, ic_ir, turnover_mean
+                FROM factor_analysis
                 WHERE factor_id = %s
                 ORDER BY analysis_date DESC LIMIT 1
             """, (factor_id,))
             if df.is_empty():
                 return None
-            row = df.to_dicts()[0]
-            # 解析 JSON 字段
-            for key in ["periods", "quantile_returns", "ic_series"]:
-                if row.get(key) and isinstance(row[key], str):
-                    row[key] = json.loads(row[key])
+            row = df.row(0, named=True)
+            if row.get("periods") and isinstance(row["periods"], str):
+                row["periods"] = json.loads(row["periods"])
+
+            # 明细从子表读取（取 period=1，否则第一个持有期）
+            periods = row.get("periods") or []
+            period = 1 if 1 in periods else periods[0] if periods else 1
+            row["ic_series"], row["quantile_returns"] = self._load_analysis_detail(factor_id, period)
             return row
         except Exception as e:
             logger.error(f"Failed to get analysis: {e}")
             return None
 
+    def _load_analysis_detail(self, factor_id: str, period: int):
+        """读取指定持有期的逐日 IC 和分层收益汇总"""
+        ic_df = self.db.query("""
+            SELECT trade_date, ic FROM factor_ic_series
+            WHERE factor_id = %s AND period = %s
+            ORDER BY trade_date
+        """, (factor_id, period))
+        ic_series = [
+            {"date": date, "ic": round(ic, 6)}
+            for date, ic in ic_df.select(["trade_date", "ic"]).iter_rows()
+        ] if not ic_df.is_empty() else None
+
+        qr_df = self.db.query("""
+            SELECT trade_date, quantile, mean_return FROM factor_quantile_returns
+            WHERE factor_id = %s AND period = %s
+        """, (factor_id, period))
+        quantile_returns = (
+            self._format_quantile_stats(self._quantile_stats(qr_df))
+            if not qr_df.is_empty() else None
+        )
+        return ic_series, quantile_returns
+
     def get_analysis_history(self, factor_id: str, limit: int = 10) -> List[Dict]:
         """获取分析历史"""
         try:
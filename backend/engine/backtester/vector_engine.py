@@ -6,10 +6,43 @@ import vectorbt as vbt
 import pandas as pd
 import numpy as np
 import polars as pl
+from numba import njit, prange
 from dataclasses import dataclass, field
 from typing import Any, Optional
 
 
+@njit(parallel=True, cache=True)
+def _transition_masks_nb(signals: np.ndarray):
+    """逐列单次遍历信号矩阵 (n_dates, n_assets)，同时生成多空开平仓掩码"""
+    n_rows, n_cols = signals.shape
+    entries = np.zeros((n_rows, n_cols), dtype=np.bool_)
+    exits = np.zeros((n_rows, n_cols), dtype=np.bool_)
+    short_entries = np.zeros((n_rows, n_cols), dtype=np.bool_)
+    short_exits = np.zeros((n_rows, n_cols), dtype=np.bool_)
+    for j in prange(n_cols):
+        prev_long = False
+        prev_short = False
+        for i in range(n_rows):
+            v = signals[i, j]
+            cur_long = v == 1.0
+            cur_short = v == -1.0
+            entries[i, j] = cur_long and not prev_long
+            exits[i, j] = prev_long and not cur_long
+            short_entries[i, j] = cur_short and not prev_short
+            short_exits[i, j] = prev_short and not cur_short
+            prev_long = cur_long
+            prev_short = cur_short
+    return entries, exits, short_entries, short_exits
+
+
+# _build_result 实际读取的 VectorBT 统计项
+_STATS_METRICS = [
+    "end_value", "total_return", "max_dd", "max_dd_duration", "total_trades",
+    "win_rate", "best_trade", "worst_trade", "avg_winning_trade", "avg_losing_trade",
+    "profit_factor", "expectancy",
+]
+
+
 @dataclass
 class BacktestConfig:
     initial_capital: float = 1_000_000.0
@@ -17,6 +50,9 @@ class BacktestConfig:
     slippage_rate: float = 0.0001     # 0.01%
     position_size: float = 1.0        # fraction of capital per trade
     hold_days: int = 1
+    # >0 时多标的回测按该列数分块运行以限制峰值内存；
+    # 各块独立资金池（初始资金均分），不再是全组合 cash_sharing
+    column_chunk_size: int = 0
 
 
 @dataclass
@@ -51,21 +87,20 @@ class VectorEngine:
 
     def _run_single_asset(self, df: pl.DataFrame, signal_col: str) -> BacktestResult:
         """单标的回测"""
-        # Polars → Pandas（VectorBT 需要 pandas）
-        pdf = df.sort("trade_date").to_pandas()
-        pdf['trade_date'] = pd.to_datetime(pdf['trade_date'], format='%Y%m%d')
-        pdf = pdf.set_index('trade_date')
+        # 日期在 Polars 中解析后再转换为 pandas（VectorBT 需要 pandas）
+        pdf = (
+            df.select(["trade_date", "close", signal_col])
+            .sort("trade_date")
+            .with_columns(self._trade_date_expr())
+            .to_pandas()
+            .set_index("trade_date")
+        )
 
         close = pdf['close']
         signals = pdf[signal_col]
 
-        # 生成 entries/exits
-        entries = (signals == 1) & (signals.shift(1) != 1)
-        exits = (signals != 1) & (signals.shift(1) == 1)
-
-        # 处理做空信号
-        short_entries = (signals == -1) & (signals.shift(1) != -1)
-        short_exits = (signals != -1) & (signals.shift(1) == -1)
+        # 生成多空 entries/exits
+        entries, exits, short_entries, short_exits = self._signal_masks(signals)
 
         cfg = self.config
 
@@ -86,20 +121,55 @@ class VectorEngine:
 
     def _run_multi_asset(self, df: pl.DataFrame, signal_col: str) -> BacktestResult:
         """多标的组合回测"""
-        pdf = df.sort(["ts_code", "trade_date"]).to_pandas()
-        pdf['trade_date'] = pd.to_datetime(pdf['trade_date'], format='%Y%m%d')
+        # 在 Polars 中直接 pivot 为宽表，只把两张宽表转换为 pandas
+        close_wide = self._pivot_wide(df, "close")
+        signal_wide = self._pivot_wide(df, signal_col, fill_value=0)
+
+        cfg = self.config
+        if 0 < cfg.column_chunk_size < close_wide.shape[1]:
+            return self._run_column_chunks(close_wide, signal_wide, cfg.column_chunk_size)
+
+        entries, exits, short_entries, short_exits = self._signal_masks(signal_wide)
 
-        # Pivot 为宽表
-        close_wide = pdf.pivot_table(index='trade_date', columns='ts_code', values='close')
-        signal_wide = pdf.pivot_table(index='trade_date', columns='ts_code', values=signal_col, fill_value=0)
+        portfolio = vbt.Portfolio.from_signals(
+            close=close_wide,
+            entries=entries,
+            exits=exits,
+            short_entries=short_entries,
+            short_exits=short_exits,
+            init_cash=cfg.initial_capital,
+            fees=cfg.commission_rate,
+            slippage=cfg.slippage_rate,
+            freq='1D',
+            cash_sharing=True,
+        )
+
+        return self._build_result(portfolio)
+
+    def wide_layout(self, df: pl.DataFrame) -> tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+        """多标的长表 → (close 宽表, 每行的日期行号, 每行的标的列号)
+
+        只换信号、反复回测同一行情时（如权重搜索）复用：宽表只 pivot 一次，
+        信号按行号/列号直接写入宽数组。要求 (trade_date, ts_code) 唯一。
+        """
+        close_wide = self._pivot_wide(df, "close")
+        positions = df.select(
+            (pl.col("trade_date").rank("dense") - 1).alias("row"),
+            (pl.col("ts_code").rank("dense") - 1).alias("col"),
+        )
+        return close_wide, positions["row"].to_numpy(), positions["col"].to_numpy()
 
-        entries = (signal_wide == 1) & (signal_wide.shift(1) != 1)
-        exits = (signal_wide != 1) & (signal_wide.shift(1) == 1)
-        short_entries = (signal_wide == -1) & (signal_wide.shift(1) != -1)
-        short_exits = (signal_wide != -1) & (signal_wide.shift(1) == -1)
+    def sharpe_ratio(self, close_wide: pd.DataFrame, signal_wide: pd.DataFrame) -> float:
+        """多标的组合的夏普比率，与 run() 的 metrics["sharpe_ratio"] 同口径
 
+        不生成统计表、权益曲线和交易记录，供需要逐次评估大量信号的调用方使用。
+        """
         cfg = self.config
+        if 0 < cfg.column_chunk_size < close_wide.shape[1]:
+            result = self._run_column_chunks(close_wide, signal_wide, cfg.column_chunk_size)
+            return result.metrics["sharpe_ratio"]
 
+        entries, exits, short_entries, short_exits = self._signal_masks(signal_wide)
         portfolio = vbt.Portfolio.from_signals(
             close=close_wide,
             entries=entries,
@@ -112,13 +182,51 @@ class VectorEngine:
             freq='1D',
             cash_sharing=True,
         )
+        return self._safe_float(portfolio.sharpe_ratio())
 
-        return self._build_result(portfolio)
+    @staticmethod
+    def _trade_date_expr() -> pl.Expr:
+        """YYYYMMDD 交易日 → Datetime(ns)，替代 pandas 逐行 to_datetime"""
+        return pl.col("trade_date").cast(pl.Utf8).str.to_datetime("%Y%m%d", time_unit="ns")
+
+    @staticmethod
+    def _pivot_wide(df: pl.DataFrame, values: str, fill_value: Optional[float] = None) -> pd.DataFrame:
+        """长表 → 宽表（index=trade_date, columns=ts_code），与 pandas pivot_table 默认均值聚合一致"""
+        wide = (
+            df.pivot(on="ts_code", index="trade_date", values=values, aggregate_function="mean")
+            .sort("trade_date")
+            .with_columns(VectorEngine._trade_date_expr())
+        )
+        codes = sorted(c for c in wide.columns if c != "trade_date")
+        wide = wide.select(["trade_date", *codes])
+        if fill_value is not None:
+            wide = wide.fill_null(fill_value)
+
+        pdf = wide.to_pandas().set_index("trade_date")
+        pdf.columns.name = "ts_code"
+        return pdf.astype(np.float64)
+
+    @staticmethod
+    def _signal_masks(signals: pd.Series | pd.DataFrame) -> tuple:
+        """由信号序列/宽表一次性生成 entries, exits, short_entries, short_exits
+
+        四个掩码由 Numba 内核单次遍历得到；
+        首行的前值视为 NaN，与 pandas shift(1) 的语义一致。
+        """
+        cur = signals.to_numpy(dtype=np.float64)
+        masks = _transition_masks_nb(cur[:, None] if cur.ndim == 1 else cur)
+        if cur.ndim == 1:
+            masks = tuple(m[:, 0] for m in masks)
+
+        if isinstance(signals, pd.DataFrame):
+            return tuple(pd.DataFrame(m, index=signals.index, columns=signals.columns) for m in masks)
+        return tuple(pd.Series(m, index=signals.index, name=signals.name) for m in masks)
 
     def _build_result(self, portfolio: vbt.Portfolio) -> BacktestResult:
         """从 VectorBT Portfolio 构建 BacktestResult"""
-        # 提取指标
-        stats = portfolio.stats()
+        # 提取指标：只计算用到的统计项（基准收益、敞口、持仓时长等不计算）；
+        # 下面的各比率与 stats 共用 VectorBT 缓存的收益序列
+        stats = portfolio.stats(metrics=_STATS_METRICS)
 
         metrics = {
             "total_return": self._safe_float(portfolio.total_return()),
@@ -145,13 +253,93 @@ class VectorEngine:
         equity_series = portfolio.value()
         if isinstance(equity_series, pd.DataFrame):
             equity_series = equity_series.sum(axis=1)
-        equity_pdf = equity_series.reset_index()
-        equity_pdf.columns = ['trade_date', 'equity']
-        equity_curve = pl.from_pandas(equity_pdf)
 
         # 交易记录
         try:
             trades_pdf = portfolio.trades.records_readable
+        except Exception:
+            trades_pdf = pd.DataFrame()
+
+        return self._to_result(metrics, equity_series, trades_pdf)
+
+    def _run_column_chunks(self, close_wide: pd.DataFrame, signal_wide: pd.DataFrame,
+                           chunk_size: int) -> BacktestResult:
+        """按列分块运行多标的回测，合并各块权益曲线和交易记录
+
+        每块只生成本块的掩码和 VectorBT 组合，跑完即释放；
+        初始资金在各块间均分，块内 cash_sharing。
+        """
+        cfg = self.config
+        columns = close_wide.columns
+        batches = [columns[i:i + chunk_size] for i in range(0, len(columns), chunk_size)]
+        init_cash = cfg.initial_capital / len(batches)
+
+        equity_series = None
+        trades = []
+        for batch in batches:
+            entries, exits, short_entries, short_exits = self._signal_masks(signal_wide[batch])
+            portfolio = vbt.Portfolio.from_signals(
+                close=close_wide[batch],
+                entries=entries,
+                exits=exits,
+                short_entries=short_entries,
+                short_exits=short_exits,
+                init_cash=init_cash,
+                fees=cfg.commission_rate,
+                slippage=cfg.slippage_rate,
+                freq='1D',
+                cash_sharing=True,
+            )
+            value = portfolio.value()
+            equity_series = value if equity_series is None else equity_series + value
+            trades.append(portfolio.trades.records_readable)
+            del portfolio
+
+        trades_pdf = pd.concat(trades, ignore_index=True)
+        return self._to_result(self._chunked_metrics(equity_series, trades_pdf), equity_series, trades_pdf)
+
+    def _chunked_metrics(self, equity_series: pd.Series, trades_pdf: pd.DataFrame) -> dict[str, Any]:
+        """由合并后的权益曲线和交易记录计算指标，口径与 _build_result 的 VectorBT stats 一致"""
+        initial = self.config.initial_capital
+        returns_acc = pd.Series.vbt.returns.from_value(equity_series, init_value=initial, freq='1D')
+        total_return = equity_series.iloc[-1] / initial - 1
+
+        closed = trades_pdf[trades_pdf["Status"] == "Closed"]
+        wins = closed[closed["PnL"] > 0]
+        losses = closed[closed["PnL"] < 0]
+        loss_sum = abs(losses["PnL"].sum())
+
+        return {
+            "total_return": self._safe_float(total_return),
+            "annualized_return": self._safe_float(total_return),
+            "sharpe_ratio": self._safe_float(returns_acc.sharpe_ratio()),
+            "sortino_ratio": self._safe_float(returns_acc.sortino_ratio()),
+            "calmar_ratio": self._safe_float(returns_acc.calmar_ratio()),
+            "omega_ratio": self._safe_float(returns_acc.omega_ratio()),
+            "max_drawdown": self._safe_float(returns_acc.max_drawdown()),
+            "max_dd_duration": str(returns_acc.drawdowns.max_duration()),
+            "win_rate": self._safe_float(len(wins) / len(closed) if len(closed) else 0),
+            "profit_factor": self._safe_float(wins["PnL"].sum() / loss_sum if loss_sum else np.inf),
+            "expectancy": self._safe_float(closed["PnL"].mean()),
+            "n_trades": len(trades_pdf),
+            "avg_winning_trade": self._safe_float(wins["Return"].mean()),
+            "avg_losing_trade": self._safe_float(losses["Return"].mean()),
+            "best_trade": self._safe_float(trades_pdf["Return"].max()),
+            "worst_trade": self._safe_float(trades_pdf["Return"].min()),
+            "initial_capital": initial,
+            "final_value": self._safe_float(equity_series.iloc[-1]),
+        }
+
+    @staticmethod
+    def _to_result(metrics: dict[str, Any], equity_series: pd.Series,
+                   trades_pdf: pd.DataFrame) -> BacktestResult:
+        """组装 BacktestResult"""
+        # 直接由索引和值的 NumPy 数组构建，省去 reset_index 和 from_pandas 的整表拷贝
+        equity_curve = pl.DataFrame({
+            "trade_date": equity_series.index.to_numpy(),
+            "equity": equity_series.to_numpy(dtype=np.float64),
+        })
+        try:
             trades_df = pl.from_pandas(trades_pdf) if not trades_pdf.empty else pl.DataFrame()
         except Exception:
             trades_df = pl.DataFrame()
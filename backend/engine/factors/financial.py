@@ -1,35 +1,76 @@
 import polars as pl
 import numpy as np
+from scipy.stats import spearmanr
 
 
 class FactorAnalyzer:
     """IC/Rank IC analysis and factor evaluation."""
 
+    @staticmethod
+    def _valid_pairs(factor: pl.Series, forward_return: pl.Series) -> tuple[np.ndarray, np.ndarray]:
+        """Float arrays of the pairs where both sides are present."""
+        x = factor.cast(pl.Float64).to_numpy()
+        y = forward_return.cast(pl.Float64).to_numpy()
+        mask = ~(np.isnan(x) | np.isnan(y))
+        return x[mask], y[mask]
+
+    @staticmethod
+    def _pearson(x: np.ndarray, y: np.ndarray) -> float:
+        """Closed-form Pearson correlation; NaN for fewer than 5 pairs or zero variance."""
+        if x.size < 5:
+            return float("nan")
+        x = x - x.mean()
+        y = y - y.mean()
+        denom = np.sqrt((x @ x) * (y @ y))
+        return float(x @ y / denom) if denom > 0 else float("nan")
+
     @staticmethod
     def ic(factor: pl.Series, forward_return: pl.Series) -> float:
         """Pearson IC between factor and forward return."""
-        df = pl.DataFrame({"f": factor, "r": forward_return}).drop_nulls()
-        if len(df) < 5:
-            return float("nan")
-        return float(np.corrcoef(df["f"].to_numpy(), df["r"].to_numpy())[0, 1])
+        return FactorAnalyzer._pearson(*FactorAnalyzer._valid_pairs(factor, forward_return))
 
     @staticmethod
     def rank_ic(factor: pl.Series, forward_return: pl.Series) -> float:
         """Spearman Rank IC."""
-        df = pl.DataFrame({"f": factor, "r": forward_return}).drop_nulls()
-        if len(df) < 5:
+        x, y = FactorAnalyzer._valid_pairs(factor, forward_return)
+        if x.size < 5 or np.ptp(x) == 0 or np.ptp(y) == 0:
             return float("nan")
-        return float(np.corrcoef(df["f"].rank("average").to_numpy(), df["r"].rank("average").to_numpy())[0, 1])
+        return float(spearmanr(x, y).statistic)
 
     @staticmethod
     def ic_series(df: pl.DataFrame, factor_col: str, return_col: str) -> pl.DataFrame:
         """Compute IC per date."""
-        results = []
-        for date, group in df.group_by("trade_date"):
-            ic_val = FactorAnalyzer.ic(group[factor_col], group[return_col])
-            rank_ic_val = FactorAnalyzer.rank_ic(group[factor_col], group[return_col])
-            results.append({"trade_date": date[0], "ic": ic_val, "rank_ic": rank_ic_val})
-        return pl.DataFrame(results).sort("trade_date")
+        dates = df.select("trade_date").unique()
+        per_date = (
+            df.select(
+                "trade_date",
+                pl.col(factor_col).cast(pl.Float64).fill_nan(None).alias("f"),
+                pl.col(return_col).cast(pl.Float64).fill_nan(None).alias("r"),
+            )
+            # NaN counts as missing, matching _valid_pairs in ic()/rank_ic()
+            .drop_nulls()
+            .with_columns(
+                pl.col("f").rank("average").over("trade_date").alias("_fr"),
+                pl.col("r").rank("average").over("trade_date").alias("_rr"),
+            )
+            .group_by("trade_date")
+            .agg(
+                pl.len().alias("_n"),
+                pl.corr("f", "r").alias("ic"),
+                pl.corr("_fr", "_rr").alias("rank_ic"),
+            )
+        )
+        # Dates with fewer than 5 valid pairs (or none at all) yield NaN, as ic()/rank_ic() do
+        too_small = pl.col("_n").is_null() | (pl.col("_n") < 5)
+        return (
+            dates.join(per_date, on="trade_date", how="left")
+            .select(
+                "trade_date",
+                pl.when(too_small).then(float("nan")).otherwise(pl.col("ic")).alias("ic"),
+                pl.when(too_small).then(float("nan")).otherwise(pl.col("rank_ic")).alias("rank_ic"),
+            )
+            .sort("trade_date")
+        )
 
     @staticmethod
     def ic_summary(ic_df: pl.DataFrame) -> dict:
@@ -49,11 +90,14 @@ class FactorAnalyzer:
     def layered_returns(df: pl.DataFrame, factor_col: str, return_col: str,
                         n_groups: int = 5) -> pl.DataFrame:
         """Stratified return analysis by factor quantile."""
+        col = pl.col(factor_col)
         df = df.with_columns(
-            pl.col(factor_col).rank("average").over("trade_date").alias("_rank"),
-            pl.col(factor_col).count().over("trade_date").alias("_count"),
-        ).with_columns(
-            (pl.col("_rank") / pl.col("_count") * n_groups).ceil().cast(pl.Int32).clip(1, n_groups).alias("quantile")
+            (col.rank("average") / col.count() * n_groups)
+            .ceil()
+            .clip(1, n_groups)
+            .over("trade_date")
+            .cast(pl.Int32)
+            .alias("quantile")
         )
         return df.group_by(["trade_date", "quantile"]).agg(
             pl.col(return_col).mean().alias("avg_return")
@@ -63,10 +107,7 @@ class FactorAnalyzer:
     def correlation_matrix(df: pl.DataFrame, factor_cols: list[str]) -> pl.DataFrame:
         """Factor correlation matrix."""
         sub = df.select(factor_cols).drop_nulls()
-        corr_data = {}
-        for col_a in factor_cols:
-            row = {}
-            for col_b in factor_cols:
-                row[col_b] = float(np.corrcoef(sub[col_a].to_numpy(), sub[col_b].to_numpy())[0, 1])
-            corr_data[col_a] = row
-        return pl.DataFrame(corr_data)
+        # One corrcoef call on the K x N matrix instead of K^2 pairwise calls
+        mat = np.ascontiguousarray(sub.to_numpy().T, dtype=np.float64)
+        corr = np.atleast_2d(np.corrcoef(mat))
+        return pl.DataFrame({col: corr[i] for i, col in enumerate(factor_cols)})
@@ -1,22 +1,29 @@
+from typing import TypeVar
+
 import polars as pl
 import numpy as np
 
 
+# Indicators are written against the API shared by pl.Series and pl.Expr:
+# Series in -> Series out (eager), Expr in -> Expr out (for lazy plans).
+SeriesOrExpr = TypeVar("SeriesOrExpr", pl.Series, pl.Expr)
+
+
 class TechnicalFactors:
     """High-performance technical indicator library using Polars."""
 
     @staticmethod
-    def sma(series: pl.Series, window: int) -> pl.Series:
+    def sma(series: SeriesOrExpr, window: int) -> SeriesOrExpr:
         """Simple Moving Average."""
         return series.rolling_mean(window_size=window, min_periods=1)
 
     @staticmethod
-    def ema(series: pl.Series, window: int) -> pl.Series:
+    def ema(series: SeriesOrExpr, window: int) -> SeriesOrExpr:
         """Exponential Moving Average."""
         return series.ewm_mean(span=window, adjust=False)
 
     @staticmethod
-    def rsi(series: pl.Series, window: int = 14) -> pl.Series:
+    def rsi(series: SeriesOrExpr, window: int = 14) -> SeriesOrExpr:
         """Relative Strength Index."""
         delta = series.diff()
         gain = delta.clip(lower_bound=0)
@@ -27,8 +34,8 @@ class TechnicalFactors:
         return 100 - (100 / (1 + rs))
 
     @staticmethod
-    def macd(series: pl.Series, fast: int = 12, slow: int = 26, signal: int = 9
-             ) -> tuple[pl.Series, pl.Series, pl.Series]:
+    def macd(series: SeriesOrExpr, fast: int = 12, slow: int = 26, signal: int = 9
+             ) -> tuple[SeriesOrExpr, SeriesOrExpr, SeriesOrExpr]:
         """MACD, Signal, Histogram."""
         ema_fast = series.ewm_mean(span=fast, adjust=False)
         ema_slow = series.ewm_mean(span=slow, adjust=False)
@@ -38,9 +45,9 @@ class TechnicalFactors:
         return macd_line, signal_line, histogram
 
     @staticmethod
-    def kdj(high: pl.Series, low: pl.Series, close: pl.Series,
+    def kdj(high: SeriesOrExpr, low: SeriesOrExpr, close: SeriesOrExpr,
             n: int = 9, m1: int = 3, m2: int = 3
-            ) -> tuple[pl.Series, pl.Series, pl.Series]:
+            ) -> tuple[SeriesOrExpr, SeriesOrExpr, SeriesOrExpr]:
         """KDJ stochastic oscillator."""
         low_n = low.rolling_min(window_size=n, min_periods=1)
         high_n = high.rolling_max(window_size=n, min_periods=1)
@@ -51,8 +58,8 @@ class TechnicalFactors:
         return k, d, j
 
     @staticmethod
-    def bollinger_bands(series: pl.Series, window: int = 20, num_std: float = 2.0
-                        ) -> tuple[pl.Series, pl.Series, pl.Series]:
+    def bollinger_bands(series: SeriesOrExpr, window: int = 20, num_std: float = 2.0
+                        ) -> tuple[SeriesOrExpr, SeriesOrExpr, SeriesOrExpr]:
         """Bollinger Bands: upper, middle, lower."""
         mid = series.rolling_mean(window_size=window, min_periods=1)
         std = series.rolling_std(window_size=window, min_periods=1)
@@ -61,39 +68,49 @@ class TechnicalFactors:
         return upper, mid, lower
 
     @staticmethod
-    def atr(high: pl.Series, low: pl.Series, close: pl.Series, window: int = 14) -> pl.Series:
+    def atr(high: SeriesOrExpr, low: SeriesOrExpr, close: SeriesOrExpr,
+            window: int = 14) -> SeriesOrExpr:
         """Average True Range."""
-        prev_close = close.shift(1)
-        tr = pl.Series([max(h - l, abs(h - pc), abs(l - pc))
-                        for h, l, pc in zip(high, low, prev_close.fill_null(close[0]))])
+        # First bar has no previous close: seed it with its own close
+        prev_close = close.shift(1).fill_null(strategy="backward")
+        tr = pl.max_horizontal(high - low, (high - prev_close).abs(), (low - prev_close).abs())
+        if isinstance(close, pl.Series):
+            tr = pl.select(tr.alias("tr")).to_series()
         return tr.ewm_mean(span=window, adjust=False)
 
     @staticmethod
-    def rolling_std(series: pl.Series, window: int) -> pl.Series:
+    def rolling_std(series: SeriesOrExpr, window: int) -> SeriesOrExpr:
         return series.rolling_std(window_size=window, min_periods=1)
 
     @staticmethod
-    def rolling_mean(series: pl.Series, window: int) -> pl.Series:
+    def rolling_mean(series: SeriesOrExpr, window: int) -> SeriesOrExpr:
         return series.rolling_mean(window_size=window, min_periods=1)
 
 
 class CrossSectionalFactors:
     """Cross-sectional operators applied across stocks on the same date."""
 
+    @staticmethod
+    def rank_expr(col: str) -> pl.Expr:
+        """Cross-sectional rank expression, output column `{col}_rank`."""
+        return pl.col(col).rank("average").over("trade_date").alias(f"{col}_rank")
+
+    @staticmethod
+    def zscore_expr(col: str) -> pl.Expr:
+        """Cross-sectional Z-score expression, output column `{col}_zscore`."""
+        # Single window: mean and std share one partitioning pass over trade_date
+        return ((pl.col(col) - pl.col(col).mean()) / (pl.col(col).std() + 1e-10)
+                ).over("trade_date").alias(f"{col}_zscore")
+
     @staticmethod
     def rank(df: pl.DataFrame, col: str) -> pl.DataFrame:
         """Cross-sectional rank (percentile) per date."""
-        return df.with_columns(
-            pl.col(col).rank("average").over("trade_date").alias(f"{col}_rank")
-        )
+        return df.with_columns(CrossSectionalFactors.rank_expr(col))
 
     @staticmethod
     def zscore(df: pl.DataFrame, col: str) -> pl.DataFrame:
         """Cross-sectional Z-score per date."""
-        return df.with_columns(
-            ((pl.col(col) - pl.col(col).mean().over("trade_date")) /
-             (pl.col(col).std().over("trade_date") + 1e-10)).alias(f"{col}_zscore")
-        )
+        return df.with_columns(CrossSectionalFactors.zscore_expr(col))
 
     @staticmethod
     def neutralize(df: pl.DataFrame, factor_col: str, group_col: str) -> pl.DataFrame:
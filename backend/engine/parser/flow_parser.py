@@ -1,3 +1,7 @@
+import functools
+import operator
+from enum import IntEnum
+
 import polars as pl
 from engine.factors.technical import TechnicalFactors, CrossSectionalFactors
 from engine.backtester.vector_engine import VectorEngine, BacktestConfig
@@ -17,6 +21,122 @@ OPERATOR_REGISTRY = {
 }
 
 
+# Operator builders: (node data, output column) -> list of column expressions
+def _build_sma(data: dict, out_col: str) -> list:
+    return [TechnicalFactors.sma(pl.col("close"), data.get("window", 20)).alias(out_col)]
+
+
+def _build_ema(data: dict, out_col: str) -> list:
+    return [TechnicalFactors.ema(pl.col("close"), data.get("window", 20)).alias(out_col)]
+
+
+def _build_rsi(data: dict, out_col: str) -> list:
+    return [TechnicalFactors.rsi(pl.col("close"), data.get("window", 14)).alias(out_col)]
+
+
+def _build_macd(data: dict, out_col: str) -> list:
+    macd_line, signal_line, hist = TechnicalFactors.macd(
+        pl.col("close"),
+        data.get("fast", 12),
+        data.get("slow", 26),
+        data.get("signal", 9),
+    )
+    return [
+        macd_line.alias(f"{out_col}_macd"),
+        signal_line.alias(f"{out_col}_signal"),
+        hist.alias(f"{out_col}_hist"),
+    ]
+
+
+def _build_kdj(data: dict, out_col: str) -> list:
+    k, d, j = TechnicalFactors.kdj(
+        pl.col("high"), pl.col("low"), pl.col("close"),
+        data.get("n", 9), data.get("m1", 3), data.get("m2", 3),
+    )
+    return [k.alias(f"{out_col}_k"), d.alias(f"{out_col}_d"), j.alias(f"{out_col}_j")]
+
+
+def _build_bollinger(data: dict, out_col: str) -> list:
+    upper, mid, lower = TechnicalFactors.bollinger_bands(
+        pl.col("close"), data.get("window", 20), data.get("num_std", 2.0)
+    )
+    return [
+        upper.alias(f"{out_col}_upper"),
+        mid.alias(f"{out_col}_mid"),
+        lower.alias(f"{out_col}_lower"),
+    ]
+
+
+def _build_rank(data: dict, out_col: str) -> list:
+    return [CrossSectionalFactors.rank_expr(data.get("col", "close"))]
+
+
+def _build_zscore(data: dict, out_col: str) -> list:
+    return [CrossSectionalFactors.zscore_expr(data.get("col", "close"))]
+
+
+class Op(IntEnum):
+    """Operator ids; a node's op string is resolved to one of these once per run."""
+    SMA = 0
+    EMA = 1
+    RSI = 2
+    MACD = 3
+    KDJ = 4
+    BOLLINGER = 5
+    RANK = 6
+    ZSCORE = 7
+
+    @classmethod
+    def parse(cls, name: str) -> "Op | None":
+        return _OP_BY_NAME.get(name)
+
+
+_OP_BY_NAME = {op.name.lower(): op for op in Op}
+
+# Handler table indexed by Op
+OPERATOR_BUILDERS = (
+    _build_sma,
+    _build_ema,
+    _build_rsi,
+    _build_macd,
+    _build_kdj,
+    _build_bollinger,
+    _build_rank,
+    _build_zscore,
+)
+assert len(OPERATOR_BUILDERS) == len(Op)
+
+
+_COMPARISONS = {
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "==": operator.eq,
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_condition(condition: str, signal_col: str) -> pl.Expr | None:
+    """Compile a "col op value" / "col op col" condition into a cached signal expression.
+
+    Returns None when the condition is not a three-token comparison.
+    """
+    parts = condition.split()
+    if len(parts) != 3:
+        return None
+    left, op, right = parts
+    left_expr = pl.col(left)
+    try:
+        right_expr = pl.lit(float(right))
+    except ValueError:
+        right_expr = pl.col(right)
+
+    compare = _COMPARISONS.get(op)
+    cond_expr = compare(left_expr, right_expr) if compare else pl.lit(True)
+    return pl.when(cond_expr).then(1).otherwise(0).alias(signal_col)
+
+
 class FlowParser:
     """
     Parses a React Flow JSON graph into a sequential computation chain
@@ -43,8 +163,6 @@ class FlowParser:
     def __init__(self, df_loader):
         """df_loader: callable(ts_code, start, end) -> pl.DataFrame"""
         self.df_loader = df_loader
-        self.tf = TechnicalFactors()
-        self.cs = CrossSectionalFactors()
 
     def parse_and_run(self, graph: dict) -> dict:
         nodes = {n["id"]: n for n in graph["nodes"]}
@@ -52,16 +170,35 @@ class FlowParser:
 
         # Build execution order via topological sort
         order = self._topo_sort(nodes, edges)
+        # Resolve operator names to Op ids once, up front
+        ops = {
+            nid: Op.parse(n.get("data", {}).get("op", ""))
+            for nid, n in nodes.items() if n["type"] == "operator"
+        }
 
-        df: pl.DataFrame | None = None
+        # The whole chain is built on a LazyFrame and collected once before the backtest
+        df: pl.LazyFrame | None = None
         backtest_config = BacktestConfig()
         signal_col = "signal"
 
+        # Consecutive operator nodes are batched into one with_columns call;
+        # the batch is flushed when a node reads or rewrites a pending column.
+        pending: dict[str, pl.Expr] = {}
+
+        def flush(frame: pl.LazyFrame | None) -> pl.LazyFrame | None:
+            if pending:
+                frame = frame.with_columns(list(pending.values()))
+                pending.clear()
+            return frame
+
         for node_id in order:
             node = nodes[node_id]
             ntype = node["type"]
             data = node.get("data", {})
 
+            if ntype != "operator":
+                df = flush(df)
+
             if ntype == "data_input":
                 df = self.df_loader(
                     data["ts_code"],
@@ -71,11 +208,18 @@ class FlowParser:
                 if df is None or df.is_empty():
                     raise ValueError(f"No data for {data['ts_code']}")
                 logger.info(f"Loaded {len(df)} rows for {data['ts_code']}")
+                df = df.lazy()
 
             elif ntype == "operator":
                 if df is None:
                     raise ValueError("Operator node reached before data_input")
-                df = self._apply_operator(df, data)
+                if self._operator_inputs(data) & pending.keys():
+                    df = flush(df)
+                exprs = self._operator_exprs(data, ops[node_id])
+                names = [e.meta.output_name() for e in exprs]
+                if pending.keys() & set(names):
+                    df = flush(df)
+                pending.update(zip(names, exprs))
 
             elif ntype == "signal":
                 if df is None:
@@ -91,11 +235,12 @@ class FlowParser:
                     slippage_rate=cfg_data.get("slippage_rate", 0.0001),
                 )
 
+        df = flush(df)
         if df is None:
             raise ValueError("Graph produced no data")
 
         engine = VectorEngine(backtest_config)
-        result = engine.run(df, signal_col=signal_col)
+        result = engine.run(df.collect(), signal_col=signal_col)
 
         return {
             "metrics": result.metrics,
@@ -103,52 +248,26 @@ class FlowParser:
             "trades_sample": result.trades.head(100).to_dicts(),
         }
 
-    def _apply_operator(self, df: pl.DataFrame, data: dict) -> pl.DataFrame:
-        op = data.get("op", "")
-        out_col = data.get("output_col", op)
-
-        if op == "sma":
-            df = df.with_columns(
-                TechnicalFactors.sma(df["close"], data.get("window", 20)).alias(out_col)
-            )
-        elif op == "ema":
-            df = df.with_columns(
-                TechnicalFactors.ema(df["close"], data.get("window", 20)).alias(out_col)
-            )
-        elif op == "rsi":
-            df = df.with_columns(
-                TechnicalFactors.rsi(df["close"], data.get("window", 14)).alias(out_col)
-            )
-        elif op == "macd":
-            macd_line, signal_line, hist = TechnicalFactors.macd(
-                df["close"],
-                data.get("fast", 12),
-                data.get("slow", 26),
-                data.get("signal", 9),
-            )
-            df = df.with_columns([
-                macd_line.alias(f"{out_col}_macd"),
-                signal_line.alias(f"{out_col}_signal"),
-                hist.alias(f"{out_col}_hist"),
-            ])
-        elif op == "bollinger":
-            upper, mid, lower = TechnicalFactors.bollinger_bands(
-                df["close"], data.get("window", 20), data.get("num_std", 2.0)
-            )
-            df = df.with_columns([
-                upper.alias(f"{out_col}_upper"),
-                mid.alias(f"{out_col}_mid"),
-                lower.alias(f"{out_col}_lower"),
-            ])
-        elif op == "rank":
-            df = CrossSectionalFactors.rank(df, data.get("col", "close"))
-        elif op == "zscore":
-            df = CrossSectionalFactors.zscore(df, data.get("col", "close"))
-        else:
-            logger.warning(f"Unknown operator: {op}")
-        return df
+    @staticmethod
+    def _operator_exprs(data: dict, op: Op | None) -> list[pl.Expr]:
+        """Build the new column expressions for one operator node."""
+        name = data.get("op", "")
+        if op is None:
+            logger.warning(f"Unknown operator: {name}")
+            return []
+        return OPERATOR_BUILDERS[op](data, data.get("output_col", name))
 
-    def _apply_signal(self, df: pl.DataFrame, data: dict, signal_col: str) -> pl.DataFrame:
+    @staticmethod
+    def _operator_inputs(data: dict) -> set[str]:
+        """Columns an operator node reads."""
+        spec = OPERATOR_REGISTRY.get(data.get("op", ""), {})
+        if spec.get("cross_sectional"):
+            return {data.get("col", "close")}
+        inputs = spec.get("input", [])
+        return {inputs} if isinstance(inputs, str) else set(inputs)
+
+    def _apply_signal(self, df: pl.DataFrame | pl.LazyFrame, data: dict,
+                      signal_col: str) -> pl.DataFrame | pl.LazyFrame:
         """
         Evaluate a simple condition string to generate buy/sell signals.
         condition examples: "close > sma20", "rsi14 < 30"
@@ -160,31 +279,13 @@ class FlowParser:
 
         # Parse simple "col op value" or "col op col" conditions
         try:
-            parts = condition.split()
-            if len(parts) == 3:
-                left, op, right = parts
-                left_expr = pl.col(left)
-                try:
-                    right_expr = pl.lit(float(right))
-                except ValueError:
-                    right_expr = pl.col(right)
-
-                if op == ">":
-                    cond_expr = left_expr > right_expr
-                elif op == "<":
-                    cond_expr = left_expr < right_expr
-                elif op == ">=":
-                    cond_expr = left_expr >= right_expr
-                elif op == "<=":
-                    cond_expr = left_expr <= right_expr
-                elif op == "==":
-                    cond_expr = left_expr == right_expr
-                else:
-                    cond_expr = pl.lit(True)
-
-                df = df.with_columns(
-                    pl.when(cond_expr).then(1).otherwise(0).alias(signal_col)
-                )
+            signal_expr = _compile_condition(condition, signal_col)
+            if signal_expr is not None:
+                # Resolve columns up front: on a LazyFrame a bad name would only fail at collect
+                missing = set(signal_expr.meta.root_names()) - set(df.collect_schema().names())
+                if missing:
+                    raise pl.exceptions.ColumnNotFoundError(", ".join(sorted(missing)))
+                df = df.with_columns(signal_expr)
         except Exception as e:
             logger.warning(f"Signal condition parse error: {e}, defaulting to 1")
             df = df.with_columns(pl.lit(1).alias(signal_col))
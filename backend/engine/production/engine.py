@@ -2,16 +2,21 @@
 因子生产引擎
 负责数据加载、因子计算调度、结果存储
 """
+import dataclasses
+import functools
+import json
+import threading
+
 import pandas as pd
 import polars as pl
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 
 from app.core.logger import logger
 from app.core.utils import TradingCalendar
 from data_manager.processor import DataProcessor
 from engine.production.registry import (
-    FactorDefinition, StorageConfig, get_factor, get_registry, list_factors, discover_factors
+    FactorDefinition, StorageConfig, get_factor, get_registry, list_factors, discover_factors, batch_cache
 )
 
 
@@ -23,6 +28,12 @@ TABLE_COLUMNS = {
     "sync_index_daily": ["ts_code", "trade_date", "open", "high", "low", "close", "vol", "amount", "pct_chg"],
 }
 
+# 一字涨跌停标记读取的日线列（mark_limit 开启时不做列裁剪）
+LIMIT_COLUMNS = ["open", "high", "low", "close", "vol", "pct_chg"]
+
+# 决定加载结果的预处理选项，批量运行时这些选项一致的同组因子共用一份数据
+FRAME_OPTS = ("adjust_price", "filter_st", "filter_new_stock", "new_stock_days", "mark_limit")
+
 # 增量计算时，需要额外加载的历史窗口天数（用于滚动计算）
 DEFAULT_LOOKBACK_DAYS = 60
 
@@ -30,22 +41,83 @@ DEFAULT_LOOKBACK_DAYS = 60
 IPO_EXCLUDE_DAYS = 60
 
 
+@dataclasses.dataclass(frozen=True, slots=True)
+class PreprocessOpts:
+    """因子计算预处理选项（不可变，按优先级逐层 merge）"""
+    adjust_price: str = "forward"     # 复权方式: "none" / "forward" / "backward"
+    filter_st: bool = True            # 过滤 ST/*ST 股票
+    filter_new_stock: bool = True     # 过滤新股
+    new_stock_days: int = IPO_EXCLUDE_DAYS  # 新股排除天数
+    handle_suspension: bool = True    # 停牌复牌处理
+    mark_limit: bool = True           # 标记一字涨跌停
+
+    def merge(self, overrides: Optional[Dict[str, Any]]) -> "PreprocessOpts":
+        """用 overrides 中已知且非 None 的字段覆盖，无改动时返回自身"""
+        if not overrides:
+            return self
+        changes = {k: v for k, v in overrides.items() if v is not None and k in _PREPROCESS_FIELDS}
+        return dataclasses.replace(self, **changes) if changes else self
+
+
+_PREPROCESS_FIELDS = frozenset(f.name for f in dataclasses.fields(PreprocessOpts))
+
+# 默认预处理选项
+DEFAULT_OPTS = PreprocessOpts()
+
+
+@functools.lru_cache(maxsize=512)
+def _parse_params_json(raw: str) -> dict:
+    return json.loads(raw)
+
+
+def _parse_preprocess(params) -> dict:
+    """取 params 中的 preprocess 配置；JSON 文本按原文缓存解析结果（调用方只读）"""
+    if not params:
+        return {}
+    if isinstance(params, str):
+        params = _parse_params_json(params)
+    return params.get("preprocess", {})
+
+
+# 各线程复用的引擎实例，见 thread_engine
+_thread_local = threading.local()
+
+
+def thread_engine(db_client) -> "ProductionEngine":
+    """返回当前线程复用的 ProductionEngine
+
+    Flow 任务在线程池中执行，同一线程的后续任务沿用股票列表等跨任务缓存；
+    批量运行的状态挂在实例上，不在线程间共享。
+    """
+    engine = getattr(_thread_local, "engine", None)
+    if engine is None or engine.db is not db_client:
+        engine = _thread_local.engine = ProductionEngine(db_client)
+    return engine
+
+
 class ProductionEngine:
     """因子生产引擎"""
 
     def __init__(self, db_client):
         self.db = db_client
         self.trading_cal = TradingCalendar.get_instance(db_client)
-
-    # 默认预处理选项
-    DEFAULT_PREPROCESS = {
-        "adjust_price": "forward",
-        "filter_st": True,
-        "filter_new_stock": True,
-        "new_stock_days": 60,
-        "handle_suspension": True,
-        "mark_limit": True,
-    }
+        # 股票列表缓存：(自然日, ST 股票代码, 含上市日期的股票)，跨任务复用
+        self._stock_cache: Optional[Tuple[str, pl.DataFrame, pl.DataFrame]] = None
+        # 批量运行期间预取的元数据：factor_id -> (preprocess, last_computed_date)
+        self._meta_cache: Optional[Dict[str, Tuple[dict, Optional[str]]]] = None
+        # 批量运行期间暂存的元数据行，None 表示逐个写入
+        self._pending_meta: Optional[List[Dict[str, Any]]] = None
+        # 批量运行期间被后续因子依赖的结果：factor_id -> (calc_start, calc_end, 结果)
+        self._keep_results: set = set()
+        self._batch_results: Dict[str, Tuple[str, str, pl.DataFrame]] = {}
+        # 批量运行期间按 depends_on 分组：签名 -> (组内最大 lookback, 组内列并集，空表示不裁剪)
+        self._batch_groups: Dict[Tuple[str, ...], Tuple[int, List[str]]] = {}
+        # 批量运行期间的数据缓存，None 表示不缓存：
+        # 同组按最早起点加载一次的原始数据 (合并后的源数据, 复权因子)，以及各因子切片预处理后的数据
+        self._batch_sources: Optional[Dict[tuple, tuple]] = None
+        self._batch_frames: Optional[Dict[tuple, Optional[pl.DataFrame]]] = None
+        # 批量运行期间各因子的失败原因：factor_id -> 异常文本，None 表示不收集
+        self._batch_errors: Optional[Dict[str, str]] = None
 
     def run_task(
         self,
@@ -74,8 +146,8 @@ class ProductionEngine:
 
         # 优先级：显式传入 > DB factor_metadata.params.preprocess > 代码 params.preprocess > 全局默认
         factor_pp = definition.params.get("preprocess", {}) if definition.params else {}
-        db_pp = self._get_factor_preprocess(factor_id)
-        opts = {**self.DEFAULT_PREPROCESS, **factor_pp, **db_pp, **(preprocess or {})}
+        db_pp, last_date = self._get_factor_meta(factor_id)
+        opts = DEFAULT_OPTS.merge(factor_pp).merge(db_pp).merge(preprocess)
 
         compute_mode = mode or definition.compute_mode
         started_at = datetime.now()
@@ -86,7 +158,7 @@ class ProductionEngine:
 
             # 1. 确定日期范围
             calc_start, calc_end, data_start = self._resolve_dates(
-                factor_id, compute_mode, target_date, start_date, end_date, definition
+                factor_id, compute_mode, target_date, start_date, end_date, definition, last_date
             )
 
             if calc_start is None:
@@ -96,8 +168,9 @@ class ProductionEngine:
 
             logger.info(f"Factor {factor_id}: computing {calc_start} ~ {calc_end}, loading data from {data_start}")
 
-            # 2. 加载依赖数据（复权处理由 adjust_price 选项控制）
-            df = self._load_data(definition, data_start, calc_end, adjust_price=opts["adjust_price"])
+            # 2. 加载依赖数据并预处理（复权、特殊股票过滤、涨跌停标记）
+            load_start = self._group_load_start(definition, calc_start, data_start)
+            df = self._prepare_data(definition, data_start, calc_end, opts, load_start)
             if df is None or df.is_empty():
                 logger.warning(f"No data loaded for factor {factor_id}")
                 self._finish_run_record(run_id, "success", 0, started_at, "no data in date range")
@@ -105,28 +178,17 @@ class ProductionEngine:
 
             logger.info(f"Loaded {len(df)} rows for factor {factor_id}")
 
-            # 2.5 过滤特殊股票（根据选项）
-            if opts["filter_st"] or opts["filter_new_stock"]:
-                df = self._filter_special_stocks(
-                    df, data_start,
-                    filter_st=opts["filter_st"],
-                    filter_new_stock=opts["filter_new_stock"],
-                    new_stock_days=opts["new_stock_days"],
-                )
-
-            # 2.6 标记一字涨跌停（根据选项）
-            if opts["mark_limit"] and "sync_daily_data" in definition.depends_on and "open" in df.columns:
-                df = DataProcessor.mark_limit_up_down(df)
-
             # 3. 执行因子计算
             result = definition.func(df, definition.params)
+            if isinstance(result, pl.LazyFrame):
+                result = result.collect()
             if result is None or result.is_empty():
                 logger.warning(f"Factor {factor_id} returned empty result")
                 self._finish_run_record(run_id, "success", 0, started_at, "empty result")
                 return False
 
             # 3.5 停牌复牌处理（根据选项）
-            if opts["handle_suspension"] and "factor_value" in result.columns and self.trading_cal.is_loaded:
+            if opts.handle_suspension and "factor_value" in result.columns and self.trading_cal.is_loaded:
                 window = definition.params.get("window", 20)
                 trading_days = self.trading_cal.get_trading_days(data_start, calc_end)
                 result = result.sort(["ts_code", "trade_date"])
@@ -135,22 +197,26 @@ class ProductionEngine:
                 result = result.drop_nulls(subset=["factor_value"])
 
             # 4. 过滤到目标日期范围（增量模式下去掉 lookback 窗口的数据）
-            if "trade_date" in result.columns:
-                result = result.filter(
-                    (pl.col("trade_date") >= calc_start) &
-                    (pl.col("trade_date") <= calc_end)
-                )
-
             # 4.5 生成因子质量标记
-            result = self._build_quality_flag(result, df)
+            # 两步合并为一个惰性计划，日期谓词同时下推到源数据，lookback 部分不参与 join
+            result_lf, source_lf = result.lazy(), df.lazy()
+            if "trade_date" in result.columns:
+                in_range = (pl.col("trade_date") >= calc_start) & (pl.col("trade_date") <= calc_end)
+                result_lf, source_lf = result_lf.filter(in_range), source_lf.filter(in_range)
+            result = self._build_quality_flag(result_lf, source_lf).collect()
 
             logger.info(f"Factor {factor_id} computed {len(result)} rows")
 
             # 5. 存储结果
             rows = self._save_results(factor_id, result, definition.storage)
+            if factor_id in self._keep_results and definition.storage.target == "factor_values":
+                self._batch_results[factor_id] = (
+                    calc_start, calc_end,
+                    result.select(["ts_code", "trade_date", pl.col("factor_value").cast(pl.Float64)]),
+                )
 
-            # 6. 更新因子元数据
-            self._update_metadata(factor_id, definition, calc_end, rows)
+            # 6. 更新因子元数据（复用本次运行已读取的 preprocess，避免重复查询）
+            self._update_metadata(factor_id, definition, calc_end, rows, db_pp)
 
             elapsed = (datetime.now() - started_at).total_seconds()
             logger.info(f"Factor {factor_id} completed: {rows} rows in {elapsed:.1f}s")
@@ -160,17 +226,106 @@ class ProductionEngine:
         except Exception as e:
             logger.error(f"Factor {factor_id} failed: {e}")
             self._finish_run_record(run_id, "failed", 0, started_at, str(e))
+            if self._batch_errors is not None:
+                self._batch_errors[factor_id] = str(e)
             return False
 
+    def run_batch(
+        self, factor_ids: List[str], errors: Optional[Dict[str, str]] = None, **kwargs
+    ) -> Dict[str, bool]:
+        """批量计算因子，参数同 run_task
+
+        errors 非 None 时写入失败因子的异常文本（factor_id -> 错误信息）。
+
+        批内被其他因子依赖的因子先算，其结果留在内存中供依赖方直接读取，
+        只有 lookback 窗口中早于该结果的部分才回查 factor_values。
+        depends_on 相同的因子按组内最大 lookback 和列并集只加载一次，各因子再切回
+        自己的 lookback 起点做复权和特殊股票过滤，结果与逐个 run_task 一致；
+        切片起点与预处理选项都相同的因子共用同一份预处理后的数据。
+        各因子的元数据在批次结束后一次写入。
+        """
+        discover_factors()
+        batch = set(factor_ids)
+        deps: Dict[str, List[str]] = {}
+        members: Dict[Tuple[str, ...], List[FactorDefinition]] = {}
+        for fid in factor_ids:
+            definition = get_factor(fid)
+            deps[fid] = [d for d in definition.depends_on if d in batch and d != fid] if definition else []
+            if definition:
+                members.setdefault(tuple(sorted(definition.depends_on)), []).append(definition)
+
+        # 依赖优先的稳定排序（环依赖时按原顺序）
+        ordered: List[str] = []
+        visiting: set = set()
+
+        def visit(fid: str):
+            if fid in ordered or fid in visiting:
+                return
+            visiting.add(fid)
+            for dep in deps.get(fid, []):
+                visit(dep)
+            visiting.discard(fid)
+            ordered.append(fid)
+
+        for fid in factor_ids:
+            visit(fid)
+
+        remaining = {sig: len(defs) for sig, defs in members.items()}
+        for sig, defs in members.items():
+            lookback = max(d.params.get("lookback_days", DEFAULT_LOOKBACK_DAYS) for d in defs)
+            declared = all(d.columns for d in defs)
+            columns = sorted({c for d in defs for c in d.columns}) if declared else []
+            self._batch_groups[sig] = (lookback, columns)
+
+        self._keep_results = {d for ds in deps.values() for d in ds}
+        self._pending_meta = []
+        self._meta_cache = self._prefetch_meta(ordered)
+        self._batch_sources = {}
+        self._batch_frames = {}
+        self._batch_errors = errors if errors is not None else {}
+        results = {}
+        try:
+            with batch_cache():
+                for fid in ordered:
+                    try:
+                        results[fid] = self.run_task(fid, **kwargs)
+                    except Exception as e:
+                        logger.error(f"Factor {fid} failed: {e}")
+                        self._batch_errors[fid] = str(e)
+                        results[fid] = False
+                    # 组内最后一个因子算完即释放该组数据
+                    definition = get_factor(fid)
+                    sig = tuple(sorted(definition.depends_on)) if definition else None
+                    if sig in remaining:
+                        remaining[sig] -= 1
+                        if not remaining[sig]:
+                            for cache in (self._batch_sources, self._batch_frames):
+                                for key in [k for k in cache if k[0] == sig]:
+                                    del cache[key]
+        finally:
+            self._meta_cache = None
+            self._keep_results = set()
+            self._batch_results.clear()
+            self._batch_groups = {}
+            self._batch_sources = None
+            self._batch_frames = None
+            self._batch_errors = None
+            self.flush_metadata()
+        return results
+
     # ==================== 日期解析 ====================
 
     def _resolve_dates(
         self, factor_id: str, compute_mode: str,
         target_date: Optional[str], start_date: Optional[str],
-        end_date: Optional[str], definition: FactorDefinition
+        end_date: Optional[str], definition: FactorDefinition,
+        last_date: Optional[str] = None,
     ):
         """解析计算日期范围
 
+        Args:
+            last_date: factor_metadata 中记录的最后计算日期（增量续算的起点）
+
         Returns:
             (calc_start, calc_end, data_start)
             - calc_start: 计算结果的起始日期
@@ -184,7 +339,7 @@ class ProductionEngine:
             calc_start = start_date or "20100101"
             calc_end = end_date or today
             # 全量模式也需要 lookback 窗口（用于滚动窗口因子的前 N 行计算）
-            lookback = definition.params.get("lookback_days", DEFAULT_LOOKBACK_DAYS)
+            lookback = self._lookback_days(definition)
             data_start = self.trading_cal.offset_trading_days(calc_start, -lookback) if start_date else calc_start
             return calc_start, calc_end, data_start
 
@@ -197,7 +352,6 @@ class ProductionEngine:
             calc_end = end_date or today
         else:
             # 从上次计算日期的下一天开始
-            last_date = self._get_last_computed_date(factor_id)
             if last_date:
                 calc_start = self._add_days(last_date, 1)
             else:
@@ -208,32 +362,126 @@ class ProductionEngine:
             return None, None, None
 
         # 加载额外的 lookback 窗口数据（用于滚动计算，按交易日偏移）
-        lookback = definition.params.get("lookback_days", DEFAULT_LOOKBACK_DAYS)
+        lookback = self._lookback_days(definition)
         data_start = self.trading_cal.offset_trading_days(calc_start, -lookback)
 
         return calc_start, calc_end, data_start
 
+    @staticmethod
+    def _lookback_days(definition: FactorDefinition) -> int:
+        """因子自身的 lookback 窗口天数"""
+        return definition.params.get("lookback_days", DEFAULT_LOOKBACK_DAYS)
+
+    def _group_load_start(self, definition: FactorDefinition, calc_start: str, data_start: str) -> str:
+        """批量运行时同组数据的加载起点（组内最大 lookback），非批量或无 lookback 时即 data_start"""
+        group = self._batch_groups.get(tuple(sorted(definition.depends_on)))
+        if not group or data_start == calc_start or group[0] <= self._lookback_days(definition):
+            return data_start
+        return min(data_start, self.trading_cal.offset_trading_days(calc_start, -group[0]))
+
     # ==================== 数据加载 ====================
 
+    def _prepare_data(self, definition: FactorDefinition, data_start: str,
+                      calc_end: str, opts: PreprocessOpts,
+                      load_start: Optional[str] = None) -> Optional[pl.DataFrame]:
+        """加载依赖数据并按选项复权、过滤特殊股票、标记一字涨跌停
+
+        批量运行时源数据按组从 load_start 只加载一次，再切回本因子的 data_start 处理，
+        复权基准和新股判定都以 data_start 为准；预处理结果按 (depends_on, 日期范围, 选项) 缓存。
+        """
+        sig = tuple(sorted(definition.depends_on))
+        key = (sig, data_start, calc_end) + tuple(getattr(opts, k) for k in FRAME_OPTS)
+        if self._batch_frames is not None and key in self._batch_frames:
+            logger.info(f"Reusing loaded data for {definition.factor_id} ({', '.join(sig)})")
+            return self._batch_frames[key]
+
+        extra_columns = LIMIT_COLUMNS if opts.mark_limit else None
+        if self._batch_sources is None:
+            df = self._load_data(
+                definition, data_start, calc_end, adjust_price=opts.adjust_price, extra_columns=extra_columns,
+            )
+        else:
+            df = self._load_batch_data(definition, data_start, calc_end, opts, load_start or data_start)
+
+        if df is not None and not df.is_empty():
+            # 过滤特殊股票（根据选项）
+            if opts.filter_st or opts.filter_new_stock:
+                df = self._filter_special_stocks(
+                    df, data_start,
+                    filter_st=opts.filter_st,
+                    filter_new_stock=opts.filter_new_stock,
+                    new_stock_days=opts.new_stock_days,
+                )
+
+            # 标记一字涨跌停（根据选项）
+            if opts.mark_limit and "sync_daily_data" in definition.depends_on and "open" in df.columns:
+                df = DataProcessor.mark_limit_up_down(df)
+
+        if self._batch_frames is not None:
+            self._batch_frames[key] = df
+        return df
+
+    def _load_batch_data(self, definition: FactorDefinition, data_start: str, calc_end: str,
+                         opts: PreprocessOpts, load_start: str) -> Optional[pl.DataFrame]:
+        """从同组共享的源数据切出 [data_start, calc_end]，再复权、排序（同 _load_data）"""
+        sig = tuple(sorted(definition.depends_on))
+        needs_adj = "sync_daily_data" in definition.depends_on and opts.adjust_price != "none"
+        src_key = (sig, load_start, calc_end, opts.mark_limit, needs_adj)
+        if src_key not in self._batch_sources:
+            group = self._batch_groups.get(sig)
+            sources = self._load_sources(
+                definition, load_start, calc_end,
+                extra_columns=LIMIT_COLUMNS if opts.mark_limit else None,
+                columns=group[1] if group else None,
+            )
+            adj = self._load_table_data("sync_adj_factor", load_start, calc_end) if needs_adj else None
+            self._batch_sources[src_key] = (sources, adj)
+        sources, adj = self._batch_sources[src_key]
+        if sources is None:
+            return None
+
+        if load_start < data_start:
+            in_range = pl.col("trade_date") >= data_start
+            sources = sources.filter(in_range)
+            if adj is not None and not adj.is_empty():
+                adj = adj.filter(in_range)
+            if sources.is_empty():
+                return None
+        return self._finish_frame(sources, definition, data_start, calc_end, opts.adjust_price, adj)
+
     def _load_data(self, definition: FactorDefinition,
                    start_date: str, end_date: str,
-                   adjust_price: str = "forward") -> Optional[pl.DataFrame]:
+                   adjust_price: str = "forward",
+                   extra_columns: Optional[List[str]] = None,
+                   columns: Optional[List[str]] = None) -> Optional[pl.DataFrame]:
         """根据 depends_on 加载数据
 
         Args:
             adjust_price: 复权方式 "none"=不复权, "forward"=前复权, "backward"=后复权
+            extra_columns: 预处理额外需要的列，与因子声明的 columns 合并做列裁剪
+            columns: 覆盖因子声明的 columns（批量运行时为同组列并集，空列表表示不裁剪）
         """
+        result = self._load_sources(definition, start_date, end_date, extra_columns, columns)
+        if result is None:
+            return None
+        return self._finish_frame(result, definition, start_date, end_date, adjust_price)
+
+    def _load_sources(self, definition: FactorDefinition, start_date: str, end_date: str,
+                      extra_columns: Optional[List[str]] = None,
+                      columns: Optional[List[str]] = None) -> Optional[pl.DataFrame]:
+        """加载并合并 depends_on 中的各数据源（未复权、未排序）"""
         frames = []
-        needs_adj = "sync_daily_data" in definition.depends_on and adjust_price != "none"
+        columns = definition.columns if columns is None else columns
+        needed = None
+        if columns:
+            needed = set(columns) | set(extra_columns or [])
 
         for dep in definition.depends_on:
             if dep.startswith("factor_"):
                 df = self._load_factor_data(dep, start_date, end_date)
-            elif dep in TABLE_COLUMNS:
-                df = self._load_table_data(dep, start_date, end_date)
             else:
-                # 尝试作为普通表加载
-                df = self._load_table_data(dep, start_date, end_date)
+                # 已知表按 TABLE_COLUMNS 裁剪列，其余尝试作为普通表加载
+                df = self._load_table_data(dep, start_date, end_date, needed)
 
             if df is not None and not df.is_empty():
                 frames.append(df)
@@ -249,23 +497,36 @@ class ProductionEngine:
                 # 只取右表中不重复的列
                 right_cols = [c for c in df.columns if c not in result.columns or c in join_cols]
                 result = result.join(df.select(right_cols), on=join_cols, how="left")
+        return result
 
+    def _finish_frame(self, result: pl.DataFrame, definition: FactorDefinition,
+                      start_date: str, end_date: str, adjust_price: str,
+                      adj_df: Optional[pl.DataFrame] = None) -> pl.DataFrame:
+        """复权并统一排序合并后的源数据"""
         # 复权处理
-        if needs_adj:
-            result = self._apply_adjust(result, start_date, end_date, adjust_price)
+        if "sync_daily_data" in definition.depends_on and adjust_price != "none":
+            result = self._apply_adjust(result, start_date, end_date, adjust_price, adj_df)
 
-        return result
+        # 统一排序一次，因子函数可直接假定 (ts_code, trade_date) 有序；
+        # 多次 join 后列缓冲分散为多个 chunk，rechunk 成连续内存再交给滚动窗口
+        n_chunks = result.n_chunks("all")
+        result = result.sort(["ts_code", "trade_date"]).rechunk()
+        logger.debug(f"Loaded frame chunks: {max(n_chunks)} -> {result.n_chunks()}")
+        return result.with_columns(pl.col("ts_code").set_sorted())
 
     def _apply_adjust(self, df: pl.DataFrame,
                       start_date: str, end_date: str,
-                      adjust_type: str = "forward") -> pl.DataFrame:
+                      adjust_type: str = "forward",
+                      adj_df: Optional[pl.DataFrame] = None) -> pl.DataFrame:
         """对 OHLC 价格做复权处理
 
         Args:
             adjust_type: "forward"=前复权, "backward"=后复权
+            adj_df: 已加载的同区间复权因子，None 时从 sync_adj_factor 读取
         """
         try:
-            adj_df = self._load_table_data("sync_adj_factor", start_date, end_date)
+            if adj_df is None:
+                adj_df = self._load_table_data("sync_adj_factor", start_date, end_date)
             if adj_df is None or adj_df.is_empty():
                 logger.warning("adj_factor 数据为空，跳过复权处理")
                 return df
@@ -276,23 +537,12 @@ class ProductionEngine:
             if "adj_factor" not in df.columns:
                 return df
 
-            # 计算基准复权因子
-            if adjust_type == "forward":
-                # 前复权：以最新日期的 adj_factor 为基准
-                base_adj = (
-                    df.sort(["ts_code", "trade_date"])
-                    .group_by("ts_code")
-                    .agg(pl.col("adj_factor").last().alias("_base_adj"))
-                )
-            else:
-                # 后复权：以最早日期的 adj_factor 为基准
-                base_adj = (
-                    df.sort(["ts_code", "trade_date"])
-                    .group_by("ts_code")
-                    .agg(pl.col("adj_factor").first().alias("_base_adj"))
-                )
-
-            df = df.join(base_adj, on="ts_code", how="left")
+            # 计算基准复权因子（窗口表达式取最新/最早日期的值，无需排序和回连）
+            # 前复权以最新日期的 adj_factor 为基准，后复权以最早日期为基准
+            base_pos = pl.col("trade_date").arg_max() if adjust_type == "forward" else pl.col("trade_date").arg_min()
+            df = df.with_columns(
+                pl.col("adj_factor").get(base_pos).over("ts_code").alias("_base_adj")
+            )
 
             # 复权公式：adjusted_price = price * adj_factor / base_adj
             price_cols = [c for c in ["open", "high", "low", "close"] if c in df.columns]
@@ -323,24 +573,20 @@ class ProductionEngine:
             new_stock_days: 新股排除天数
         """
         try:
-            stock_info = self.db.query(
-                f'SELECT ts_code, name, list_date FROM loadTable("{self.db._db_path}", "sync_stock_basic")'
-            )
-            if stock_info.is_empty():
+            universe = self._get_stock_universe()
+            if universe is None:
                 return df
+            st_codes, listed = universe
 
             before = len(df)
-            exclude_codes: set = set()
+            excludes = []
             st_count = 0
             new_count = 0
 
             # 1. 过滤 ST / *ST 股票
             if filter_st:
-                st_codes = stock_info.filter(
-                    pl.col("name").str.contains("ST")
-                )["ts_code"].to_list()
-                exclude_codes.update(st_codes)
-                st_count = len(st_codes)
+                excludes.append(st_codes)
+                st_count = st_codes.height
 
             # 2. 过滤新股
             if filter_new_stock:
@@ -351,18 +597,18 @@ class ProductionEngine:
                     dt = datetime.strptime(data_start, "%Y%m%d")
                     ipo_cutoff = (dt - timedelta(days=int(new_stock_days * 1.5))).strftime("%Y%m%d")
 
-                new_stock_codes = stock_info.filter(
-                    pl.col("list_date").is_not_null() & (pl.col("list_date") > ipo_cutoff)
-                )["ts_code"].to_list()
-                exclude_codes.update(new_stock_codes)
-                new_count = len(new_stock_codes)
+                new_stock_codes = listed.filter(pl.col("list_date") > ipo_cutoff).select("ts_code")
+                excludes.append(new_stock_codes)
+                new_count = new_stock_codes.height
 
-            if exclude_codes:
-                df = df.filter(~pl.col("ts_code").is_in(list(exclude_codes)))
+            exclude_codes = pl.concat(excludes).unique() if excludes else None
+            if exclude_codes is not None and exclude_codes.height > 0:
+                # anti join 保留左表行序；过滤会把结果切成多个 chunk，重新合并为连续缓冲
+                df = df.join(exclude_codes, on="ts_code", how="anti").rechunk()
                 dropped = before - len(df)
                 if dropped > 0:
                     logger.info(
-                        f"特殊股票过滤: 排除 {len(exclude_codes)} 只股票 "
+                        f"特殊股票过滤: 排除 {exclude_codes.height} 只股票 "
                         f"(ST: {st_count}, 新股: {new_count})，"
                         f"移除 {dropped} 行数据"
                     )
@@ -372,15 +618,33 @@ class ProductionEngine:
             logger.warning(f"特殊股票过滤失败 ({e})，跳过过滤")
             return df
 
+    def _get_stock_universe(self) -> Optional[Tuple[pl.DataFrame, pl.DataFrame]]:
+        """返回 (ST 股票代码, 含上市日期的股票)，按自然日缓存，表为空时返回 None"""
+        today = datetime.now().strftime("%Y%m%d")
+        cache = self._stock_cache
+        if cache is None or cache[0] != today:
+            stock_info = self.db.query(
+                f'SELECT ts_code, name, list_date FROM loadTable("{self.db._db_path}", "sync_stock_basic")'
+            )
+            if stock_info.is_empty():
+                return None
+            # 名称按字面匹配 "ST"（覆盖 ST / *ST / S*ST），不走正则
+            st_codes = stock_info.filter(pl.col("name").str.contains("ST", literal=True)).select("ts_code")
+            listed = stock_info.filter(pl.col("list_date").is_not_null()).select(["ts_code", "list_date"])
+            cache = self._stock_cache = (today, st_codes, listed)
+        return cache[1], cache[2]
+
     def _load_table_data(self, table_name: str, start_date: str,
-                         end_date: str) -> Optional[pl.DataFrame]:
-        """从数据表加载数据"""
+                         end_date: str, needed: Optional[set] = None) -> Optional[pl.DataFrame]:
+        """从数据表加载数据，needed 非空时只查询其中的列（主键列总是保留）"""
         try:
             columns = TABLE_COLUMNS.get(table_name, ["*"])
+            if needed and columns != ["*"]:
+                columns = [c for c in columns if c in needed or c in ("ts_code", "trade_date")]
             col_str = ", ".join(columns) if columns != ["*"] else "*"
 
-            # 检查表是否有 trade_date 列
-            sql = f"SELECT {col_str} FROM {table_name} WHERE trade_date >= %s AND trade_date <= %s ORDER BY ts_code, trade_date"
+            # 不在服务端排序，_load_data 合并后统一排序一次
+            sql = f"SELECT {col_str} FROM {table_name} WHERE trade_date >= %s AND trade_date <= %s"
             return self.db.query(sql, (start_date, end_date))
         except Exception as e:
             logger.error(f"Failed to load data from {table_name}: {e}")
@@ -389,12 +653,24 @@ class ProductionEngine:
     def _load_factor_data(self, factor_id: str, start_date: str,
                           end_date: str) -> Optional[pl.DataFrame]:
         """从 factor_values 表加载已计算的因子数据"""
+        cached = self._batch_results.get(factor_id)
+        if cached is not None and cached[0] <= end_date <= cached[1]:
+            # 本批次刚算出的结果覆盖到 end_date，只需回查其之前的 lookback 部分
+            c_start, _, c_df = cached
+            df = c_df.filter(
+                (pl.col("trade_date") >= max(start_date, c_start)) & (pl.col("trade_date") <= end_date)
+            )
+            if start_date < c_start:
+                head = self._load_factor_data(factor_id, start_date, self._add_days(c_start, -1))
+                if head is not None and not head.is_empty():
+                    return pl.concat([head, df.rename({"factor_value": factor_id})], how="vertical_relaxed")
+            return df.rename({"factor_value": factor_id})
+
         try:
             sql = """
                 SELECT ts_code, trade_date, factor_value
                 FROM factor_values
                 WHERE factor_id = %s AND trade_date >= %s AND trade_date <= %s
-                ORDER BY ts_code, trade_date
             """
             df = self.db.query(sql, (factor_id, start_date, end_date))
             if not df.is_empty():
@@ -408,34 +684,30 @@ class ProductionEngine:
     # ==================== 结果存储 ====================
 
     @staticmethod
-    def _build_quality_flag(result: pl.DataFrame, source_df: pl.DataFrame) -> pl.DataFrame:
-        """根据源数据中的标记列，为因子结果生成 quality_flag（位掩码）。"""
+    def _build_quality_flag(result: pl.LazyFrame, source: pl.LazyFrame) -> pl.LazyFrame:
+        """根据源数据中的标记列，为因子结果生成 quality_flag（位掩码）的计算图。"""
         from app.core.constants import QUALITY_NORMAL, QUALITY_LIMIT_UP, QUALITY_LIMIT_DOWN
 
-        if "_limit_up_down" not in source_df.columns:
+        result, source = result.lazy(), source.lazy()
+        if "_limit_up_down" not in source.collect_schema().names():
             # 无涨跌停标记，默认 quality_flag = 0
             return result.with_columns(pl.lit(QUALITY_NORMAL).alias("quality_flag"))
 
-        # 从源数据提取涨跌停标记，join 到结果上
-        limit_flags = source_df.select(["ts_code", "trade_date", "_limit_up_down"]).unique(
-            subset=["ts_code", "trade_date"]
-        )
-        result = result.join(limit_flags, on=["ts_code", "trade_date"], how="left")
-
-        result = result.with_columns(
-            pl.when(pl.col("_limit_up_down") == 1)
-            .then(pl.lit(QUALITY_LIMIT_UP))
-            .when(pl.col("_limit_up_down") == -1)
-            .then(pl.lit(QUALITY_LIMIT_DOWN))
-            .otherwise(pl.lit(QUALITY_NORMAL))
-            .alias("quality_flag")
+        # 从源数据提取涨跌停标记，join 到结果上（源数据是日线面板，(ts_code, trade_date) 本身唯一，无需去重）
+        limit_flags = source.select(["ts_code", "trade_date", "_limit_up_down"])
+        return (
+            result.join(limit_flags, on=["ts_code", "trade_date"], how="left")
+            .with_columns(
+                pl.when(pl.col("_limit_up_down") == 1)
+                .then(pl.lit(QUALITY_LIMIT_UP))
+                .when(pl.col("_limit_up_down") == -1)
+                .then(pl.lit(QUALITY_LIMIT_DOWN))
+                .otherwise(pl.lit(QUALITY_NORMAL))
+                .alias("quality_flag")
+            )
+            .drop("_limit_up_down")
         )
 
-        if "_limit_up_down" in result.columns:
-            result = result.drop("_limit_up_down")
-
-        return result
-
     def _save_results(self, factor_id: str, df: pl.DataFrame,
                       storage: StorageConfig) -> int:
         """保存因子计算结果"""
@@ -485,76 +757,108 @@ class ProductionEngine:
     # ==================== 元数据管理 ====================
 
     def _update_metadata(self, factor_id: str, definition: FactorDefinition,
-                         last_date: str, rows: int):
-        """更新因子元数据（保留用户设置的 preprocess 配置）"""
-        import json
+                         last_date: str, rows: int, db_pp: Optional[dict] = None):
+        """更新因子元数据（保留用户设置的 preprocess 配置）
+
+        批量运行期间只暂存元数据行，批次结束时由 flush_metadata 一次写入。
+
+        Args:
+            db_pp: 本次运行已读取的 DB preprocess 配置，None 时重新查询
+        """
         try:
             # 合并 params：保留 DB 中用户设置的 preprocess，其余用代码定义覆盖
-            db_pp = self._get_factor_preprocess(factor_id)
+            if db_pp is None:
+                db_pp = self._get_factor_preprocess(factor_id)
             merged_params = dict(definition.params) if definition.params else {}
             if db_pp:
                 merged_params["preprocess"] = db_pp
 
             now = datetime.now()
-            pdf = pd.DataFrame({
-                "factor_id": [factor_id],
-                "description": [definition.description or ""],
-                "category": [definition.category or "custom"],
-                "compute_mode": [definition.compute_mode or "incremental"],
-                "storage_target": [definition.storage.target or "factor_values"],
-                "params": [json.dumps(merged_params)],
-                "last_computed_date": [last_date],
-                "last_computed_at": [now],
-                "created_at": [now],
-                "updated_at": [now],
-            })
-            meta_db = self.db._db_path
-            with self.db._lock:
-                self.db._ensure_connected()
-                # delete + insert 实现 upsert
-                self.db._session.run(
-                    f'fm = loadTable("{meta_db}", "factor_metadata");'
-                    f'delete from fm where factor_id = "{factor_id}"'
-                )
-                tmp = f"_meta_upd_{factor_id}"
-                self.db._session.upload({tmp: pdf})
-                self.db._session.run(
-                    f'fm = loadTable("{meta_db}", "factor_metadata");'
-                    f'tableInsert(fm, {tmp});'
-                    f"undef('{tmp}')"
-                )
+            row = {
+                "factor_id": factor_id,
+                "description": definition.description or "",
+                "category": definition.category or "custom",
+                "compute_mode": definition.compute_mode or "incremental",
+                "storage_target": definition.storage.target or "factor_values",
+                "params": json.dumps(merged_params),
+                "last_computed_date": last_date,
+                "last_computed_at": now,
+                "created_at": now,
+                "updated_at": now,
+            }
+            if self._pending_meta is not None:
+                self._pending_meta.append(row)
+            else:
+                self._write_metadata([row])
         except Exception as e:
             logger.warning(f"Failed to update factor metadata: {e}")
 
-    def _get_last_computed_date(self, factor_id: str) -> Optional[str]:
-        """获取因子最后计算日期"""
+    def flush_metadata(self):
+        """把批量运行期间暂存的元数据一次写入"""
+        pending, self._pending_meta = self._pending_meta, None
+        if not pending:
+            return
+        try:
+            self._write_metadata(pending)
+        except Exception as e:
+            logger.warning(f"Failed to update factor metadata: {e}")
+
+    def _write_metadata(self, rows: List[Dict[str, Any]]):
+        """按 factor_id 替换 factor_metadata 中的行，delete + insert 合并为一次脚本提交
+
+        行以 dict 暂存，上传前才一次构造 pandas 表（DolphinDB upload 只接受 pandas）。
+        """
+        meta_db = self.db._db_path
+        tmp = "_meta_upd"
+        pdf = pd.DataFrame(rows)
+        with self.db._lock:
+            self.db._ensure_connected()
+            self.db._session.upload({tmp: pdf})
+            self.db._session.run(
+                f'fm = loadTable("{meta_db}", "factor_metadata");'
+                f'delete from fm where factor_id in {tmp}.factor_id;'
+                f'tableInsert(fm, {tmp});'
+                f"undef('{tmp}')"
+            )
+
+    def _get_factor_meta(self, factor_id: str) -> Tuple[dict, Optional[str]]:
+        """从 factor_metadata 一次读取 (preprocess 配置, 最后计算日期)
+
+        批量运行期间使用 run_batch 预取的结果，不再逐个查询。
+        """
+        if self._meta_cache is not None and factor_id in self._meta_cache:
+            return self._meta_cache[factor_id]
         try:
             df = self.db.query(
-                "SELECT last_computed_date FROM factor_metadata WHERE factor_id = %s",
+                "SELECT params, last_computed_date FROM factor_metadata WHERE factor_id = %s",
                 (factor_id,)
             )
-            if not df.is_empty() and df["last_computed_date"][0]:
-                return df["last_computed_date"][0]
+            if not df.is_empty():
+                row = df.row(0, named=True)
+                return _parse_preprocess(row["params"]), row["last_computed_date"] or None
         except Exception:
             pass
-        return None
+        return {}, None
 
-    def _get_factor_preprocess(self, factor_id: str) -> dict:
-        """从 factor_metadata 表读取因子的预处理配置"""
-        import json
+    def _prefetch_meta(self, factor_ids: List[str]) -> Dict[str, Tuple[dict, Optional[str]]]:
+        """一次查询批内所有因子的元数据，缺失的因子视为无配置、未计算过"""
+        meta = {fid: ({}, None) for fid in factor_ids}
+        if not factor_ids:
+            return meta
         try:
             df = self.db.query(
-                "SELECT params FROM factor_metadata WHERE factor_id = %s",
-                (factor_id,)
+                "SELECT factor_id, params, last_computed_date FROM factor_metadata WHERE factor_id in %s",
+                (list(factor_ids),)
             )
-            if not df.is_empty() and df["params"][0]:
-                params = df["params"][0]
-                if isinstance(params, str):
-                    params = json.loads(params)
-                return params.get("preprocess", {})
+            for fid, params, last_date in df.select(["factor_id", "params", "last_computed_date"]).iter_rows():
+                meta[fid] = (_parse_preprocess(params), last_date or None)
         except Exception:
             pass
-        return {}
+        return meta
+
+    def _get_factor_preprocess(self, factor_id: str) -> dict:
+        """从 factor_metadata 表读取因子的预处理配置"""
+        return self._get_factor_meta(factor_id)[0]
 
     # ==================== 工具方法 ====================
 
@@ -566,35 +870,39 @@ class ProductionEngine:
         result = dt + timedelta(days=days)
         return result.strftime("%Y%m%d")
 
+    @staticmethod
+    def _ddb_str(value: str) -> str:
+        """转为 DolphinDB 字符串字面量（原样保留 YYYYMMDD，不做日期转换）"""
+        return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
     # ==================== 运行记录 ====================
 
     def _insert_run_record(self, factor_id: str, mode: str,
                            start_date: Optional[str], end_date: Optional[str]) -> Optional[str]:
-        """插入运行记录，返回 run_id (时间戳字符串)"""
+        """插入运行记录，返回 run_id (时间戳字符串)
+
+        单行记录直接以标量字面量 tableInsert，不构造 DataFrame、不上传临时表。
+        """
         try:
             now = datetime.now()
             run_id = now.strftime("%Y%m%d%H%M%S%f")
-            pdf = pd.DataFrame({
-                "factor_id": [factor_id],
-                "mode": [mode or ""],
-                "status": ["running"],
-                "start_date": [start_date or ""],
-                "end_date": [end_date or ""],
-                "rows_affected": [0],
-                "duration_seconds": [0.0],
-                "error_message": [run_id],  # 借用 error_message 存 run_id 用于后续定位
-                "created_at": [now],
-            })
+            created_at = now.strftime("%Y.%m.%dT%H:%M:%S.") + f"{now.microsecond // 1000:03d}"
+            values = ", ".join([
+                self._ddb_str(factor_id),
+                self._ddb_str(mode or ""),
+                '"running"',
+                self._ddb_str(start_date or ""),
+                self._ddb_str(end_date or ""),
+                "0",
+                "0.0",
+                f'"{run_id}"',  # 借用 error_message 存 run_id 用于后续定位
+                created_at,
+            ])
             meta_db = self.db._db_path
-            with self.db._lock:
-                self.db._ensure_connected()
-                tmp = f"_run_{run_id}"
-                self.db._session.upload({tmp: pdf})
-                self.db._session.run(
-                    f'ptr = loadTable("{meta_db}", "factor_task_run");'
-                    f'tableInsert(ptr, {tmp});'
-                    f"undef('{tmp}')"
-                )
+            self.db.execute(
+                f'ptr = loadTable("{meta_db}", "factor_task_run");'
+                f'tableInsert(ptr, {values})'
+            )
             return run_id
         except Exception as e:
             logger.debug(f"Failed to insert run record: {e}")
@@ -14,7 +14,7 @@ def compute_custom(df: pl.DataFrame, params: dict) -> pl.DataFrame:
     w = params.get("window", 20)
 
     return (
-        df.with_columns((1/(pl.col("factor_ma_20"))).alias("factor_value"))
-        .select(["ts_code", "trade_date", "factor_value"])
-        .drop_nulls()
+        df.lazy()
+        .select(["ts_code", "trade_date", (1.0 / pl.col("factor_ma_20")).alias("factor_value")])
+        .filter(pl.col("factor_value").is_not_null())
     )
@@ -1,103 +1,202 @@
 """
 动量和技术因子
 """
+import numpy as np
 import polars as pl
-from engine.production.registry import factor
+from numba import njit
+from engine.production.registry import factor, shared_result
+
+# 一次计算的波动率窗口，批量运行时 factor_volatility_10 / factor_volatility_20 共用
+VOL_WINDOWS = (10, 20)
+
+
+@njit(cache=True)
+def _rsi_kernel(close: np.ndarray, run_ids: np.ndarray, w: int) -> np.ndarray:
+    """按 ts_code 连续区段单次遍历计算 RSI（涨跌幅简单均值），每段前 w-1 行为 NaN
+
+    窗口和逐行直接累加（w 很小），避免滑动加减的浮点残差让全涨窗口的跌幅和不为 0。
+    """
+    n = close.shape[0]
+    out = np.full(n, np.nan)
+    gains = np.zeros(n)
+    losses = np.zeros(n)
+    start = 0
+    for i in range(n):
+        if i == 0 or run_ids[i] != run_ids[i - 1]:
+            start = i
+        elif not (np.isnan(close[i]) or np.isnan(close[i - 1])):
+            change = close[i] - close[i - 1]
+            if change > 0:
+                gains[i] = change
+            else:
+                losses[i] = -change
+        if i - start + 1 >= w:
+            sum_gain = 0.0
+            sum_loss = 0.0
+            for j in range(i - w + 1, i + 1):
+                sum_gain += gains[j]
+                sum_loss += losses[j]
+            if sum_loss == 0.0:
+                out[i] = 100.0
+            else:
+                out[i] = 100.0 - 100.0 / (1.0 + sum_gain / sum_loss)
+    return out
+
+
+@njit(cache=True)
+def _rolling_mean_kernel(x: np.ndarray, run_ids: np.ndarray, w: int) -> np.ndarray:
+    """按 ts_code 连续区段单次遍历计算滚动均值，窗口和滑动加减，O(N) 与窗口长度无关
+
+    每段前 w-1 行及窗口内含 NaN 时为 NaN（与 rolling_mean 的缺失语义一致）。
+    """
+    n = x.shape[0]
+    out = np.full(n, np.nan)
+    total = 0.0
+    nans = 0
+    start = 0
+    for i in range(n):
+        if i == 0 or run_ids[i] != run_ids[i - 1]:
+            start = i
+            total = 0.0
+            nans = 0
+        v = x[i]
+        if np.isnan(v):
+            nans += 1
+        else:
+            total += v
+        if i - start >= w:
+            old = x[i - w]
+            if np.isnan(old):
+                nans -= 1
+            else:
+                total -= old
+        if i - start + 1 >= w and nans == 0:
+            out[i] = total / w
+    return out
+
+
+@njit(cache=True)
+def _rolling_std_kernel(x: np.ndarray, run_ids: np.ndarray, windows: np.ndarray) -> np.ndarray:
+    """单次遍历同时计算多个窗口的滚动样本标准差 (ddof=1)，形状 (len(windows), n)
+
+    每段前 w-1 行及窗口内含 NaN 时为 NaN；窗口内先求均值再累加离差平方，避免前缀和相减的精度损失。
+    """
+    n = x.shape[0]
+    k = windows.shape[0]
+    out = np.full((k, n), np.nan)
+    start = 0
+    for i in range(n):
+        if i == 0 or run_ids[i] != run_ids[i - 1]:
+            start = i
+        for j in range(k):
+            w = windows[j]
+            if i - start + 1 < w:
+                continue
+            total = 0.0
+            for t in range(i - w + 1, i + 1):
+                total += x[t]
+            mean = total / w
+            ss = 0.0
+            for t in range(i - w + 1, i + 1):
+                d = x[t] - mean
+                ss += d * d
+            out[j, i] = np.sqrt(ss / (w - 1))
+    return out
+
+
+def close_moving_average(df: pl.DataFrame, window: int) -> pl.DataFrame:
+    """close 的 window 日均线因子"""
+    run_ids = df.get_column("ts_code").rle_id().to_numpy()
+    close = df.get_column("close").cast(pl.Float64).to_numpy()
+    return (
+        df.select(["ts_code", "trade_date"])
+        .with_columns(pl.Series("factor_value", _rolling_mean_kernel(close, run_ids, window), nan_to_null=True))
+        .filter(pl.col("factor_value").is_not_null())
+    )
+
+
+def pct_chg_volatility(df: pl.DataFrame, window: int) -> pl.DataFrame:
+    """pct_chg 的滚动标准差因子；VOL_WINDOWS 内的窗口在同一批次中只算一次"""
+    windows = VOL_WINDOWS if window in VOL_WINDOWS else (window,)
+
+    def build() -> dict:
+        run_ids = df.get_column("ts_code").rle_id().to_numpy()
+        x = df.get_column("pct_chg").cast(pl.Float64).to_numpy()
+        out = _rolling_std_kernel(x, run_ids, np.asarray(windows, dtype=np.int64))
+        return dict(zip(windows, out))
+
+    stds = shared_result(df, f"pct_chg_rolling_std{windows}", build)
+    return (
+        df.select(["ts_code", "trade_date"])
+        .with_columns(pl.Series("factor_value", stds[window], nan_to_null=True))
+        .filter(pl.col("factor_value").is_not_null())
+    )
 
 
 @factor(
     "factor_ma_5",
     description="5日均线",
     depends_on=["sync_daily_data"],
+    columns=["close"],
     category="technical",
     params={"window": 5, "lookback_days": 20},
 )
 def compute_ma_5(df: pl.DataFrame, params: dict) -> pl.DataFrame:
-    w = params.get("window", 5)
-    return (
-        df.sort(["ts_code", "trade_date"])
-        .with_columns(
-            pl.col("close").rolling_mean(window_size=w).over("ts_code").alias("factor_value")
-        )
-        .select(["ts_code", "trade_date", "factor_value"])
-        .drop_nulls()
-    )
+    return close_moving_average(df, params.get("window", 5))
 
 
 @factor(
     "factor_ma_20",
     description="20日均线",
     depends_on=["sync_daily_data"],
+    columns=["close"],
     category="technical",
     params={"window": 20, "lookback_days": 40},
 )
 def compute_ma_20(df: pl.DataFrame, params: dict) -> pl.DataFrame:
-    w = params.get("window", 20)
-    return (
-        df.sort(["ts_code", "trade_date"])
-        .with_columns(
-            pl.col("close").rolling_mean(window_size=w).over("ts_code").alias("factor_value")
-        )
-        .select(["ts_code", "trade_date", "factor_value"])
-        .drop_nulls()
-    )
+    return close_moving_average(df, params.get("window", 20))
 
 
 @factor(
     "factor_rsi_14",
     description="14日RSI",
     depends_on=["sync_daily_data"],
+    columns=["close"],
     category="technical",
     compute_mode="full",
     params={"window": 14, "lookback_days": 30},
 )
 def compute_rsi_14(df: pl.DataFrame, params: dict) -> pl.DataFrame:
     w = params.get("window", 14)
-    sorted_df = df.sort(["ts_code", "trade_date"])
-
-    result = (
-        sorted_df
-        .with_columns(
-            (pl.col("close") - pl.col("close").shift(1)).over("ts_code").alias("change")
-        )
-        .with_columns([
-            pl.when(pl.col("change") > 0).then(pl.col("change")).otherwise(0.0).alias("gain"),
-            pl.when(pl.col("change") < 0).then(-pl.col("change")).otherwise(0.0).alias("loss"),
-        ])
-        .with_columns([
-            pl.col("gain").rolling_mean(window_size=w).over("ts_code").alias("avg_gain"),
-            pl.col("loss").rolling_mean(window_size=w).over("ts_code").alias("avg_loss"),
-        ])
-        .with_columns(
-            pl.when(pl.col("avg_loss") == 0)
-            .then(100.0)
-            .otherwise(100.0 - 100.0 / (1.0 + pl.col("avg_gain") / pl.col("avg_loss")))
-            .alias("factor_value")
-        )
-        .select(["ts_code", "trade_date", "factor_value"])
-        .drop_nulls()
+    run_ids = df.get_column("ts_code").rle_id().to_numpy()
+    close = df.get_column("close").cast(pl.Float64).to_numpy()
+    return (
+        df.select(["ts_code", "trade_date"])
+        .with_columns(pl.Series("factor_value", _rsi_kernel(close, run_ids, w), nan_to_null=True))
+        .filter(pl.col("factor_value").is_not_null())
     )
-    return result
 
 
 @factor(
     "factor_momentum_20",
     description="20日动量（涨跌幅）",
     depends_on=["sync_daily_data"],
+    columns=["close"],
     category="momentum",
     params={"window": 20, "lookback_days": 40},
 )
 def compute_momentum_20(df: pl.DataFrame, params: dict) -> pl.DataFrame:
     w = params.get("window", 20)
     return (
-        df.sort(["ts_code", "trade_date"])
+        df.lazy()
         .with_columns(
             (pl.col("close") / pl.col("close").shift(w) - 1.0)
             .over("ts_code")
             .alias("factor_value")
         )
         .select(["ts_code", "trade_date", "factor_value"])
-        .drop_nulls()
+        .filter(pl.col("factor_value").is_not_null())
+        .collect()
     )
 
 
@@ -105,16 +204,9 @@ def compute_momentum_20(df: pl.DataFrame, params: dict) -> pl.DataFrame:
     "factor_volatility_20",
     description="20日波动率",
     depends_on=["sync_daily_data"],
+    columns=["pct_chg"],
     category="technical",
     params={"window": 20, "lookback_days": 40},
 )
 def compute_volatility_20(df: pl.DataFrame, params: dict) -> pl.DataFrame:
-    w = 20
-    return (
-        df.sort(["ts_code", "trade_date"])
-        .with_columns(
-            pl.col("pct_chg").rolling_std(window_size=w).over("ts_code").alias("factor_value")
-        )
-        .select(["ts_code", "trade_date", "factor_value"])
-        .drop_nulls()
-    )
+    return pct_chg_volatility(df, 20)
@@ -2,70 +2,71 @@
 价值因子
 """
 import polars as pl
-from engine.production.registry import factor
+from engine.production.registry import factor, shared_result
+
+# 排名百分位因子的源列及有效值条件；同一份数据上各列的 over("trade_date") 在一次 select 中完成
+RANK_COLUMNS = {
+    "pe": pl.col("pe") > 0,
+    "pb": pl.col("pb") > 0,
+    "turnover_rate": pl.lit(True),
+}
+
+
+def daily_rank_pct(df: pl.DataFrame, column: str) -> pl.LazyFrame:
+    """column 在每个交易日的排名百分位（rank / 有效值个数），无效值不参与排名
+
+    df 中存在的 RANK_COLUMNS 列一次算完，批量运行时同组因子共用结果；
+    取列与去空作为惰性计划返回，由引擎 collect 时合并为一次扫描。
+    """
+    present = tuple(c for c in RANK_COLUMNS if c in df.columns)
+
+    def build() -> pl.DataFrame:
+        exprs = []
+        for c in present:
+            valid = pl.when(pl.col(c).is_not_null() & RANK_COLUMNS[c]).then(pl.col(c))
+            # rank 与 count 放在同一个窗口内，每列只做一次按日分组
+            exprs.append((valid.rank() / valid.count()).over("trade_date").alias(c))
+        return df.select(["ts_code", "trade_date", *exprs])
+
+    ranks = shared_result(df, f"daily_rank_pct{present}", build)
+    return (
+        ranks.lazy()
+        .select(["ts_code", "trade_date", pl.col(column).alias("factor_value")])
+        .filter(pl.col("factor_value").is_not_null())
+    )
 
 
 @factor(
     "factor_pe_rank",
     description="PE行业内排名百分位",
     depends_on=["sync_daily_basic"],
+    columns=["pe"],
     category="value",
     params={"lookback_days": 5},
 )
-def compute_pe_rank(df: pl.DataFrame, params: dict) -> pl.DataFrame:
-    return (
-        df.filter(pl.col("pe").is_not_null() & (pl.col("pe") > 0))
-        .with_columns(
-            pl.col("pe").rank().over("trade_date").alias("pe_rank"),
-            pl.col("pe").count().over("trade_date").alias("pe_count"),
-        )
-        .with_columns(
-            (pl.col("pe_rank") / pl.col("pe_count")).alias("factor_value")
-        )
-        .select(["ts_code", "trade_date", "factor_value"])
-        .drop_nulls()
-    )
+def compute_pe_rank(df: pl.DataFrame, params: dict) -> pl.LazyFrame:
+    return daily_rank_pct(df, "pe")
 
 
 @factor(
     "factor_pb_rank",
     description="PB行业内排名百分位",
     depends_on=["sync_daily_basic"],
+    columns=["pb"],
     category="value",
     params={"lookback_days": 5},
 )
-def compute_pb_rank(df: pl.DataFrame, params: dict) -> pl.DataFrame:
-    return (
-        df.filter(pl.col("pb").is_not_null() & (pl.col("pb") > 0))
-        .with_columns(
-            pl.col("pb").rank().over("trade_date").alias("pb_rank"),
-            pl.col("pb").count().over("trade_date").alias("pb_count"),
-        )
-        .with_columns(
-            (pl.col("pb_rank") / pl.col("pb_count")).alias("factor_value")
-        )
-        .select(["ts_code", "trade_date", "factor_value"])
-        .drop_nulls()
-    )
+def compute_pb_rank(df: pl.DataFrame, params: dict) -> pl.LazyFrame:
+    return daily_rank_pct(df, "pb")
 
 
 @factor(
     "factor_turnover_rank",
     description="换手率排名百分位",
     depends_on=["sync_daily_basic"],
+    columns=["turnover_rate"],
     category="value",
     params={"lookback_days": 5},
 )
-def compute_turnover_rank(df: pl.DataFrame, params: dict) -> pl.DataFrame:
-    return (
-        df.filter(pl.col("turnover_rate").is_not_null())
-        .with_columns(
-            pl.col("turnover_rate").rank().over("trade_date").alias("tr_rank"),
-            pl.col("turnover_rate").count().over("trade_date").alias("tr_count"),
-        )
-        .with_columns(
-            (pl.col("tr_rank") / pl.col("tr_count")).alias("factor_value")
-        )
-        .select(["ts_code", "trade_date", "factor_value"])
-        .drop_nulls()
-    )
+def compute_turnover_rank(df: pl.DataFrame, params: dict) -> pl.LazyFrame:
+    return daily_rank_pct(df, "turnover_rate")
@@ -2,8 +2,11 @@
 因子注册表
 通过装饰器模式注册因子计算函数，框架自动处理数据加载和结果存储
 """
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import Callable, Dict, List, Any, Optional
+from types import MappingProxyType
+from typing import Callable, Dict, List, Any, Mapping, Optional
 
 
 @dataclass
@@ -25,10 +28,25 @@ class FactorDefinition:
     params: Dict[str, Any]
     compute_mode: str  # "incremental" 或 "full"
     storage: StorageConfig
+    columns: Optional[List[str]] = None  # 因子读取的数据列，None 表示加载依赖表的全部列
 
 
 # 全局因子注册表
 _factor_registry: Dict[str, FactorDefinition] = {}
+# 注册表的只读视图（随注册表实时变化）与 list_factors 摘要缓存（注册/移除时失效）
+_registry_view: Mapping[str, FactorDefinition] = MappingProxyType(_factor_registry)
+_factor_summaries: Optional[List[Dict[str, Any]]] = None
+
+# 已扫描的因子目录 -> 扫描时的目录 mtime，目录内文件未增删时跳过重复扫描
+_discovered_dirs: Dict[str, float] = {}
+
+# 批量运行期间的共享中间结果（按线程隔离，并发批次互不可见）：
+# cache 为 (id(源数据), key) -> (源数据, 结果)，持有源数据引用保证 id 不被复用
+_shared_local = threading.local()
+
+
+def _shared_cache() -> Optional[Dict[tuple, tuple]]:
+    return getattr(_shared_local, "cache", None)
 
 
 def factor(
@@ -38,7 +56,8 @@ def factor(
     category: str = "custom",
     params: dict = None,
     compute_mode: str = "incremental",
-    storage: dict = None
+    storage: dict = None,
+    columns: list = None,
 ):
     """因子注册装饰器
 
@@ -58,16 +77,19 @@ def factor(
             - None: 存到统一因子表 factor_values
             - {"target": "factor_values"}: 同上
             - {"target": "my_table", "columns": {"col": "TYPE"}, "primary_keys": ["col1"]}: 自定义表
+        columns: 因子实际读取的数据列（ts_code, trade_date 自动包含），加载时只查询这些列；
+            None 时加载依赖表的全部列
 
     Usage:
         @factor("factor_ma_20", description="20日均线",
                 depends_on=["sync_daily_data"], category="technical")
         def compute_ma_20(df, params):
-            # df: 含 ts_code, trade_date, close 等列的 Polars DataFrame
-            # 返回: 含 ts_code, trade_date, factor_value 的 DataFrame
+            # df: 含 ts_code, trade_date, close 等列的 Polars DataFrame，已按 (ts_code, trade_date) 排序
+            # 返回: 含 ts_code, trade_date, factor_value 的 DataFrame（也可返回 LazyFrame，由引擎 collect）
             return df.with_columns(...)
     """
     def decorator(func):
+        global _factor_summaries
         storage_config = StorageConfig(**(storage or {}))
         _factor_registry[factor_id] = FactorDefinition(
             factor_id=factor_id,
@@ -77,15 +99,17 @@ def factor(
             category=category,
             params=params or {},
             compute_mode=compute_mode,
-            storage=storage_config
+            storage=storage_config,
+            columns=columns,
         )
+        _factor_summaries = None
         return func
     return decorator
 
 
-def get_registry() -> Dict[str, FactorDefinition]:
-    """获取因子注册表"""
-    return _factor_registry
+def get_registry() -> Mapping[str, FactorDefinition]:
+    """获取因子注册表（只读视图）"""
+    return _registry_view
 
 
 def get_factor(factor_id: str) -> Optional[FactorDefinition]:
@@ -94,8 +118,11 @@ def get_factor(factor_id: str) -> Optional[FactorDefinition]:
 
 
 def list_factors() -> List[Dict[str, Any]]:
-    """列出所有已注册因子的摘要信息"""
-    return [
+    """列出所有已注册因子的摘要信息（缓存至下次注册/移除，调用方只读）"""
+    global _factor_summaries
+    if _factor_summaries is not None:
+        return _factor_summaries
+    _factor_summaries = [
         {
             "factor_id": f.factor_id,
             "description": f.description,
@@ -107,17 +134,45 @@ def list_factors() -> List[Dict[str, Any]]:
         }
         for f in _factor_registry.values()
     ]
+    return _factor_summaries
+
+
+def factors_for_sources(tables: List[str], compute_mode: Optional[str] = None) -> List[str]:
+    """依赖数据全部来自 tables（或其中可算出的其他因子）的因子ID，依赖在前
+
+    Args:
+        tables: 已就绪的数据表
+        compute_mode: 只选该计算模式的因子，None 不限
+    """
+    ready = set(tables)
+    pending = [
+        f for f in _factor_registry.values()
+        if f.depends_on and (compute_mode is None or f.compute_mode == compute_mode)
+    ]
+    selected: List[str] = []
+    progress = True
+    while progress:
+        progress = False
+        for f in list(pending):
+            if all(dep in ready for dep in f.depends_on):
+                selected.append(f.factor_id)
+                ready.add(f.factor_id)
+                pending.remove(f)
+                progress = True
+    return selected
 
 
 def unregister_factor(factor_id: str):
     """从注册表中移除因子"""
-    _factor_registry.pop(factor_id, None)
+    global _factor_summaries
+    if _factor_registry.pop(factor_id, None) is not None:
+        _factor_summaries = None
 
 
 def discover_factors(factors_dir: str = None):
     """自动发现并导入 factors/ 目录下所有因子模块，触发 @factor 装饰器注册。
 
-    可安全多次调用，Python import 缓存保证幂等。
+    可安全多次调用：目录 mtime 未变（没有增删文件）时直接返回，不再遍历目录。
     """
     import os
     import importlib
@@ -126,13 +181,60 @@ def discover_factors(factors_dir: str = None):
     if factors_dir is None:
         factors_dir = os.path.join(os.path.dirname(__file__), "factors")
 
-    if not os.path.isdir(factors_dir):
+    try:
+        mtime = os.stat(factors_dir).st_mtime
+    except OSError:
+        return
+    if _discovered_dirs.get(factors_dir) == mtime:
         return
 
-    for fname in sorted(os.listdir(factors_dir)):
-        if fname.endswith(".py") and not fname.startswith("__"):
-            module_name = f"engine.production.factors.{fname[:-3]}"
-            try:
-                importlib.import_module(module_name)
-            except Exception as e:
-                logging.getLogger(__name__).warning(f"Failed to import factor module {module_name}: {e}")
+    # 单次 scandir 遍历，按文件名过滤，不为每个条目构造 Path 对象
+    with os.scandir(factors_dir) as it:
+        names = sorted(
+            e.name[:-3] for e in it
+            if e.name.endswith(".py") and not e.name.startswith(("__", "."))
+            and e.is_file(follow_symlinks=False)
+        )
+
+    for name in names:
+        module_name = f"engine.production.factors.{name}"
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Failed to import factor module {module_name}: {e}")
+    _discovered_dirs[factors_dir] = mtime
+
+
+def invalidate_discovery():
+    """清除目录扫描缓存，下次 discover_factors 重新扫描"""
+    _discovered_dirs.clear()
+
+
+@contextmanager
+def batch_cache():
+    """批量运行作用域：期间 shared_result 按源数据复用中间结果，退出时释放"""
+    outer = _shared_cache()
+    if outer is None:
+        _shared_local.cache = {}
+    try:
+        yield
+    finally:
+        if outer is None:
+            _shared_local.cache = None
+
+
+def shared_result(df, key: str, builder: Callable[[], Any]) -> Any:
+    """同一批次内对同一份源数据只计算一次 builder()，批外直接计算
+
+    用于多个因子共用的中间结果（如不同窗口的滚动标准差一次算出）。
+    """
+    cache = _shared_cache()
+    if cache is None:
+        return builder()
+    cache_key = (id(df), key)
+    hit = cache.get(cache_key)
+    if hit is not None and hit[0] is df:
+        return hit[1]
+    value = builder()
+    cache[cache_key] = (df, value)
+    return value
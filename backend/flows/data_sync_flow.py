@@ -2,7 +2,7 @@
 数据同步 Prefect Flow
 """
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 from prefect import flow, task, get_run_logger
 from prefect.tasks import task_input_hash
 
@@ -10,6 +10,15 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# 因子依赖的数据表 -> 需要先完成的同步任务（日线因子默认前复权，还需要复权因子）
+SOURCE_SYNC_TASKS = {
+    "sync_daily_data": ("sync_daily", "sync_adj_factor"),
+    "sync_daily_basic": ("sync_daily_basic",),
+}
+
+# 所有因子都依赖的同步任务（ST / 新股过滤读取股票列表）
+COMMON_SYNC_TASKS = ("sync_stock_basic",)
+
 
 @task(retries=3, retry_delay_seconds=60, log_prints=True)
 def sync_task(task_id: str, target_date: Optional[str] = None, end_date: Optional[str] = None):
@@ -39,10 +48,10 @@ def compute_factor(factor_id: str, target_date: Optional[str] = None):
     logger.info(f"开始计算因子: {factor_id}, 目标日期: {target_date}")
 
     try:
-        # 尝试使用 production engine
-        from engine.production.engine import ProductionEngine
-        engine = ProductionEngine(db_client)
-        result = engine.compute_factor(factor_id, target_date)
+        # 尝试使用 production engine（同一 worker 线程复用引擎实例）
+        from engine.production.engine import thread_engine
+        engine = thread_engine(db_client)
+        result = engine.run_task(factor_id, target_date=target_date)
         logger.info(f"因子 {factor_id} 计算完成")
         return result
     except ImportError:
@@ -53,6 +62,35 @@ def compute_factor(factor_id: str, target_date: Optional[str] = None):
         raise
 
 
+def _incremental_factors(sync_task_ids: List[str]) -> List[str]:
+    """注册表中数据依赖全部由 sync_task_ids 同步的增量因子（依赖在前），新增因子无需修改 flow"""
+    from engine.production.registry import discover_factors, factors_for_sources
+
+    discover_factors()
+    tables = [table for table, tasks in SOURCE_SYNC_TASKS.items() if tasks[0] in sync_task_ids]
+    return factors_for_sources(tables, compute_mode="incremental")
+
+
+def _submit_factors(factor_ids: List[str], target_date: Optional[str], sync_futures: Dict[str, object]) -> list:
+    """提交因子任务：每个因子只等待其依赖表对应的同步任务（及本次提交的上游因子），而不是整层同步全部完成"""
+    from engine.production.registry import discover_factors, get_factor
+
+    discover_factors()
+    submitted: Dict[str, object] = {}
+    for fid in factor_ids:
+        definition = get_factor(fid)
+        if definition is None:
+            # 未注册的因子无法判断依赖，等待全部同步任务
+            wait_for = list(sync_futures.values())
+        else:
+            needed = {t for dep in definition.depends_on for t in SOURCE_SYNC_TASKS.get(dep, ())}
+            needed.update(COMMON_SYNC_TASKS)
+            wait_for = [f for t, f in sync_futures.items() if t in needed]
+            wait_for += [submitted[dep] for dep in definition.depends_on if dep in submitted]
+        submitted[fid] = compute_factor.submit(fid, target_date, wait_for=wait_for)
+    return list(submitted.values())
+
+
 @flow(name="daily-data-sync", log_prints=True)
 def sync_daily_data(target_date: Optional[str] = None):
     """
@@ -67,28 +105,19 @@ def sync_daily_data(target_date: Optional[str] = None):
     logger.info(f"开始每日数据同步, 目标日期: {target_date}")
 
     # 第一层: 并行同步数据（无依赖）
-    daily_future = sync_task.submit("sync_daily", target_date)
-    daily_basic_future = sync_task.submit("sync_daily_basic", target_date)
-    adj_factor_future = sync_task.submit("sync_adj_factor", target_date)
-    moneyflow_future = sync_task.submit("sync_moneyflow", target_date)
-
-    # 等待第一层完成
-    daily_result = daily_future.result()
-    daily_basic_result = daily_basic_future.result()
-    adj_factor_future.result()
-    moneyflow_future.result()
-
-    # 第二层: 依赖 daily 的因子计算
-    if daily_result:
-        compute_factor.submit("factor_momentum_20", target_date)
-        compute_factor.submit("factor_volatility_20", target_date)
-        compute_factor.submit("factor_ma_20", target_date)
-
-    # 依赖 sync_daily_basic 的因子计算
-    if daily_basic_result:
-        compute_factor.submit("factor_pe_rank", target_date)
-        compute_factor.submit("factor_pb_rank", target_date)
-        compute_factor.submit("factor_volatility_10", target_date)
+    sync_futures = {
+        task_id: sync_task.submit(task_id, target_date)
+        for task_id in ("sync_daily", "sync_daily_basic", "sync_adj_factor", "sync_moneyflow")
+    }
+
+    # 第二层: 注册表中依赖这些数据的增量因子，各自的依赖数据同步完成即开始（同步失败时下游因子不执行）
+    factor_futures = _submit_factors(_incremental_factors(list(sync_futures)), target_date, sync_futures)
+
+    for future in factor_futures:
+        future.wait()
+    # 同步任务失败时让 flow 失败
+    for future in sync_futures.values():
+        future.result()
 
     logger.info("每日数据同步流水线完成")
 
@@ -107,18 +136,21 @@ def weekly_analysis(target_date: Optional[str] = None):
     logger.info(f"开始每周分析, 目标日期: {target_date}")
 
     # 同步基础数据
-    stock_basic_future = sync_task.submit("sync_stock_basic", target_date)
-    daily_future = sync_task.submit("sync_daily", target_date)
-
-    # 等待同步完成
-    stock_basic_future.result()
-    daily_result = daily_future.result()
-
-    # 计算技术因子
-    if daily_result:
-        compute_factor.submit("factor_ma_5", target_date)
-        compute_factor.submit("factor_ma_20", target_date)
-        compute_factor.submit("factor_rsi_14", target_date)
+    sync_futures = {
+        task_id: sync_task.submit(task_id, target_date)
+        for task_id in ("sync_stock_basic", "sync_daily")
+    }
+
+    # 计算技术因子，依赖的同步任务完成即开始
+    factor_futures = _submit_factors(
+        ["factor_ma_5", "factor_ma_20", "factor_rsi_14"], target_date, sync_futures
+    )
+
+    for future in factor_futures:
+        future.wait()
+    # 同步任务失败时让 flow 失败
+    for future in sync_futures.values():
+        future.result()
 
     logger.info("每周分析流水线完成")
 
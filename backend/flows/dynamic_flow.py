@@ -3,36 +3,50 @@
 根据 YAML 配置动态构建和执行 Prefect Flow
 """
 import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from collections import defaultdict
 
 from app.core.logger import logger
 
+# 同步任务以 I/O 为主，线程数按核数封顶；因子任务内部由 Polars 线程池占满各核，
+# 同时只跑少量，避免多个大 group_by 并发争抢缓存
+_SYNC_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="flow-sync")
+_FACTOR_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="flow-factor")
+
 
 def _topological_sort(tasks: List[dict]) -> List[List[dict]]:
     """
     拓扑排序，返回按层分组的任务列表
     同一层的任务可以并行执行
     """
-    # 构建依赖图
+    # 分层只取决于 (id, depends_on)，同一配置重复执行时直接复用缓存的分层结果
+    key = tuple((t["id"], tuple(t.get("depends_on", []))) for t in tasks)
     task_map = {t["id"]: t for t in tasks}
+    return [[task_map[tid] for tid in layer] for layer in _layer_ids(key)]
+
+
+@functools.lru_cache(maxsize=64)
+def _layer_ids(key: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> Tuple[Tuple[str, ...], ...]:
+    """按 (任务ID, 依赖) 序列做 BFS 分层，返回每层的任务ID"""
+    # 构建依赖图
     in_degree = defaultdict(int)
     dependents = defaultdict(list)
 
-    for task in tasks:
-        task_id = task["id"]
-        deps = task.get("depends_on", [])
+    for task_id, deps in key:
         in_degree[task_id] = len(deps)
         for dep in deps:
             dependents[dep].append(task_id)
 
     # BFS 分层
     layers = []
-    queue = [t["id"] for t in tasks if in_degree[t["id"]] == 0]
+    queue = [task_id for task_id, _ in key if in_degree[task_id] == 0]
 
     while queue:
-        layers.append([task_map[tid] for tid in queue])
+        layers.append(tuple(queue))
         next_queue = []
         for tid in queue:
             for dep_id in dependents[tid]:
@@ -43,10 +57,10 @@ def _topological_sort(tasks: List[dict]) -> List[List[dict]]:
 
     # 检查是否有循环依赖
     total_tasks = sum(len(layer) for layer in layers)
-    if total_tasks != len(tasks):
+    if total_tasks != len(key):
         raise ValueError("检测到循环依赖")
 
-    return layers
+    return tuple(layers)
 
 
 def _execute_sync_task_sync(task_id: str, target_date: Optional[str]) -> dict:
@@ -65,11 +79,11 @@ def _execute_sync_task_sync(task_id: str, target_date: Optional[str]) -> dict:
 def _execute_factor_task_sync(task_id: str, target_date: Optional[str]) -> dict:
     """同步执行因子计算任务"""
     from store.dolphindb_client import db_client
-    from engine.production.engine import ProductionEngine
+    from engine.production.engine import thread_engine
 
     logger.info(f"执行因子任务: {task_id}")
     try:
-        engine = ProductionEngine(db_client)
+        engine = thread_engine(db_client)
         result = engine.run_task(task_id, target_date=target_date)
         return {"task_id": task_id, "type": "factor", "success": result}
     except Exception as e:
@@ -77,8 +91,38 @@ def _execute_factor_task_sync(task_id: str, target_date: Optional[str]) -> dict:
         return {"task_id": task_id, "type": "factor", "success": False, "error": str(e)}
 
 
+def _execute_factor_batch_sync(task_ids: List[str], target_date: Optional[str]) -> List[dict]:
+    """同步执行同一层的多个因子任务：一次 run_batch，依赖相同的因子共用数据加载与预处理"""
+    from store.dolphindb_client import db_client
+    from engine.production.engine import thread_engine
+
+    logger.info(f"执行因子任务: {', '.join(task_ids)}")
+    try:
+        engine = thread_engine(db_client)
+        results = engine.run_batch(task_ids, target_date=target_date)
+        return [{"task_id": tid, "type": "factor", "success": results.get(tid, False)} for tid in task_ids]
+    except Exception as e:
+        logger.error(f"因子任务 {', '.join(task_ids)} 失败: {e}")
+        return [{"task_id": tid, "type": "factor", "success": False, "error": str(e)} for tid in task_ids]
+
+
+async def _execute_layer(layer: List[dict], target_date: Optional[str]) -> List[dict]:
+    """并行执行同一层任务；多个因子任务合并为一个批次，结果按层内原顺序返回"""
+    factor_ids = [t["id"] for t in layer if t["type"] == "factor"]
+    others = [t for t in layer if t["type"] != "factor"]
+    if len(factor_ids) < 2:
+        return list(await asyncio.gather(*(_execute_task(task, target_date) for task in layer)))
+
+    loop = asyncio.get_event_loop()
+    factor_job = loop.run_in_executor(_FACTOR_POOL, _execute_factor_batch_sync, factor_ids, target_date)
+    gathered = await asyncio.gather(factor_job, *(_execute_task(task, target_date) for task in others))
+    by_id = {r["task_id"]: r for r in gathered[0]}
+    other_results = iter(gathered[1:])
+    return [by_id[t["id"]] if t["type"] == "factor" else next(other_results) for t in layer]
+
+
 async def _execute_task(task: dict, target_date: Optional[str]) -> dict:
-    """执行单个任务（在线程池中运行同步代码）"""
+    """执行单个任务（按任务类型在对应线程池中运行同步代码）"""
     task_id = task["id"]
     task_type = task["type"]
 
@@ -86,11 +130,11 @@ async def _execute_task(task: dict, target_date: Optional[str]) -> dict:
 
     if task_type == "sync":
         return await loop.run_in_executor(
-            None, _execute_sync_task_sync, task_id, target_date
+            _SYNC_POOL, _execute_sync_task_sync, task_id, target_date
         )
     elif task_type == "factor":
         return await loop.run_in_executor(
-            None, _execute_factor_task_sync, task_id, target_date
+            _FACTOR_POOL, _execute_factor_task_sync, task_id, target_date
         )
     else:
         return {"task_id": task_id, "type": task_type, "success": False, "error": f"未知任务类型: {task_type}"}
@@ -130,8 +174,7 @@ async def run_dynamic_flow(config: dict, target_date: Optional[str] = None) -> D
         logger.info(f"执行第 {i+1} 层，共 {len(layer)} 个任务")
 
         # 并行执行同一层的任务
-        layer_tasks = [_execute_task(task, target_date) for task in layer]
-        layer_results = await asyncio.gather(*layer_tasks)
+        layer_results = await _execute_layer(layer, target_date)
         all_results.extend(layer_results)
 
         # 检查是否有失败的任务
@@ -10,24 +10,29 @@ from pathlib import Path
 backend_dir = str(Path(__file__).parent.parent)
 sys.path.insert(0, backend_dir)
 
-# 加载 .env 并设置 PREFECT_API_URL（必须在 import prefect 之前）
-from dotenv import load_dotenv
 
-env_path = Path(backend_dir).parent / ".env"
-load_dotenv(env_path)
+def _configure_env() -> str:
+    """加载 .env 并设置 PREFECT_API_URL（必须在 import prefect 之前），返回 API 地址"""
+    from dotenv import load_dotenv
 
-prefect_url = os.getenv("PREFECT_API_URL", "http://localhost:4200/api")
-os.environ["PREFECT_API_URL"] = prefect_url
+    env_path = Path(backend_dir).parent / ".env"
+    load_dotenv(env_path)
 
-# 绕过系统代理，避免 httpx 连 localhost 走代理失败
-os.environ.setdefault("NO_PROXY", "localhost,127.0.0.1")
-os.environ.setdefault("no_proxy", "localhost,127.0.0.1")
+    prefect_url = os.getenv("PREFECT_API_URL", "http://localhost:4200/api")
+    os.environ["PREFECT_API_URL"] = prefect_url
 
-from flows.data_sync_flow import sync_daily_data, weekly_analysis
+    # 绕过系统代理，避免 httpx 连 localhost 走代理失败
+    os.environ.setdefault("NO_PROXY", "localhost,127.0.0.1")
+    os.environ.setdefault("no_proxy", "localhost,127.0.0.1")
+    return prefect_url
 
 
 def main():
     """部署所有 flow"""
+    # 环境配置与 Prefect / flow 导入都放在 main 中，导入本模块不触发 Prefect 加载
+    prefect_url = _configure_env()
+    from flows.data_sync_flow import sync_daily_data, weekly_analysis
+
     print(f"Prefect API: {prefect_url}")
 
     # 检查 Prefect Server 是否可达
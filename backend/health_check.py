@@ -32,8 +32,9 @@ def check_database():
         ]
 
         existing = 0
+        exists = db_client.tables_exist(key_tables)
         for table in key_tables:
-            if db_client.table_exists(table):
+            if exists[table]:
                 print(f"  ✓ {table}")
                 existing += 1
             else:
@@ -74,7 +75,7 @@ def check_performance():
         # 测试数据查询
         start = time.time()
         df = db_client.query(
-            "SELECT * FROM sync_daily_data WHERE ts_code=%s AND trade_date>=%s LIMIT 100",
+            "SELECT ts_code, trade_date, close FROM sync_daily_data WHERE ts_code=%s AND trade_date>=%s LIMIT 100",
             ('000001.SZ', '20240101')
         )
         query_time = (time.time() - start) * 1000
@@ -71,13 +71,9 @@ def verify_tables():
         'factor_metadata', 'factor_analysis',
     ]
 
-    existing = []
-    missing = []
-    for table in key_tables:
-        if db_client.table_exists(table):
-            existing.append(table)
-        else:
-            missing.append(table)
+    exists = db_client.tables_exist(key_tables)
+    existing = [t for t in key_tables if exists[t]]
+    missing = [t for t in key_tables if not exists[t]]
 
     print(f"\n已创建的表 ({len(existing)}):")
     for t in existing:
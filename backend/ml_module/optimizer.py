@@ -1,14 +1,39 @@
+import importlib.util
 import json
+import os
 import pickle
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 from typing import Any
+import numpy as np
+import pandas as pd
 import polars as pl
 import optuna
+from numba import njit, prange
 from app.core.config import settings
 from app.core.logger import logger
 from engine.backtester.vector_engine import VectorEngine, BacktestConfig
 
 
+@njit(parallel=True, cache=True)
+def _wide_signal_nb(factors, weights, null_rows, rows, cols, n_dates, n_codes):
+    """sign(factors @ weights) written straight into the [date, code] grid in one pass.
+
+    +1 where the composite is positive, -1 otherwise; null-factor rows and empty cells stay 0.
+    """
+    wide = np.zeros((n_dates, n_codes))
+    n_rows, n_factors = factors.shape
+    for i in prange(n_rows):
+        if null_rows[i]:
+            continue
+        composite = 0.0
+        for k in range(n_factors):
+            composite += factors[i, k] * weights[k]
+        wide[rows[i], cols[i]] = 1.0 if composite > 0 else -1.0
+    return wide
+
+
 class FactorOptimizer:
     """
     Uses Optuna to find optimal factor weights that maximize Sharpe ratio.
@@ -20,35 +45,109 @@ class FactorOptimizer:
         self.signal_col = signal_col
         self.best_weights: dict[str, float] = {}
         self.study: optuna.Study | None = None
+        # Factor matrix [rows, factors] built once; each trial is a single matrix-vector product.
+        # Rows with a null factor keep a null signal, as the Polars weighted sum did.
+        self._factors = np.ascontiguousarray(df.select(factor_cols).to_numpy(), dtype=np.float64)
+        self._null_rows = df.select(
+            pl.any_horizontal([pl.col(c).is_null() for c in factor_cols])
+        ).to_series().to_numpy()
+        # Only the columns VectorEngine reads are carried into each trial's frame
+        self._base = df.select([c for c in ("trade_date", "ts_code", "close") if c in df.columns])
+        self._engine = VectorEngine(BacktestConfig())
+        # Multi-asset panels: pivot close once; each trial scatters its signal into the wide grid
+        # and only the portfolio Sharpe is computed (no stats / equity curve / trade records).
+        self._layout = None
+        if (
+            "ts_code" in self._base.columns
+            and self._base["ts_code"].n_unique() > 1
+            and not self._base.select(["trade_date", "ts_code"]).is_duplicated().any()
+        ):
+            self._layout = self._engine.wide_layout(self._base)
+            # Compile the kernel here rather than inside the first (threaded) trial
+            self._wide_signal(np.zeros(len(factor_cols)))
+        # Sharpe per normalised weight vector; the signal only depends on the direction of w.
+        # Futures let a concurrent trial on the same ray wait for the first one instead of re-running.
+        self._scores: dict[tuple[float, ...], Future] = {}
+        self._scores_lock = threading.Lock()
 
     def _objective(self, trial: optuna.Trial) -> float:
-        weights = {col: trial.suggest_float(col, -1.0, 1.0) for col in self.factor_cols}
-
-        # Compute composite signal as weighted sum of factors
-        df = self.df.clone()
-        composite = sum(
-            df[col] * w for col, w in weights.items()
+        weights = np.fromiter(
+            (trial.suggest_float(col, -1.0, 1.0) for col in self.factor_cols),
+            dtype=np.float64, count=len(self.factor_cols),
         )
-        df = df.with_columns(
-            pl.Series(name=self.signal_col, values=(composite > 0).cast(pl.Int32) * 2 - 1)
+
+        # sign(F @ w) is scale invariant: weights on the same ray give the same backtest
+        key = tuple(np.round(weights / (np.abs(weights).sum() + 1e-9), 3))
+        with self._scores_lock:
+            score = self._scores.get(key)
+            owner = score is None
+            if owner:
+                score = self._scores[key] = Future()
+        if owner:
+            try:
+                score.set_result(self._evaluate(weights))
+            except BaseException as e:
+                score.set_exception(e)
+        return score.result()
+
+    def _evaluate(self, weights: np.ndarray) -> float:
+        if self._layout is not None:
+            return self._wide_sharpe(weights)
+        # Composite signal: sign of the weighted factor sum (+1 / -1)
+        composite = self._factors @ weights
+        signal = np.where(composite > 0, 1.0, -1.0)
+        signal[self._null_rows] = np.nan
+        df = self._base.with_columns(
+            pl.Series(self.signal_col, signal, nan_to_null=True).cast(pl.Int32)
         )
 
-        engine = VectorEngine(BacktestConfig())
         try:
-            result = engine.run(df, signal_col=self.signal_col)
+            result = self._engine.run(df, signal_col=self.signal_col)
             sharpe = result.metrics.get("sharpe_ratio", -999)
             return sharpe if not (sharpe != sharpe) else -999  # handle NaN
         except Exception:
             return -999
 
-    def optimize(self, n_trials: int = 100, direction: str = "maximize") -> dict[str, float]:
+    def _wide_signal(self, weights: np.ndarray) -> np.ndarray:
+        close_wide, rows, cols = self._layout
+        # Null-factor rows and missing (date, code) cells are flat, as the engine's pivot fill does
+        return _wide_signal_nb(self._factors, weights, self._null_rows, rows, cols, *close_wide.shape)
+
+    def _wide_sharpe(self, weights: np.ndarray) -> float:
+        close_wide = self._layout[0]
+        signal_wide = pd.DataFrame(
+            self._wide_signal(weights), index=close_wide.index, columns=close_wide.columns
+        )
+        try:
+            return self._engine.sharpe_ratio(close_wide, signal_wide)
+        except Exception:
+            return -999
+
+    def optimize(
+        self, n_trials: int = 100, direction: str = "maximize", n_jobs: int | None = None
+    ) -> dict[str, float]:
         optuna.logging.set_verbosity(optuna.logging.WARNING)
-        self.study = optuna.create_study(direction=direction)
-        self.study.optimize(self._objective, n_trials=n_trials, n_jobs=1)
+        # Trials only read the shared factor matrix and engine, so they run on threads;
+        # NumPy/Polars release the GIL during the heavy work.
+        n_jobs = n_jobs or min(os.cpu_count() or 1, 8)
+        self.study = optuna.create_study(
+            direction=direction,
+            sampler=self._sampler(),
+        )
+        self.study.optimize(self._objective, n_trials=n_trials, n_jobs=n_jobs, gc_after_trial=False)
         self.best_weights = self.study.best_params
         logger.info(f"Best weights: {self.best_weights}, Sharpe: {self.study.best_value:.4f}")
         return self.best_weights
 
+    def _sampler(self) -> optuna.samplers.BaseSampler:
+        # CMA-ES suits the dense continuous weights but needs the optional cmaes package
+        if importlib.util.find_spec("cmaes") is not None:
+            return optuna.samplers.CmaEsSampler(
+                n_startup_trials=2 * len(self.factor_cols), warn_independent_sampling=False
+            )
+        logger.warning("cmaes not installed, falling back to TPE sampler")
+        return optuna.samplers.TPESampler(multivariate=True, n_startup_trials=16)
+
     def save_weights(self, filename: str = "best_weights.json"):
         path = settings.models_dir / filename
         with open(path, "w") as f:
@@ -1,4 +1,8 @@
+import hashlib
 import json
+import os
+import threading
+from functools import cached_property
 from pathlib import Path
 import polars as pl
 from app.core.config import settings
@@ -7,6 +11,11 @@ from ml_module.trainer import AutoMLTrainer
 from ml_module.optimizer import FactorOptimizer
 from engine.factors.technical import TechnicalFactors
 
+# Bump when build_features changes so stale feature caches are not reused
+FEATURE_SET_VERSION = 1
+# Number of feature caches (distinct inputs) kept in models_dir, least recently used evicted first
+FEATURE_CACHE_ENTRIES = 8
+
 
 class MLPipeline:
     """
@@ -17,36 +26,80 @@ class MLPipeline:
     def __init__(self, df: pl.DataFrame):
         self.df = df
 
+    @cached_property
+    def features(self) -> pl.DataFrame:
+        """Feature frame built once per pipeline and shared by AutoML and optimization.
+
+        Persisted as parquet keyed by a content hash of the input frame, so a later run on
+        unchanged data reads the cache instead of recomputing.
+        """
+        path = settings.models_dir / f"features_{self._data_key()}.parquet"
+        if path.exists():
+            try:
+                df = pl.read_parquet(path)
+                os.utime(path)  # mark as recently used for eviction
+                return df
+            except Exception as e:
+                logger.warning(f"Feature cache unreadable, rebuilding: {e}")
+        df = self.build_features()
+        try:
+            # Write under a unique temp name and rename, so readers never see a partial file
+            tmp = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+            df.write_parquet(tmp, compression="zstd", statistics=True)
+            os.replace(tmp, path)
+            self._evict_feature_caches()
+        except Exception as e:
+            logger.warning(f"Failed to write feature cache {path}: {e}")
+        return df
+
+    @staticmethod
+    def _evict_feature_caches():
+        """Keep only the FEATURE_CACHE_ENTRIES most recently used feature caches."""
+        entries = []
+        for f in settings.models_dir.glob("features_*.parquet"):
+            try:
+                entries.append((f.stat().st_mtime, f))
+            except FileNotFoundError:
+                continue
+        entries.sort(reverse=True)
+        for _, stale in entries[FEATURE_CACHE_ENTRIES:]:
+            stale.unlink(missing_ok=True)
+
+    def _data_key(self) -> str:
+        """Content digest of the input: every row's hash plus the schema, the feature-set
+        version and the Polars version (row hashes are only stable within one version)."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{FEATURE_SET_VERSION}|{pl.__version__}|{self.df.schema}".encode())
+        digest.update(self.df.hash_rows(seed=0, seed_1=1, seed_2=2, seed_3=3).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def invalidate(self):
+        """Drop the cached features, e.g. after replacing self.df."""
+        self.__dict__.pop("features", None)
+
     def build_features(self) -> pl.DataFrame:
         """Compute standard factor features from OHLCV data."""
-        df = self.df.sort(["ts_code", "trade_date"])
-        df = df.with_columns([
-            pl.col("close").rolling_mean(window_size=5, min_periods=1).over("ts_code").alias("sma5"),
-            pl.col("close").rolling_mean(window_size=20, min_periods=1).over("ts_code").alias("sma20"),
-            pl.col("close").rolling_std(window_size=20, min_periods=1).over("ts_code").alias("vol20"),
-        ])
-        # RSI requires diff/clip/ewm which are harder in pure expressions,
-        # so compute per group and join back
-        rsi_frames = []
-        for name, group in df.group_by("ts_code"):
-            rsi_series = TechnicalFactors.rsi(group["close"], 14)
-            rsi_frames.append(group.select("ts_code", "trade_date").with_columns(
-                rsi_series.alias("rsi14")
-            ))
-        rsi_df = pl.concat(rsi_frames)
-        df = df.join(rsi_df, on=["ts_code", "trade_date"], how="left")
+        close = pl.col("close")
         # Forward return as target (next 5-day return)
-        df = df.with_columns(
-            (pl.col("close").shift(-5).over("ts_code") / pl.col("close") - 1).alias("fwd_return_5d")
+        fwd_return = (close.shift(-5).over("ts_code") / close - 1).alias("fwd_return_5d")
+        return (
+            self.df.lazy()
+            .sort(["ts_code", "trade_date"])
+            .with_columns([
+                close.rolling_mean(window_size=5, min_periods=1).over("ts_code").alias("sma5"),
+                close.rolling_mean(window_size=20, min_periods=1).over("ts_code").alias("sma20"),
+                close.rolling_std(window_size=20, min_periods=1).over("ts_code").alias("vol20"),
+                TechnicalFactors.rsi(close, 14).over("ts_code").alias("rsi14"),
+                fwd_return,
+                # Binary target: 1 if positive return, 0 otherwise
+                (fwd_return > 0).cast(pl.Int32).alias("target"),
+            ])
+            .drop_nulls(subset=["sma5", "sma20", "rsi14", "vol20", "target"])
+            .collect()
         )
-        # Binary target: 1 if positive return, 0 otherwise
-        df = df.with_columns(
-            (pl.col("fwd_return_5d") > 0).cast(pl.Int32).alias("target")
-        )
-        return df.drop_nulls(subset=["sma5", "sma20", "rsi14", "vol20", "target"])
 
     def run_automl(self, feature_cols: list[str] | None = None) -> dict:
-        df = self.build_features()
+        df = self.features
         if feature_cols is None:
             feature_cols = ["sma5", "sma20", "rsi14", "vol20"]
 
@@ -56,7 +109,7 @@ class MLPipeline:
         return {"status": "automl_done", "model": type(trainer.best_model).__name__}
 
     def run_optimization(self, feature_cols: list[str] | None = None) -> dict:
-        df = self.build_features()
+        df = self.features
         if feature_cols is None:
             feature_cols = ["sma5", "sma20", "rsi14", "vol20"]
 
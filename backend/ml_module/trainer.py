@@ -38,7 +38,14 @@ class AutoMLTrainer:
         Train AutoML on the given DataFrame.
         Returns the best model.
         """
-        pdf = df.select(feature_cols + [target_col]).drop_nulls().to_pandas()
+        # float32 features (int8 labels for classification) halve memory through every candidate fit
+        target = pl.col(target_col).cast(pl.Int8) if self.task == "classification" else pl.col(target_col)
+        pdf = (
+            df.select(feature_cols + [target_col])
+            .drop_nulls()
+            .select([pl.col(c).cast(pl.Float32) for c in feature_cols] + [target])
+            .to_pandas()
+        )
         logger.info(f"AutoML training on {len(pdf)} rows, task={self.task}")
 
         if self.task == "classification":
@@ -65,6 +72,6 @@ class AutoMLTrainer:
     def predict(self, df: pl.DataFrame, feature_cols: list[str]) -> pl.Series:
         if self.best_model is None:
             raise ValueError("No model loaded")
-        pdf = df.select(feature_cols).to_pandas()
+        pdf = df.select([pl.col(c).cast(pl.Float32) for c in feature_cols]).to_pandas()
         preds = self.best_model.predict(pdf)
         return pl.Series("prediction", preds)
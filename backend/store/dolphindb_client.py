@@ -20,6 +20,9 @@ from app.core.logger import logger
 class DolphinDBClient:
     """DolphinDB 数据库客户端（线程安全单例）"""
 
+    # 连接/断线重连的最大尝试次数（每次约间隔 1 秒）
+    _RECONNECT_TRIES = 3
+
     def __init__(self):
         self._host = settings.database.dolphindb_host
         self._port = settings.database.dolphindb_port
@@ -30,6 +33,8 @@ class DolphinDBClient:
         # 会话与线程锁
         self._session: Optional[ddb.Session] = None
         self._lock = threading.Lock()
+        # 已确认存在的表：表一旦存在就不会凭空消失（drop_table 会移除），省去重复的 existsTable 往返
+        self._known_tables: set = set()
 
         self._connect()
         logger.info(
@@ -45,8 +50,11 @@ class DolphinDBClient:
         """建立 DolphinDB 连接"""
         try:
             self._session = ddb.Session(enableASYNC=False)
+            # reconnect=True：断线由 API 在下一次请求时自动重连，无需每次请求前发心跳；
+            # 必须限定重试次数，否则服务端不可用时 connect 会无限重试而非报错
             success = self._session.connect(
-                self._host, self._port, self._user, self._password
+                self._host, self._port, self._user, self._password,
+                reconnect=True, tryReconnectNums=self._RECONNECT_TRIES,
             )
             if not success:
                 raise ConnectionError(
@@ -58,11 +66,12 @@ class DolphinDBClient:
             raise
 
     def _ensure_connected(self):
-        """确保连接可用，断线自动重连"""
-        try:
-            # 简单心跳检测
-            self._session.run("1+1")
-        except Exception:
+        """确保连接可用，会话已关闭时重连
+
+        只检查客户端会话状态，不向服务端发送心跳脚本（省去每次请求前的一次往返）；
+        服务端断线由 connect(reconnect=True) 在下次请求时自动重连。
+        """
+        if self._session is None or self._session.isClosed():
             logger.warning("DolphinDB 连接已断开，正在重连...")
             self._connect()
 
@@ -84,7 +93,7 @@ class DolphinDBClient:
     def _escape_value(value: Any) -> str:
         """
         将 Python 值转换为 DolphinDB SQL 字面量
-        处理字符串引号转义、日期格式、None 等
+        处理字符串引号转义、日期格式、None、列表等
         """
         if value is None:
             return "NULL"
@@ -96,6 +105,9 @@ class DolphinDBClient:
             return f"{value.strftime('%Y.%m.%dT%H:%M:%S')}"
         if isinstance(value, date):
             return f"{value.strftime('%Y.%m.%d')}"
+        # 列表/元组/集合：转换为 DolphinDB 向量字面量，配合 `col in %s` 使用
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return "[" + ", ".join(DolphinDBClient._escape_value(v) for v in value) + "]"
         # 字符串类型：检查是否为 YYYYMMDD 日期
         s = str(value)
         if re.match(r"^\d{8}$", s):
@@ -231,7 +243,9 @@ class DolphinDBClient:
     # ------------------------------------------------------------------
 
     def table_exists(self, table_name: str) -> bool:
-        """检查表是否存在"""
+        """检查表是否存在（已存在的结果在进程内缓存）"""
+        if table_name in self._known_tables:
+            return True
         db_path = self._resolve_db_path(table_name)
         try:
             with self._lock:
@@ -239,11 +253,35 @@ class DolphinDBClient:
                 result = self._session.run(
                     f"existsTable('{db_path}', '{table_name}')"
                 )
+            if result:
+                self._known_tables.add(table_name)
             return bool(result)
         except Exception as e:
             logger.error(f"检查表是否存在失败 [{table_name}]: {e}")
             return False
 
+    def tables_exist(self, table_names: List[str]) -> Dict[str, bool]:
+        """一次往返检查多张表是否存在，返回 {表名: 是否存在}"""
+        exists = {t: True for t in table_names if t in self._known_tables}
+        unknown = [t for t in table_names if t not in exists]
+        if not unknown:
+            return exists
+        checks = ", ".join(
+            f"existsTable('{self._resolve_db_path(t)}', '{t}')" for t in unknown
+        )
+        try:
+            with self._lock:
+                self._ensure_connected()
+                result = self._session.run(f"[{checks}]")
+        except Exception as e:
+            logger.error(f"批量检查表是否存在失败: {e}")
+            return {t: exists.get(t, False) for t in table_names}
+        for t, v in zip(unknown, result):
+            exists[t] = bool(v)
+            if v:
+                self._known_tables.add(t)
+        return {t: exists[t] for t in table_names}
+
     def create_table(
         self,
         table_name: str,
@@ -271,6 +309,7 @@ class DolphinDBClient:
                 self._ensure_connected()
                 exists = self._session.run(f"existsTable('{db_path}', '{table_name}')")
             if exists:
+                self._known_tables.add(table_name)
                 logger.info(f"表 {table_name} 已存在，跳过建表")
                 return
 
@@ -304,6 +343,7 @@ class DolphinDBClient:
             with self._lock:
                 self._ensure_connected()
                 self._session.run(script)
+            self._known_tables.add(table_name)
             logger.info(f"Created table {table_name} with {len(schema)} columns, primary_keys: {primary_keys}")
         except Exception as e:
             logger.error(f"建表失败 [{table_name}]: {e}")
@@ -319,46 +359,52 @@ class DolphinDBClient:
         Returns:
             [{"table_name": str, "row_count": int, "columns": [str], "column_count": int}, ...]
         """
-        results = []
-        for table_name in sorted(self._ALL_TABLES):
-            if not self.table_exists(table_name):
-                continue
-            try:
-                db_path = self._resolve_db_path(table_name)
-                with self._lock:
-                    self._ensure_connected()
-                    schema_info = self._session.run(
-                        f"schema(loadTable('{db_path}', '{table_name}'))"
-                    )
-                columns = []
-                if isinstance(schema_info, dict) and "colDefs" in schema_info:
-                    col_defs = schema_info["colDefs"]
-                    if isinstance(col_defs, pd.DataFrame) and "name" in col_defs.columns:
-                        columns = col_defs["name"].tolist()
-
-                # 获取行数
-                with self._lock:
-                    self._ensure_connected()
-                    row_count = self._session.run(
-                        f"exec count(*) from loadTable('{db_path}', '{table_name}')"
-                    )
-                    row_count = int(row_count) if row_count is not None else 0
-
-                results.append({
-                    "table_name": table_name,
-                    "row_count": row_count,
-                    "columns": columns,
-                    "column_count": len(columns),
-                })
-            except Exception as e:
-                logger.warning(f"获取表信息失败 [{table_name}]: {e}")
-                results.append({
-                    "table_name": table_name,
-                    "row_count": 0,
-                    "columns": [],
-                    "column_count": 0,
-                })
-        return results
+        exists = self.tables_exist(sorted(self._ALL_TABLES))
+        tables = [t for t, found in exists.items() if found]
+        if not tables:
+            return []
+        # 一次往返取回所有表的列名与行数；批量脚本失败时（如某张表损坏）退回逐表查询
+        paths = self._escape_value([self._resolve_db_path(t) for t in tables])
+        script = (
+            "def _tableInfo(dbPath, tbName){ h = loadTable(dbPath, tbName); "
+            "return [schema(h).colDefs.name, exec count(*) from h] };"
+            f"each(_tableInfo, {paths}, {self._escape_value(tables)})"
+        )
+        try:
+            with self._lock:
+                self._ensure_connected()
+                infos = self._session.run(script)
+            return [
+                self._table_info_row(t, list(columns), row_count)
+                for t, (columns, row_count) in zip(tables, infos)
+            ]
+        except Exception as e:
+            logger.warning(f"批量获取表信息失败，改为逐表查询: {e}")
+        return [self._table_info(t) for t in tables]
+
+    @staticmethod
+    def _table_info_row(table_name: str, columns: List[str], row_count: Any) -> Dict[str, Any]:
+        return {
+            "table_name": table_name,
+            "row_count": int(row_count) if row_count is not None else 0,
+            "columns": columns,
+            "column_count": len(columns),
+        }
+
+    def _table_info(self, table_name: str) -> Dict[str, Any]:
+        """单表的列名与行数，失败时返回空信息"""
+        try:
+            db_path = self._resolve_db_path(table_name)
+            columns = self.get_table_columns(table_name)
+            with self._lock:
+                self._ensure_connected()
+                row_count = self._session.run(
+                    f"exec count(*) from loadTable('{db_path}', '{table_name}')"
+                )
+            return self._table_info_row(table_name, columns, row_count)
+        except Exception as e:
+            logger.warning(f"获取表信息失败 [{table_name}]: {e}")
+            return self._table_info_row(table_name, [], 0)
 
     def get_table_columns(self, table_name: str) -> List[str]:
         """获取指定表的列名列表"""
@@ -384,6 +430,7 @@ class DolphinDBClient:
         with self._lock:
             self._ensure_connected()
             self._session.run(f"dropTable(database('{db_path}'), '{table_name}')")
+        self._known_tables.discard(table_name)
         logger.info(f"Dropped table {table_name}")
     # ------------------------------------------------------------------
 
@@ -393,6 +440,7 @@ class DolphinDBClient:
     _META_TABLES = frozenset({
         "sync_log", "sync_log_history", "sync_stock_basic",
         "factor_metadata", "factor_analysis",
+        "factor_ic_series", "factor_quantile_returns",
         "factor_task_run", "sync_trade_cal",
         "sync_task_config", "etl_task_config",
     })
@@ -473,6 +521,25 @@ class DolphinDBClient:
             "array(TIMESTAMP,0) as created_at)",
             ["factor_id", "analysis_date"],
         ),
+        "factor_ic_series": (
+            "table("
+            "array(SYMBOL,0) as factor_id,"
+            "array(INT,0) as period,"
+            "array(STRING,0) as trade_date,"
+            "array(DOUBLE,0) as ic,"
+            "array(TIMESTAMP,0) as analysis_date)",
+            ["factor_id", "period", "trade_date", "analysis_date"],
+        ),
+        "factor_quantile_returns": (
+            "table("
+            "array(SYMBOL,0) as factor_id,"
+            "array(INT,0) as period,"
+            "array(STRING,0) as trade_date,"
+            "array(INT,0) as quantile,"
+            "array(DOUBLE,0) as mean_return,"
+            "array(TIMESTAMP,0) as analysis_date)",
+            ["factor_id", "period", "trade_date", "quantile", "analysis_date"],
+        ),
         "factor_task_run": (
             "table("
             "array(SYMBOL,0) as factor_id,"
@@ -567,6 +634,7 @@ class DolphinDBClient:
                                     logger.warning(f"给表 [{tbl}] 加列 [{col_name}] 失败: {add_err}")
                         if added:
                             altered.append(f"{tbl}({', '.join(added)})")
+                    self._known_tables.add(tbl)
                 except Exception as e:
                     logger.error(f"动态创建/更新维度表失败 [{tbl}]: {e}")
                     raise
@@ -862,17 +930,13 @@ class DolphinDBClient:
                 col_select = ", ".join(ordered_cols)
 
                 if is_meta and key_columns:
-                    # 维度表：先按主键删除旧行，再插入（模拟 upsert）
+                    # 维度表：先按主键删除旧行，再插入（模拟 upsert），合并为一次脚本提交
                     handle = f"{table_name}_handle"
                     delete_conds = [f'{kc} in {tmp_var}.{kc}' for kc in key_columns]
                     cond_str = " and ".join(delete_conds)
                     self._session.run(
-                        f"{handle} = loadTable('{db_path}', '{table_name}')"
-                    )
-                    self._session.run(
-                        f"delete from {handle} where {cond_str}"
-                    )
-                    self._session.run(
+                        f"{handle} = loadTable('{db_path}', '{table_name}');"
+                        f"delete from {handle} where {cond_str};"
                         f"tableInsert({handle}, select {col_select} from {tmp_var});"
                         f"undef('{tmp_var}')"
                     )
@@ -991,16 +1055,12 @@ class DolphinDBClient:
             )
             with self._lock:
                 self._ensure_connected()
-                # 先删除旧记录
-                self._session.run(
-                    f'sync_log_handle = loadTable("{self._db_path}", "sync_log");'
-                    f'delete from sync_log_handle where source = "{source}" and data_type = "{data_type}"'
-                )
-                # 再插入新记录
                 tmp_var = f"sync_log_{threading.current_thread().ident}"
                 self._session.upload({tmp_var: pdf})
+                # 删除旧记录 + 插入新记录在同一个脚本内完成，只需一次往返
                 self._session.run(
                     f'sync_log_handle = loadTable("{self._db_path}", "sync_log");'
+                    f'delete from sync_log_handle where source = "{source}" and data_type = "{data_type}";'
                     f"tableInsert(sync_log_handle, {tmp_var});"
                     f"undef('{tmp_var}')"
                 )
@@ -0,0 +1,31 @@
+"""DolphinDB 连接失败时的快速报错测试（子进程中导入，避免模块级单例连接影响其他测试）"""
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+_SCRIPT = """
+from app.core.config import settings
+settings.database.dolphindb_host = "127.0.0.1"
+settings.database.dolphindb_port = {port}
+try:
+    import store.dolphindb_client
+except ConnectionError:
+    print("CONNECTION_ERROR")
+"""
+
+
+def _closed_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_failed_connect_raises_without_blocking():
+    result = subprocess.run(
+        [sys.executable, "-c", _SCRIPT.format(port=_closed_port())],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=60,
+    )
+    assert "CONNECTION_ERROR" in result.stdout
@@ -54,6 +54,12 @@ class TestEscapeValue:
         result = DolphinDBClient._escape_value('say "hi"')
         assert result == '"say \\"hi\\""'
 
+    def test_list(self):
+        assert DolphinDBClient._escape_value(["000001.SZ", "600000.SH"]) == '["000001.SZ", "600000.SH"]'
+
+    def test_tuple_of_ints(self):
+        assert DolphinDBClient._escape_value((1, 2)) == "[1, 2]"
+
 
 class TestSubstituteParams:
     def test_no_params(self):
@@ -0,0 +1,69 @@
+"""动态 Flow 分层调度的单元测试（不依赖数据库连接）"""
+import asyncio
+
+import pytest
+from flows import dynamic_flow
+
+
+class TestExecuteLayer:
+    @pytest.fixture
+    def calls(self, monkeypatch):
+        calls = []
+
+        def factor_batch(task_ids, target_date):
+            calls.append(("batch", list(task_ids)))
+            return [{"task_id": tid, "type": "factor", "success": tid != "factor_b"} for tid in task_ids]
+
+        def factor_single(task_id, target_date):
+            calls.append(("factor", task_id))
+            return {"task_id": task_id, "type": "factor", "success": True}
+
+        def sync(task_id, target_date):
+            calls.append(("sync", task_id))
+            return {"task_id": task_id, "type": "sync", "success": True}
+
+        monkeypatch.setattr(dynamic_flow, "_execute_factor_batch_sync", factor_batch)
+        monkeypatch.setattr(dynamic_flow, "_execute_factor_task_sync", factor_single)
+        monkeypatch.setattr(dynamic_flow, "_execute_sync_task_sync", sync)
+        return calls
+
+    def test_factors_run_as_one_batch(self, calls):
+        layer = [
+            {"id": "factor_a", "type": "factor"},
+            {"id": "daily", "type": "sync"},
+            {"id": "factor_b", "type": "factor"},
+        ]
+        results = asyncio.run(dynamic_flow._execute_layer(layer, "20240102"))
+        assert [r["task_id"] for r in results] == ["factor_a", "daily", "factor_b"]
+        assert [r["success"] for r in results] == [True, True, False]
+        assert ("batch", ["factor_a", "factor_b"]) in calls
+        assert ("sync", "daily") in calls
+        assert not any(kind == "factor" for kind, _ in calls)
+
+    def test_single_factor_runs_alone(self, calls):
+        results = asyncio.run(dynamic_flow._execute_layer([{"id": "factor_a", "type": "factor"}], None))
+        assert results == [{"task_id": "factor_a", "type": "factor", "success": True}]
+        assert calls == [("factor", "factor_a")]
+
+
+class TestTopologicalSort:
+    def test_layers_and_cache(self):
+        dynamic_flow._layer_ids.cache_clear()
+        tasks = [
+            {"id": "daily", "type": "sync"},
+            {"id": "factor_a", "type": "factor", "depends_on": ["daily"]},
+            {"id": "factor_b", "type": "factor", "depends_on": ["daily", "factor_a"]},
+        ]
+        layers = dynamic_flow._topological_sort(tasks)
+        assert [[t["id"] for t in layer] for layer in layers] == [["daily"], ["factor_a"], ["factor_b"]]
+        assert layers[1][0] is tasks[1]
+
+        # 同一拓扑的新配置对象复用缓存，返回的仍是新对象中的任务
+        fresh = [dict(t) for t in tasks]
+        assert dynamic_flow._topological_sort(fresh)[2][0] is fresh[2]
+        assert dynamic_flow._layer_ids.cache_info().hits == 1
+
+    def test_cycle(self):
+        tasks = [{"id": "a", "type": "sync", "depends_on": ["b"]}, {"id": "b", "type": "sync", "depends_on": ["a"]}]
+        with pytest.raises(ValueError):
+            dynamic_flow._topological_sort(tasks)
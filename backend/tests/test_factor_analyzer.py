@@ -0,0 +1,161 @@
+"""因子分析引擎计算逻辑的单元测试（不依赖数据库连接）"""
+import numpy as np
+import polars as pl
+import pytest
+from engine.analysis.analyzer import FactorAnalyzer
+
+
+@pytest.fixture
+def analyzer():
+    return FactorAnalyzer(db_client=None)
+
+
+@pytest.fixture
+def merged_df():
+    """模拟合并后的因子 + 价格数据：40 只股票 × 12 个交易日"""
+    rng = np.random.default_rng(42)
+    codes = [f"{i:06d}.SZ" for i in range(40)]
+    dates = [f"202401{d:02d}" for d in range(1, 13)]
+    n = len(codes) * len(dates)
+    return pl.DataFrame({
+        "ts_code": [c for c in codes for _ in dates],
+        "trade_date": dates * len(codes),
+        "factor_value": rng.normal(size=n),
+        "close": rng.uniform(5, 50, size=n),
+        "pct_chg": rng.normal(size=n),
+    })
+
+
+def _prepare(analyzer, df, periods, quantiles=5):
+    return analyzer._prepare_frame(df.lazy(), periods, quantiles)
+
+
+class TestPrepareFrame:
+    def test_forward_return_columns(self, analyzer, merged_df):
+        prepared = _prepare(analyzer, merged_df, [1, 5]).collect()
+        assert "fwd_return_1" in prepared.columns
+        assert "fwd_return_5" in prepared.columns
+        assert "quantile" in prepared.columns
+
+    def test_forward_return_values(self, analyzer, merged_df):
+        prepared = _prepare(analyzer, merged_df, [1]).collect()
+        one = prepared.filter(pl.col("ts_code") == "000000.SZ")
+        close = one["close"].to_list()
+        fwd = one["fwd_return_1"].to_list()
+        assert fwd[0] == pytest.approx(close[1] / close[0] - 1.0)
+        assert fwd[-1] is None
+
+    def test_forward_return_matches_grouped_shift(self, analyzer, merged_df):
+        prepared = _prepare(analyzer, merged_df, [1, 5]).collect()
+        expected = merged_df.sort(["ts_code", "trade_date"]).select([
+            (pl.col("close").shift(-p).over("ts_code") / pl.col("close") - 1.0).alias(f"fwd_return_{p}")
+            for p in [1, 5]
+        ])
+        assert prepared.select(["fwd_return_1", "fwd_return_5"]).equals(expected)
+        assert "_run" not in prepared.columns
+
+    def test_quantile_range(self, analyzer, merged_df):
+        prepared = _prepare(analyzer, merged_df, [1]).collect()
+        assert prepared["quantile"].min() == 0
+        assert prepared["quantile"].max() == 4
+
+
+class TestQuantileReturns:
+    def test_periods_present(self, analyzer, merged_df):
+        grouped = analyzer._calc_quantile_returns(_prepare(analyzer, merged_df, [1, 5]), [1, 5]).collect()
+        result = analyzer._split_quantile_returns(grouped, [1, 5])
+        assert set(result.keys()) == {1, 5}
+        assert result[1].columns == ["trade_date", "quantile", "mean_return"]
+
+    def test_no_rows_without_forward_return(self, analyzer, merged_df):
+        grouped = analyzer._calc_quantile_returns(_prepare(analyzer, merged_df, [5]), [5]).collect()
+        result = analyzer._split_quantile_returns(grouped, [5])
+        # 最后 5 个交易日没有远期收益，不应出现在分层结果中
+        assert result[5]["trade_date"].n_unique() == 12 - 5
+
+
+class TestTurnover:
+    @staticmethod
+    def _turnover(analyzer, df):
+        prepared_lf = _prepare(analyzer, df, [1])
+        prepared, by_q = pl.collect_all([prepared_lf, analyzer._calc_turnover(prepared_lf)])
+        return analyzer._format_turnover(by_q, prepared, 5)
+
+    def test_static_factor_zero_turnover(self, analyzer, merged_df):
+        static = merged_df.with_columns(
+            pl.col("ts_code").str.slice(0, 6).cast(pl.Float64).alias("factor_value")
+        )
+        turnover = self._turnover(analyzer, static)
+        assert all(v == pytest.approx(0.0) for v in turnover.values())
+
+    def test_keys(self, analyzer, merged_df):
+        turnover = self._turnover(analyzer, merged_df)
+        assert list(turnover.keys()) == ["Q1", "Q2", "Q3", "Q4", "Q5"]
+        assert all(0.0 <= v <= 1.0 for v in turnover.values())
+
+
+class TestICSeries:
+    def test_perfect_factor(self, analyzer, merged_df):
+        # 因子值等于下一期收益 → Rank IC 恒为 1
+        perfect = (
+            merged_df.sort(["ts_code", "trade_date"])
+            .with_columns(
+                (pl.col("close").shift(-1).over("ts_code") / pl.col("close") - 1.0).alias("factor_value")
+            )
+        )
+        ic = analyzer._calc_ic_series(_prepare(analyzer, perfect, [1]), 1).collect()
+        assert not ic.is_empty()
+        assert ic["ic"].min() == pytest.approx(1.0)
+
+    def test_matches_manual_spearman(self, analyzer, merged_df):
+        ic = analyzer._calc_ic_series(_prepare(analyzer, merged_df, [1]), 1).collect()
+        prepared = _prepare(analyzer, merged_df, [1]).collect()
+        cross = prepared.filter(pl.col("trade_date") == ic["trade_date"][0])
+        expected = np.corrcoef(
+            cross["factor_value"].rank().to_numpy(), cross["fwd_return_1"].rank().to_numpy()
+        )[0, 1]
+        assert ic["ic"][0] == pytest.approx(expected)
+
+    def test_small_cross_section_skipped(self, analyzer, merged_df):
+        small = merged_df.filter(pl.col("ts_code") < "000010.SZ")
+        assert analyzer._calc_ic_series(_prepare(analyzer, small, [1]), 1).collect().is_empty()
+
+
+class TestAnalyze:
+    class _FakeDB:
+        def __init__(self, df):
+            self.df = df
+            self.written = {}
+
+        def query(self, sql, params=None):
+            if "factor_values" in sql:
+                return self.df.select(["ts_code", "trade_date", "factor_value"])
+            return self.df.select(["ts_code", "trade_date", "close", "pct_chg"])
+
+        def bulk_copy(self, table_name, df, *args, **kwargs):
+            self.written[table_name] = df
+            return len(df)
+
+        def upsert(self, table_name, df, key_columns, *args, **kwargs):
+            self.written[table_name] = df
+
+    def test_end_to_end(self, merged_df):
+        db = self._FakeDB(merged_df)
+        summary = FactorAnalyzer(db).analyze("f", periods=[1, 5], quantiles=5)
+        assert set(summary["periods"].keys()) == {"1", "5"}
+        assert len(summary["periods"]["1"]["quantile_returns"]) == 5
+        assert set(summary["turnover"].keys()) == {"Q1", "Q2", "Q3", "Q4", "Q5"}
+        assert set(db.written["factor_ic_series"]["period"].unique().to_list()) == {1, 5}
+        assert len(db.written["factor_analysis"]) == 1
+
+    def test_analyze_many(self, merged_df):
+        class _DB(self._FakeDB):
+            def query(self, sql, params=None):
+                if "factor_values" in sql and params[0] == "missing":
+                    return pl.DataFrame()
+                return super().query(sql, params)
+
+        results = FactorAnalyzer(_DB(merged_df)).analyze_many(["f", "missing", "g"], periods=[1])
+        assert list(results.keys()) == ["f", "missing", "g"]
+        assert results["missing"] is None
+        assert results["f"]["ic_mean"] == results["g"]["ic_mean"]
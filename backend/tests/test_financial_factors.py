@@ -0,0 +1,105 @@
+"""因子评价工具（engine.factors.financial）的单元测试"""
+import numpy as np
+import polars as pl
+import pytest
+from engine.factors.financial import FactorAnalyzer
+
+
+@pytest.fixture
+def panel_df():
+    """模拟面板数据：30 只股票 × 8 个交易日，含少量缺失"""
+    rng = np.random.default_rng(7)
+    codes = [f"{i:06d}.SZ" for i in range(30)]
+    dates = [f"202401{d:02d}" for d in range(1, 9)]
+    n = len(codes) * len(dates)
+    factor = rng.normal(size=n)
+    factor[::17] = np.nan
+    return pl.DataFrame({
+        "trade_date": [d for d in dates for _ in codes],
+        "ts_code": codes * len(dates),
+        "factor": factor,
+        "ret": rng.normal(size=n),
+    }).with_columns(pl.col("factor").fill_nan(None))
+
+
+class TestScalarIC:
+    def test_ic_matches_corrcoef(self, panel_df):
+        df = panel_df.drop_nulls()
+        expected = np.corrcoef(df["factor"].to_numpy(), df["ret"].to_numpy())[0, 1]
+        assert FactorAnalyzer.ic(panel_df["factor"], panel_df["ret"]) == pytest.approx(expected)
+
+    def test_rank_ic_with_nulls(self):
+        factor = pl.Series([1, 2, 3, None, 5, 6, 7])
+        ret = pl.Series([2.0, 1.0, 4.0, 3.0, 6.0, 5.0, None])
+        # 有效对: (1,2) (2,1) (3,4) (5,6) (6,5) → 秩相关 0.8
+        assert FactorAnalyzer.rank_ic(factor, ret) == pytest.approx(0.8)
+
+    def test_degenerate_inputs_nan(self):
+        assert np.isnan(FactorAnalyzer.ic(pl.Series([1.0, 2.0, 3.0]), pl.Series([1.0, 2.0, 3.0])))
+        assert np.isnan(FactorAnalyzer.ic(pl.Series([1.0, 2.0, 3.0, 4.0, 5.0]), pl.Series([1.0] * 5)))
+
+
+class TestICSeries:
+    def test_matches_scalar_ic(self, panel_df):
+        result = FactorAnalyzer.ic_series(panel_df, "factor", "ret")
+        assert result.columns == ["trade_date", "ic", "rank_ic"]
+        assert len(result) == 8
+        for date, ic, rank_ic in result.iter_rows():
+            day = panel_df.filter(pl.col("trade_date") == date)
+            assert ic == pytest.approx(FactorAnalyzer.ic(day["factor"], day["ret"]))
+            assert rank_ic == pytest.approx(FactorAnalyzer.rank_ic(day["factor"], day["ret"]))
+
+    def test_small_cross_section_nan(self, panel_df):
+        small = panel_df.filter(pl.col("ts_code") < "000004.SZ")
+        result = FactorAnalyzer.ic_series(small, "factor", "ret")
+        assert len(result) == 8
+        assert result["ic"].is_nan().all()
+
+    def test_nan_treated_as_missing(self, panel_df):
+        # NaN 与 null 一样视为缺失，结果与 ic()/rank_ic() 一致
+        with_nan = panel_df.with_columns(pl.col("factor").fill_null(float("nan")))
+        result = FactorAnalyzer.ic_series(with_nan, "factor", "ret")
+        assert not result["ic"].is_nan().any()
+        for date, ic, rank_ic in result.iter_rows():
+            day = with_nan.filter(pl.col("trade_date") == date)
+            assert ic == pytest.approx(FactorAnalyzer.ic(day["factor"], day["ret"]))
+            assert rank_ic == pytest.approx(FactorAnalyzer.rank_ic(day["factor"], day["ret"]))
+
+
+class TestCorrelationMatrix:
+    def test_square_and_symmetric(self, panel_df):
+        df = panel_df.with_columns((pl.col("ret") * 2 + 1).alias("ret2"))
+        corr = FactorAnalyzer.correlation_matrix(df, ["factor", "ret", "ret2"])
+        assert corr.columns == ["factor", "ret", "ret2"]
+        mat = corr.to_numpy()
+        assert mat.shape == (3, 3)
+        assert np.allclose(mat, mat.T)
+        assert np.allclose(np.diag(mat), 1.0)
+        assert corr["ret"][2] == pytest.approx(1.0)
+
+
+class TestLayeredReturns:
+    def test_quantile_buckets(self, panel_df):
+        result = FactorAnalyzer.layered_returns(panel_df, "factor", "ret", n_groups=5)
+        assert result.columns == ["trade_date", "quantile", "avg_return"]
+        assert set(result["quantile"].drop_nulls().unique().to_list()) == {1, 2, 3, 4, 5}
+
+    def test_monotonic_factor(self):
+        # 收益等于因子值 → 高分层平均收益更高
+        df = pl.DataFrame({
+            "trade_date": ["20240101"] * 10,
+            "factor": [float(i) for i in range(10)],
+        }).with_columns(pl.col("factor").alias("ret"))
+        result = FactorAnalyzer.layered_returns(df, "factor", "ret", n_groups=5)
+        assert result["quantile"].to_list() == [1, 2, 3, 4, 5]
+        assert result["avg_return"].to_list() == sorted(result["avg_return"].to_list())
+
+    def test_ties_land_in_middle_bucket(self):
+        # 大量并列值取平均秩 → 落在中间分层, 而不是全部挤进 Q1
+        df = pl.DataFrame({
+            "trade_date": ["20240101"] * 10,
+            "factor": [0.0] + [1.0] * 8 + [2.0],
+            "ret": [float(i) for i in range(10)],
+        })
+        result = FactorAnalyzer.layered_returns(df, "factor", "ret", n_groups=5)
+        assert result["quantile"].to_list() == [1, 3, 5]
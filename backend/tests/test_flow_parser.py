@@ -1,7 +1,7 @@
 """FlowParser 拓扑排序和信号解析的单元测试"""
 import polars as pl
 import pytest
-from engine.parser.flow_parser import FlowParser
+from engine.parser.flow_parser import FlowParser, Op, OPERATOR_REGISTRY, _compile_condition
 
 
 @pytest.fixture
@@ -76,32 +76,90 @@ class TestApplySignal:
         result = parser._apply_signal(df, {"condition": ""}, "signal")
         assert result["signal"].to_list() == [1, 1]
 
+    def test_missing_column_defaults_to_one(self, dummy_loader):
+        parser = FlowParser(dummy_loader)
+        df = pl.DataFrame({"close": [10.0, 20.0]})
+        result = parser._apply_signal(df, {"condition": "close > sma99"}, "signal")
+        assert result["signal"].to_list() == [1, 1]
+
+    def test_compiled_condition_cached(self):
+        first = _compile_condition("close >= 15", "signal")
+        assert _compile_condition("close >= 15", "signal") is first
+        df = pl.DataFrame({"close": [10.0, 15.0, 20.0]})
+        assert df.with_columns(first)["signal"].to_list() == [0, 1, 1]
+
+
+def _apply_operator(df, data):
+    """按 parse_and_run 的方式把单个算子节点的表达式应用到 df"""
+    exprs = FlowParser._operator_exprs(data, Op.parse(data.get("op", "")))
+    return df.with_columns(exprs) if exprs else df
+
 
 class TestApplyOperator:
-    def test_sma_operator(self, dummy_loader):
-        parser = FlowParser(dummy_loader)
+    def test_sma_operator(self):
         df = pl.DataFrame({"close": [10.0, 11.0, 12.0, 13.0, 14.0]})
-        result = parser._apply_operator(df, {"op": "sma", "window": 3, "output_col": "sma3"})
+        result = _apply_operator(df, {"op": "sma", "window": 3, "output_col": "sma3"})
         assert "sma3" in result.columns
         assert len(result) == 5
 
-    def test_rsi_operator(self, dummy_loader):
-        parser = FlowParser(dummy_loader)
+    def test_rsi_operator(self):
         df = pl.DataFrame({"close": [10.0, 11.0, 12.0, 11.0, 13.0, 12.0, 14.0]})
-        result = parser._apply_operator(df, {"op": "rsi", "window": 5, "output_col": "rsi5"})
+        result = _apply_operator(df, {"op": "rsi", "window": 5, "output_col": "rsi5"})
         assert "rsi5" in result.columns
 
-    def test_macd_operator(self, dummy_loader):
-        parser = FlowParser(dummy_loader)
+    def test_macd_operator(self):
         df = pl.DataFrame({"close": [float(i) for i in range(30)]})
-        result = parser._apply_operator(df, {"op": "macd", "output_col": "m"})
+        result = _apply_operator(df, {"op": "macd", "output_col": "m"})
         assert "m_macd" in result.columns
         assert "m_signal" in result.columns
         assert "m_hist" in result.columns
 
-    def test_unknown_operator(self, dummy_loader):
-        parser = FlowParser(dummy_loader)
+    def test_unknown_operator(self):
         df = pl.DataFrame({"close": [10.0, 11.0]})
-        result = parser._apply_operator(df, {"op": "unknown_op"})
+        result = _apply_operator(df, {"op": "unknown_op"})
         # 未知算子不应修改 DataFrame 列
         assert result.columns == ["close"]
+
+    def test_every_registered_operator_has_op(self):
+        assert {op.name.lower() for op in Op} == set(OPERATOR_REGISTRY)
+        assert Op.parse("macd") is Op.MACD
+        assert Op.parse("unknown_op") is None
+
+    def test_kdj_operator(self, dummy_loader):
+        df = dummy_loader("000001.SZ", "", "")
+        result = _apply_operator(df, {"op": "kdj", "output_col": "kdj"})
+        assert {"kdj_k", "kdj_d", "kdj_j"} <= set(result.columns)
+
+
+class TestParseAndRun:
+    def test_dependent_operators_batched(self, dummy_loader):
+        # sma3 与 ema3 同批计算；zscore 依赖 sma3，需先落地前一批
+        parser = FlowParser(dummy_loader)
+        graph = {
+            "nodes": [
+                {"id": "1", "type": "data_input", "data": {"ts_code": "000001.SZ"}},
+                {"id": "2", "type": "operator", "data": {"op": "sma", "window": 3, "output_col": "sma3"}},
+                {"id": "3", "type": "operator", "data": {"op": "ema", "window": 3, "output_col": "ema3"}},
+                {"id": "4", "type": "operator", "data": {"op": "zscore", "col": "sma3"}},
+                {"id": "5", "type": "signal", "data": {"condition": "close > sma3"}},
+                {"id": "6", "type": "backtest_output", "data": {"config": {}}},
+            ],
+            "edges": [
+                {"source": str(i), "target": str(i + 1)} for i in range(1, 6)
+            ],
+        }
+        result = parser.parse_and_run(graph)
+        assert "total_return" in result["metrics"]
+        assert len(result["equity_curve"]) == 5
+
+    def test_bad_signal_column_defaults_to_one(self, dummy_loader):
+        parser = FlowParser(dummy_loader)
+        graph = {
+            "nodes": [
+                {"id": "1", "type": "data_input", "data": {"ts_code": "000001.SZ"}},
+                {"id": "2", "type": "signal", "data": {"condition": "close > sma99"}},
+            ],
+            "edges": [{"source": "1", "target": "2"}],
+        }
+        result = parser.parse_and_run(graph)
+        assert result["metrics"]["n_trades"] == 1
@@ -0,0 +1,26 @@
+"""ML 流水线特征缓存键的单元测试"""
+import polars as pl
+import pytest
+
+pytest.importorskip("optuna")
+from ml_module.pipeline import MLPipeline  # noqa: E402
+
+
+def _frame(closes):
+    return pl.DataFrame({
+        "ts_code": ["A", "A", "B", "B"],
+        "trade_date": ["20240101", "20240102"] * 2,
+        "close": closes,
+    })
+
+
+class TestDataKey:
+    def test_same_content_same_key(self):
+        assert MLPipeline(_frame([10.0, 11.0, 5.0, 6.0]))._data_key() == \
+            MLPipeline(_frame([10.0, 11.0, 5.0, 6.0]))._data_key()
+
+    def test_reversed_path_changes_key(self):
+        # 行数、列和、最值都相同，只有每只股票的价格路径反转
+        original = MLPipeline(_frame([10.0, 11.0, 5.0, 6.0]))._data_key()
+        reversed_path = MLPipeline(_frame([11.0, 10.0, 6.0, 5.0]))._data_key()
+        assert original != reversed_path
@@ -0,0 +1,541 @@
+"""生产因子计算函数的单元测试（不依赖数据库连接）"""
+import threading
+
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from engine.production.engine import DEFAULT_OPTS, ProductionEngine, thread_engine
+from engine.production.factors.factor_volatility_10 import compute_volatility_10
+from engine.production.factors.value import compute_pb_rank, compute_pe_rank, compute_turnover_rank
+from engine.production.factors.momentum import (
+    compute_ma_5, compute_ma_20, compute_momentum_20, compute_rsi_14, compute_volatility_20,
+)
+
+
+@pytest.fixture
+def daily_df():
+    """模拟日线数据：8 只股票 × 60 个交易日，按 (ts_code, trade_date) 排序（与引擎加载结果一致）"""
+    rng = np.random.default_rng(7)
+    codes = [f"{i:06d}.SZ" for i in range(8)]
+    dates = [f"2024{m:02d}{d:02d}" for m in range(1, 4) for d in range(1, 21)]
+    n = len(codes) * len(dates)
+    return pl.DataFrame({
+        "ts_code": [c for c in codes for _ in dates],
+        "trade_date": dates * len(codes),
+        "close": rng.uniform(5, 50, size=n),
+        "pct_chg": rng.normal(size=n),
+    })
+
+
+def _reference(df, expr):
+    """逐股票按日期排序后的参考实现"""
+    return (
+        df.with_columns(expr.over("ts_code").alias("factor_value"))
+        .select(["ts_code", "trade_date", "factor_value"])
+        .drop_nulls()
+    )
+
+
+class TestRollingFactors:
+    @pytest.mark.parametrize("func, expr", [
+        (compute_ma_5, pl.col("close").rolling_mean(5)),
+        (compute_ma_20, pl.col("close").rolling_mean(20)),
+        (compute_momentum_20, pl.col("close") / pl.col("close").shift(20) - 1.0),
+        (compute_volatility_10, pl.col("pct_chg").rolling_std(10)),
+        (compute_volatility_20, pl.col("pct_chg").rolling_std(20)),
+    ])
+    def test_matches_reference(self, daily_df, func, expr):
+        result = func(daily_df, {})
+        assert isinstance(result, pl.DataFrame)
+        assert result.columns == ["ts_code", "trade_date", "factor_value"]
+        assert_frame_equal(result, _reference(daily_df, expr))
+
+    def test_ma_skips_windows_with_missing_close(self):
+        df = pl.DataFrame({
+            "ts_code": ["A"] * 8 + ["B"] * 3,
+            "trade_date": [f"202401{d:02d}" for d in range(1, 9)] + ["20240101", "20240102", "20240103"],
+            "close": [1.0, 2.0, 3.0, None, 5.0, 6.0, 7.0, 8.0, 1.0, 2.0, 3.0],
+        })
+        result = compute_ma_5(df, {"window": 3})
+        assert result["trade_date"].to_list() == ["20240103", "20240107", "20240108", "20240103"]
+        assert result["factor_value"].to_list() == pytest.approx([2.0, 6.0, 7.0, 2.0])
+
+    def test_rsi_matches_expression_chain(self, daily_df):
+        w = 14
+        gain = pl.col("change").clip(lower_bound=0.0).fill_null(0.0)
+        loss = (-pl.col("change")).clip(lower_bound=0.0).fill_null(0.0)
+        expected = (
+            daily_df.with_columns((pl.col("close") - pl.col("close").shift(1)).over("ts_code").alias("change"))
+            .with_columns(
+                gain.rolling_mean(w).over("ts_code").alias("avg_gain"),
+                loss.rolling_mean(w).over("ts_code").alias("avg_loss"),
+            )
+            .with_columns(
+                pl.when(pl.col("avg_loss") == 0).then(100.0)
+                .otherwise(100.0 - 100.0 / (1.0 + pl.col("avg_gain") / pl.col("avg_loss")))
+                .alias("factor_value")
+            )
+            .select(["ts_code", "trade_date", "factor_value"])
+            .drop_nulls()
+        )
+        result = compute_rsi_14(daily_df, {"window": w})
+        assert result.select(["ts_code", "trade_date"]).equals(expected.select(["ts_code", "trade_date"]))
+        np.testing.assert_allclose(result["factor_value"].to_numpy(), expected["factor_value"].to_numpy())
+
+    def test_rsi_all_gains(self):
+        df = pl.DataFrame({
+            "ts_code": ["A"] * 20,
+            "trade_date": [f"202401{d:02d}" for d in range(1, 21)],
+            "close": [float(i) for i in range(1, 21)],
+        })
+        assert compute_rsi_14(df, {"window": 14})["factor_value"].to_list() == [100.0] * 7
+
+    def test_rsi_bounds(self, daily_df):
+        result = compute_rsi_14(daily_df, {"window": 14})
+        # 首行涨跌为空时 gain/loss 取 0，故只有前 window-1 行为空
+        assert result.height == 8 * (60 - 13)
+        assert result["factor_value"].min() >= 0.0
+        assert result["factor_value"].max() <= 100.0
+
+
+class _FakeDB:
+    """按表名返回固定数据的假 DB 客户端"""
+
+    _db_path = "dfs://test"
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.queries = []
+
+    def query(self, sql, params=None):
+        self.queries.append(sql)
+        for name, df in self.tables.items():
+            if name in sql:
+                return df
+        return pl.DataFrame()
+
+
+class TestLoadData:
+    @pytest.fixture
+    def engine(self):
+        daily = pl.DataFrame({
+            "ts_code": ["B", "A", "A", "B"],
+            "trade_date": ["20240102", "20240102", "20240101", "20240101"],
+            "close": [20.0, 10.0, 5.0, 10.0],
+        })
+        adj = pl.DataFrame({
+            "ts_code": ["A", "A", "B", "B"],
+            "trade_date": ["20240101", "20240102", "20240101", "20240102"],
+            "adj_factor": [1.0, 2.0, 1.0, 1.0],
+        })
+        return ProductionEngine(_FakeDB({"sync_adj_factor": adj, "sync_daily_data": daily}))
+
+    @staticmethod
+    def _load(engine, adjust_price):
+        definition = type("D", (), {"depends_on": ["sync_daily_data"], "columns": None})()
+        return engine._load_data(definition, "20240101", "20240102", adjust_price=adjust_price)
+
+    def test_declared_columns_pruned(self, engine):
+        definition = type("D", (), {"depends_on": ["sync_daily_data"], "columns": ["close"]})()
+        engine._load_data(definition, "20240101", "20240102", adjust_price="none")
+        sql = engine.db.queries[-1]
+        assert sql.startswith("SELECT ts_code, trade_date, close FROM sync_daily_data")
+        assert "ORDER BY" not in sql
+
+    def test_sorted_once(self, engine):
+        df = self._load(engine, "none")
+        assert df["ts_code"].to_list() == ["A", "A", "B", "B"]
+        assert df["trade_date"].to_list() == ["20240101", "20240102"] * 2
+
+    def test_forward_adjust(self, engine):
+        df = self._load(engine, "forward")
+        assert df["close"].to_list() == [2.5, 10.0, 10.0, 20.0]
+        assert "_base_adj" not in df.columns
+
+    def test_backward_adjust(self, engine):
+        df = self._load(engine, "backward")
+        assert df["close"].to_list() == [5.0, 20.0, 10.0, 20.0]
+
+
+class TestFilterSpecialStocks:
+    @pytest.fixture
+    def engine(self):
+        stock_basic = pl.DataFrame({
+            "ts_code": ["A", "B", "C", "D"],
+            "name": ["平安银行", "*ST 某某", "ST 某某", "新股"],
+            "list_date": ["19910403", "20000101", None, "20240101"],
+        })
+        return ProductionEngine(_FakeDB({"sync_stock_basic": stock_basic}))
+
+    @pytest.fixture
+    def panel(self):
+        return pl.DataFrame({
+            "ts_code": ["A", "B", "C", "D", "A", "D"],
+            "trade_date": ["20240301"] * 4 + ["20240302"] * 2,
+        }).sort(["ts_code", "trade_date"])
+
+    def test_excludes_st_and_new(self, engine, panel):
+        df = engine._filter_special_stocks(panel, "20240301", new_stock_days=60)
+        assert df["ts_code"].to_list() == ["A", "A"]
+        assert df["trade_date"].to_list() == ["20240301", "20240302"]
+
+    def test_flags(self, engine, panel):
+        only_st = engine._filter_special_stocks(panel, "20240301", filter_new_stock=False)
+        assert only_st["ts_code"].to_list() == ["A", "A", "D", "D"]
+        only_new = engine._filter_special_stocks(panel, "20240301", filter_st=False, new_stock_days=60)
+        assert only_new["ts_code"].to_list() == ["A", "A", "B", "C"]
+
+    def test_stock_list_cached(self, engine, panel):
+        engine._filter_special_stocks(panel, "20240301")
+        engine._filter_special_stocks(panel, "20240301")
+        assert sum("sync_stock_basic" in q for q in engine.db.queries) == 1
+
+
+class TestRunBatch:
+    class _Session:
+        def __init__(self):
+            self.uploads = []
+            self.scripts = []
+
+        def upload(self, tables):
+            self.uploads.append(tables)
+
+        def run(self, script):
+            self.scripts.append(script)
+
+    class _DB(_FakeDB):
+        def __init__(self, tables):
+            super().__init__(tables)
+            self.written = {}
+            self._lock = threading.Lock()
+            self._session = TestRunBatch._Session()
+            self.executed = []
+
+        def _ensure_connected(self):
+            pass
+
+        def upsert(self, table_name, df, key_columns, *args, **kwargs):
+            self.written.setdefault(table_name, []).append(df)
+
+        def execute(self, sql, params=None):
+            self.executed.append(sql)
+
+    def test_dependency_served_from_batch(self, daily_df):
+        db = self._DB({"sync_daily_data": daily_df})
+        engine = ProductionEngine(db)
+        results = engine.run_batch(
+            ["factor_custom_01", "factor_ma_20"],
+            mode="full", start_date="20240201", end_date="20240320",
+            preprocess={"filter_st": False, "filter_new_stock": False, "adjust_price": "none"},
+        )
+        assert results == {"factor_ma_20": True, "factor_custom_01": True}
+        ma, custom = db.written["factor_values"]
+        assert ma["factor_id"][0] == "factor_ma_20" and custom["factor_id"][0] == "factor_custom_01"
+        # 依赖的 MA 直接取自本批次结果，不回查已存储的 factor_ma_20（假 DB 中并不存在）
+        merged = ma.join(custom, on=["ts_code", "trade_date"], suffix="_c")
+        assert merged.height == ma.height
+        np.testing.assert_allclose(merged["factor_value_c"].to_numpy(), 1.0 / merged["factor_value"].to_numpy())
+        assert engine._batch_results == {}
+        # 两个因子的元数据在批次结束后一次上传写入
+        meta_uploads = [u["_meta_upd"] for u in db._session.uploads if "_meta_upd" in u]
+        assert len(meta_uploads) == 1
+        assert meta_uploads[0]["factor_id"].tolist() == ["factor_ma_20", "factor_custom_01"]
+        assert engine._pending_meta is None
+        # 元数据在批次开始时一次预取
+        assert sum("factor_metadata" in q for q in db.queries) == 1
+        assert engine._meta_cache is None
+        # 运行记录以字面量直接插入，不经过上传
+        inserts = [q for q in db.executed if "tableInsert" in q]
+        assert len(inserts) == 2
+        assert '"factor_ma_20", "full", "running", "20240201", "20240320", 0, 0.0' in inserts[0]
+        assert all(set(u) == {"_meta_upd"} for u in db._session.uploads)
+
+    def test_errors_collected_per_factor(self, daily_df, monkeypatch):
+        import dataclasses
+        from engine.production import registry
+
+        def boom(df, params):
+            raise ValueError("bad window")
+
+        broken = dataclasses.replace(registry.get_factor("factor_ma_5"), func=boom)
+        monkeypatch.setitem(registry._factor_registry, "factor_ma_5", broken)
+        db = self._DB({"sync_daily_data": daily_df})
+        engine = ProductionEngine(db)
+        errors = {}
+        results = engine.run_batch(
+            ["factor_ma_5", "factor_ma_20"], errors=errors,
+            mode="full", start_date="20240201", end_date="20240320",
+            preprocess={"filter_st": False, "filter_new_stock": False, "adjust_price": "none"},
+        )
+        assert results == {"factor_ma_5": False, "factor_ma_20": True}
+        assert errors == {"factor_ma_5": "bad window"}
+        assert engine._batch_errors is None
+
+    def test_shared_load_per_depends_on(self, daily_df, monkeypatch):
+        from engine.production.factors import momentum
+
+        calls = []
+        kernel = momentum._rolling_std_kernel
+        monkeypatch.setattr(momentum, "_rolling_std_kernel", lambda *a: calls.append(a[2]) or kernel(*a))
+        db = self._DB({"sync_daily_data": daily_df})
+        ids = ["factor_ma_5", "factor_volatility_10", "factor_volatility_20"]
+        results = ProductionEngine(db).run_batch(
+            ids, mode="full", start_date="20240201", end_date="20240320",
+            preprocess={"filter_st": False, "filter_new_stock": False, "adjust_price": "none"},
+        )
+        assert all(results.values())
+        daily_queries = [q for q in db.queries if "sync_daily_data" in q]
+        assert len(daily_queries) == 1
+        # 按组内列并集加载（含涨跌停标记所需列）
+        assert "close" in daily_queries[0] and "pct_chg" in daily_queries[0]
+        # 两个波动率因子 lookback 不同（30 / 40 天），各自切片后的数据不同，不共用滚动结果
+        assert len(calls) == 2
+        ma5 = db.written["factor_values"][0]
+        assert ma5["factor_id"][0] == "factor_ma_5"
+        expected = _reference(daily_df, pl.col("close").rolling_mean(5)).filter(pl.col("trade_date") >= "20240201")
+        assert_frame_equal(ma5.select(expected.columns), expected)
+
+
+    def test_batch_matches_run_task(self):
+        """同组共享加载后，各因子的复权基准和新股判定仍按自身 lookback，结果与单独运行一致"""
+
+        class _RangeDB(TestRunBatch._DB):
+            # 按 SQL 参数中的日期区间返回数据，模拟真实的 trade_date 过滤
+            def query(self, sql, params=None):
+                df = super().query(sql, params)
+                if params and len(params) >= 2 and "trade_date" in df.columns:
+                    start, end = params[-2], params[-1]
+                    df = df.filter((pl.col("trade_date") >= start) & (pl.col("trade_date") <= end))
+                return df
+
+        rng = np.random.default_rng(11)
+        codes = [f"{i:06d}.SZ" for i in range(6)]
+        dates = [f"{d:%Y%m%d}" for d in pl.date_range(
+            pl.date(2023, 10, 2), pl.date(2024, 2, 29), "1d", eager=True) if d.weekday() < 5]
+        n = len(codes) * len(dates)
+        daily = pl.DataFrame({
+            "ts_code": [c for c in codes for _ in dates],
+            "trade_date": dates * len(codes),
+            "close": rng.uniform(5, 50, size=n),
+            "pct_chg": rng.normal(size=n),
+        })
+        adj = daily.select(["ts_code", "trade_date"]).with_columns(
+            pl.int_range(pl.len()).over("ts_code").cast(pl.Float64).add(1.0).alias("adj_factor")
+        )
+        # 上市日期落在 30 天与 40 天 lookback 各自的新股截止日之间
+        stock_basic = pl.DataFrame({
+            "ts_code": codes,
+            "name": ["股票"] * len(codes),
+            "list_date": ["20100101"] * (len(codes) - 1) + ["20230910"],
+        })
+        tables = {"sync_stock_basic": stock_basic, "sync_adj_factor": adj, "sync_daily_data": daily}
+        ids = ["factor_ma_5", "factor_volatility_10", "factor_volatility_20", "factor_rsi_14"]
+        kwargs = dict(
+            mode="full", start_date="20240201", end_date="20240229",
+            preprocess={"filter_st": False, "new_stock_days": 60, "adjust_price": "backward"},
+        )
+
+        batch_db = _RangeDB(tables)
+        assert all(ProductionEngine(batch_db).run_batch(ids, **kwargs).values())
+        assert sum("sync_daily_data" in q for q in batch_db.queries) == 1
+        batch = {df["factor_id"][0]: df for df in batch_db.written["factor_values"]}
+
+        for fid in ids:
+            single_db = _RangeDB(tables)
+            assert ProductionEngine(single_db).run_task(fid, **kwargs)
+            assert_frame_equal(batch[fid], single_db.written["factor_values"][0])
+
+
+    def test_flags_from_source(self):
+        from app.core.constants import QUALITY_LIMIT_DOWN, QUALITY_NORMAL
+        source = pl.DataFrame({
+            "ts_code": ["A", "A", "B"],
+            "trade_date": ["20240101", "20240102", "20240102"],
+            "_limit_up_down": [1, -1, 0],
+        })
+        result = pl.DataFrame({
+            "ts_code": ["A", "B", "C"], "trade_date": ["20240102"] * 3, "factor_value": [1.0, 2.0, 3.0],
+        })
+        flagged = ProductionEngine._build_quality_flag(result.lazy(), source.lazy()).collect()
+        assert flagged.columns == ["ts_code", "trade_date", "factor_value", "quality_flag"]
+        assert flagged["quality_flag"].to_list() == [QUALITY_LIMIT_DOWN, QUALITY_NORMAL, QUALITY_NORMAL]
+
+    def test_without_limit_marks(self):
+        result = pl.DataFrame({"ts_code": ["A"], "trade_date": ["20240102"], "factor_value": [1.0]})
+        flagged = ProductionEngine._build_quality_flag(result, result).collect()
+        assert flagged["quality_flag"].to_list() == [0]
+
+
+class TestSharedVolatility:
+    def test_windows_computed_once_per_batch(self, daily_df, monkeypatch):
+        from engine.production.factors import momentum
+        from engine.production.registry import batch_cache
+
+        calls = []
+        kernel = momentum._rolling_std_kernel
+        monkeypatch.setattr(momentum, "_rolling_std_kernel", lambda *a: calls.append(a[2]) or kernel(*a))
+        with batch_cache():
+            compute_volatility_10(daily_df, {})
+            compute_volatility_20(daily_df, {})
+        assert [list(w) for w in calls] == [[10, 20]]
+        # 批外每次单独计算
+        compute_volatility_20(daily_df, {})
+        assert len(calls) == 2
+
+    def test_batch_scope_is_thread_local(self):
+        from engine.production.registry import batch_cache, shared_result
+
+        df = pl.DataFrame({"x": [1]})
+        seen = []
+        with batch_cache():
+            shared_result(df, "k", lambda: seen.append("main"))
+            # 其他线程不在批次作用域内，不读写本线程的缓存
+            worker = threading.Thread(target=lambda: [shared_result(df, "k", lambda: seen.append("worker"))
+                                                      for _ in range(2)])
+            worker.start()
+            worker.join()
+            shared_result(df, "k", lambda: seen.append("main"))
+        assert seen == ["main", "worker", "worker"]
+
+
+class TestFactorMeta:
+    def test_single_query(self):
+        meta = pl.DataFrame({
+            "factor_id": ["f"],
+            "params": ['{"window": 5, "preprocess": {"filter_st": false}}'],
+            "last_computed_date": ["20240105"],
+        })
+        db = _FakeDB({"factor_metadata": meta})
+        engine = ProductionEngine(db)
+        assert engine._get_factor_meta("f") == ({"filter_st": False}, "20240105")
+        assert sum("factor_metadata" in q for q in db.queries) == 1
+        assert engine._prefetch_meta(["f", "g"]) == {"f": ({"filter_st": False}, "20240105"), "g": ({}, None)}
+
+
+class TestValueRanks:
+    @pytest.fixture
+    def basic_df(self):
+        rng = np.random.default_rng(3)
+        n = 8 * 60
+        pe = rng.normal(20, 15, size=n)
+        return pl.DataFrame({
+            "ts_code": [f"{i:06d}.SZ" for i in range(8) for _ in range(60)],
+            "trade_date": [f"2024{m:02d}{d:02d}" for m in range(1, 4) for d in range(1, 21)] * 8,
+            "pe": [None if i % 17 == 0 else v for i, v in enumerate(pe)],
+            "pb": rng.normal(2, 2, size=n),
+            "turnover_rate": rng.uniform(0, 10, size=n),
+        })
+
+    @staticmethod
+    def _reference(df, col, valid):
+        return (
+            df.filter(pl.col(col).is_not_null() & valid)
+            .with_columns((pl.col(col).rank().over("trade_date") / pl.col(col).count().over("trade_date"))
+                          .alias("factor_value"))
+            .select(["ts_code", "trade_date", "factor_value"])
+        )
+
+    @pytest.mark.parametrize("func, col, valid", [
+        (compute_pe_rank, "pe", pl.col("pe") > 0),
+        (compute_pb_rank, "pb", pl.col("pb") > 0),
+        (compute_turnover_rank, "turnover_rate", pl.lit(True)),
+    ])
+    def test_matches_per_factor_filter(self, basic_df, func, col, valid):
+        result = func(basic_df, {})
+        assert isinstance(result, pl.LazyFrame)
+        assert_frame_equal(result.collect(), self._reference(basic_df, col, valid))
+
+    def test_single_pass_per_batch(self, basic_df, monkeypatch):
+        from engine.production.factors import value
+        from engine.production.registry import batch_cache
+
+        seen = []
+        shared = value.shared_result
+        monkeypatch.setattr(
+            value, "shared_result", lambda df, key, build: shared(df, key, lambda: seen.append(key) or build())
+        )
+        with batch_cache():
+            compute_pe_rank(basic_df, {})
+            compute_pb_rank(basic_df, {})
+            compute_turnover_rank(basic_df, {})
+        assert seen == ["daily_rank_pct('pe', 'pb', 'turnover_rate')"]
+        # 列裁剪后的单因子运行只计算存在的列
+        assert_frame_equal(
+            compute_pb_rank(basic_df.select(["ts_code", "trade_date", "pb"]), {}).collect(),
+            self._reference(basic_df, "pb", pl.col("pb") > 0),
+        )
+
+
+class TestPreprocessOpts:
+    def test_merge_precedence(self):
+        opts = DEFAULT_OPTS.merge({"filter_st": False}).merge({"adjust_price": "none"}).merge(
+            {"filter_st": True, "unknown": 1, "new_stock_days": None}
+        )
+        assert (opts.adjust_price, opts.filter_st, opts.new_stock_days) == ("none", True, 60)
+        assert DEFAULT_OPTS.merge(None) is DEFAULT_OPTS
+        assert DEFAULT_OPTS.adjust_price == "forward"
+
+
+class TestDiscoverFactors:
+    def test_scan_skipped_until_directory_changes(self, tmp_path, monkeypatch):
+        import importlib
+        import os
+        from engine.production import registry
+
+        imported = []
+        monkeypatch.setattr(importlib, "import_module", imported.append)
+        registry.invalidate_discovery()
+        (tmp_path / "factor_a.py").write_text("")
+        registry.discover_factors(str(tmp_path))
+        registry.discover_factors(str(tmp_path))
+        assert imported == ["engine.production.factors.factor_a"]
+
+        (tmp_path / "factor_b.py").write_text("")
+        os.utime(tmp_path, (0, os.stat(tmp_path).st_mtime + 1))
+        registry.discover_factors(str(tmp_path))
+        assert imported[1:] == ["engine.production.factors.factor_a", "engine.production.factors.factor_b"]
+        registry.invalidate_discovery()
+
+
+class TestRegistryViews:
+    def test_summaries_cached_until_registration(self):
+        from engine.production import registry
+
+        first = registry.list_factors()
+        assert registry.list_factors() is first
+        with pytest.raises(TypeError):
+            registry.get_registry()["x"] = None
+
+        registry.factor("factor_test_tmp", depends_on=["sync_daily_data"])(lambda df, params: df)
+        try:
+            assert "factor_test_tmp" in registry.get_registry()
+            assert "factor_test_tmp" in [f["factor_id"] for f in registry.list_factors()]
+        finally:
+            registry.unregister_factor("factor_test_tmp")
+        assert "factor_test_tmp" not in [f["factor_id"] for f in registry.list_factors()]
+
+    def test_factors_for_sources(self):
+        from engine.production import registry
+
+        registry.discover_factors()
+        daily = registry.factors_for_sources(["sync_daily_data"], compute_mode="incremental")
+        assert "factor_ma_20" in daily and "factor_pe_rank" not in daily
+        assert "factor_rsi_14" not in daily  # 全量因子不进入增量调度
+        # 依赖因子排在被依赖因子之后
+        assert daily.index("factor_ma_20") < daily.index("factor_custom_01")
+        assert "factor_custom_01" not in registry.factors_for_sources(["sync_daily_basic"])
+
+
+class TestThreadEngine:
+    def test_reused_per_thread(self):
+        db = _FakeDB({})
+        engine = thread_engine(db)
+        assert thread_engine(db) is engine
+        assert thread_engine(_FakeDB({})) is not engine
+
+        other = []
+        worker = threading.Thread(target=lambda: other.append(thread_engine(db)))
+        worker.start()
+        worker.join()
+        assert other[0] is not engine and other[0].db is db
@@ -126,6 +126,29 @@ class TestATR:
         for val in result:
             assert val >= 0
 
+    def test_gap_uses_prev_close(self):
+        # 第二根 K 线跳空高开：TR = high - prev_close = 15 - 10
+        high = pl.Series([11.0, 15.0])
+        low = pl.Series([9.0, 14.0])
+        close = pl.Series([10.0, 14.5])
+        result = TechnicalFactors.atr(high, low, close, window=1)
+        assert result[0] == pytest.approx(2.0)
+        assert result[1] == pytest.approx(5.0)
+
+
+class TestExprInput:
+    def test_expr_matches_series(self, sample_ohlc):
+        df = pl.DataFrame(sample_ohlc)
+        eager = TechnicalFactors.atr(df["high"], df["low"], df["close"], 5)
+        lazy = df.lazy().select(
+            TechnicalFactors.atr(pl.col("high"), pl.col("low"), pl.col("close"), 5).alias("atr")
+        ).collect()["atr"]
+        assert lazy.to_list() == pytest.approx(eager.to_list())
+
+    def test_macd_returns_exprs(self):
+        macd_line, signal_line, hist = TechnicalFactors.macd(pl.col("close"))
+        assert all(isinstance(e, pl.Expr) for e in (macd_line, signal_line, hist))
+
 
 class TestCrossSectionalFactors:
     @pytest.fixture
@@ -0,0 +1,122 @@
+"""VectorBT 回测引擎辅助逻辑的单元测试"""
+import numpy as np
+import pandas as pd
+import polars as pl
+import pytest
+from engine.backtester.vector_engine import BacktestConfig, VectorEngine
+
+
+class TestSignalMasks:
+    def test_series_matches_shift_logic(self):
+        signals = pd.Series([1, 1, 0, -1, -1, 1, 0, np.nan, 1])
+        entries, exits, short_entries, short_exits = VectorEngine._signal_masks(signals)
+        prev = signals.shift(1)
+        pd.testing.assert_series_equal(entries, (signals == 1) & (prev != 1))
+        pd.testing.assert_series_equal(exits, (signals != 1) & (prev == 1))
+        pd.testing.assert_series_equal(short_entries, (signals == -1) & (prev != -1))
+        pd.testing.assert_series_equal(short_exits, (signals != -1) & (prev == -1))
+
+    def test_wide_frame_matches_shift_logic(self):
+        rng = np.random.default_rng(0)
+        wide = pd.DataFrame(rng.choice([-1, 0, 1], size=(50, 4)), columns=list("ABCD"))
+        prev = wide.shift(1)
+        expected = (
+            (wide == 1) & (prev != 1),
+            (wide != 1) & (prev == 1),
+            (wide == -1) & (prev != -1),
+            (wide != -1) & (prev == -1),
+        )
+        for got, exp in zip(VectorEngine._signal_masks(wide), expected):
+            pd.testing.assert_frame_equal(got, exp)
+
+    def test_first_row_entry(self):
+        entries, exits, _, _ = VectorEngine._signal_masks(pd.Series([1, 0]))
+        assert entries.tolist() == [True, False]
+        assert exits.tolist() == [False, True]
+
+    def test_wide_frame(self):
+        wide = pd.DataFrame({"A": [0, 1, 1, 0], "B": [-1, -1, 0, 1]},
+                            index=pd.date_range("2024-01-01", periods=4))
+        entries, exits, short_entries, short_exits = VectorEngine._signal_masks(wide)
+        assert isinstance(entries, pd.DataFrame)
+        assert list(entries.columns) == ["A", "B"]
+        assert entries["A"].tolist() == [False, True, False, False]
+        assert exits["A"].tolist() == [False, False, False, True]
+        assert short_entries["B"].tolist() == [True, False, False, False]
+        assert short_exits["B"].tolist() == [False, False, True, False]
+
+
+class TestPivotWide:
+    @staticmethod
+    def _long_df():
+        return pl.DataFrame({
+            "ts_code": ["B", "A", "A", "B", "A"],
+            "trade_date": ["20240103", "20240102", "20240103", "20240104", "20240104"],
+            "close": [10.0, 5.0, 5.5, 10.5, None],
+            "signal": [1, 0, 1, None, -1],
+        })
+
+    def test_matches_pivot_table(self):
+        df = self._long_df()
+        pdf = df.to_pandas()
+        pdf["trade_date"] = pd.to_datetime(pdf["trade_date"], format="%Y%m%d")
+
+        close = VectorEngine._pivot_wide(df, "close")
+        expected = pdf.pivot_table(index="trade_date", columns="ts_code", values="close")
+        expected.index = expected.index.as_unit("ns")
+        pd.testing.assert_frame_equal(close, expected)
+
+    def test_signal_fill(self):
+        signal = VectorEngine._pivot_wide(self._long_df(), "signal", fill_value=0)
+        assert list(signal.columns) == ["A", "B"]
+        assert signal["B"].tolist() == [0.0, 1.0, 0.0]
+        assert signal["A"].tolist() == [0.0, 1.0, -1.0]
+
+
+class TestColumnChunks:
+    @staticmethod
+    def _panel():
+        rng = np.random.default_rng(5)
+        codes = [f"{i:06d}.SZ" for i in range(6)]
+        dates = [d.strftime("%Y%m%d") for d in pd.bdate_range("2023-01-02", periods=120)]
+        n = len(codes) * len(dates)
+        return pl.DataFrame({
+            "ts_code": [c for c in codes for _ in dates],
+            "trade_date": dates * len(codes),
+            "close": np.exp(np.cumsum(rng.normal(0, 0.02, n))) * 10,
+            "signal": rng.choice([-1, 0, 1], n, p=[0.1, 0.8, 0.1]).tolist(),
+        })
+
+    def test_single_chunk_matches_full_run(self):
+        df = self._panel()
+        engine = VectorEngine()
+        full = engine.run(df)
+        close_wide = engine._pivot_wide(df, "close")
+        signal_wide = engine._pivot_wide(df, "signal", fill_value=0)
+        chunked = engine._run_column_chunks(close_wide, signal_wide, chunk_size=close_wide.shape[1])
+        for key, value in full.metrics.items():
+            if isinstance(value, float):
+                assert chunked.metrics[key] == pytest.approx(value, abs=1e-5), key
+            else:
+                assert chunked.metrics[key] == value, key
+        assert chunked.equity_curve["equity"].to_list() == pytest.approx(full.equity_curve["equity"].to_list())
+
+    def test_chunked_run(self):
+        df = self._panel()
+        result = VectorEngine(BacktestConfig(column_chunk_size=4)).run(df)
+        assert len(result.equity_curve) == 120
+        assert result.metrics["n_trades"] == len(result.trades)
+        assert result.trades["Column"].n_unique() == 6
+
+
+class TestSharpeRatio:
+    def test_matches_full_run(self):
+        df = TestColumnChunks._panel().sample(fraction=1.0, shuffle=True, seed=1)
+        engine = VectorEngine()
+        close_wide, rows, cols = engine.wide_layout(df)
+        signal = np.zeros(close_wide.shape)
+        signal[rows, cols] = df["signal"].to_numpy()
+        signal_wide = pd.DataFrame(signal, index=close_wide.index, columns=close_wide.columns)
+        assert engine.sharpe_ratio(close_wide, signal_wide) == pytest.approx(
+            engine.run(df).metrics["sharpe_ratio"], abs=1e-6
+        )